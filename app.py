@@ -1,11 +1,38 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, g
+import time
+_import_started = time.perf_counter() # worker startup is timed from here to the end of configure_app()
+
+from flask import Flask, render_template, request, redirect, url_for, flash, session, g, abort, jsonify, has_request_context, current_app, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func, extract, or_, text
-from datetime import datetime, timedelta
-from functools import wraps
+from sqlalchemy import func, or_, and_, case, text, select, update, delete, literal, true, tuple_, event, create_engine
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import Session, load_only, joinedload
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial, wraps
+import base64
+import click
+import csv
+import gzip
+import heapq
+import io
+import itertools
+from collections import Counter, OrderedDict, namedtuple
 import random
 import os
 import json 
+import math
+import numpy as np
+import atexit
+import logging
+import queue
+import shutil
+import sqlite3
+import threading
+import uuid
+import zlib
 
 # --- 1. SETUP & CONFIGURATION ---
 app = Flask(__name__)
@@ -13,27 +40,249 @@ app.secret_key = 'your_secret_key_here'
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 db_path = os.path.join(basedir, 'business_data.db')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///' + db_path)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# --- SQLITE ENGINE PROFILE ---
+# WAL lets /dashboard and /audit keep reading while log_action and invoice writes commit; busy_timeout makes a
+# writer wait for the lock instead of failing with "database is locked". Applied to each new connection of db.engine (see apply_sqlite_pragmas).
+app.config['SQLITE_PRAGMAS'] = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'), # safe with WAL: only the last commits can be lost on power failure
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 10000)),
+    'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -65536)), # negative = KiB, so 64 MB per connection
+    'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 268435456)),
+    'temp_store': 'MEMORY',
+}
+
+def engine_options(uri):
+    # one connection per thread is plenty for SQLite; overflow covers bursts, recycle drops long-lived handles
+    options = {'pool_recycle': 3600, 'connect_args': {'timeout': 30, 'check_same_thread': False}}
+    url = make_url(uri)
+    # an in-memory database lives in a single shared connection (StaticPool), which takes no sizing arguments
+    if url.get_backend_name() != 'sqlite' or url.database not in (None, '', ':memory:'):
+        options.update(pool_size=int(os.environ.get('DB_POOL_SIZE', 10)), max_overflow=int(os.environ.get('DB_POOL_OVERFLOW', 10)), pool_timeout=30)
+    return options
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+
+# Dashboard result cache: 'memory' is per process, 'sqlite' is shared by every worker on the host
+app.config['DASHBOARD_CACHE_BACKEND'] = os.environ.get('DASHBOARD_CACHE_BACKEND', 'memory')
+app.config['DASHBOARD_CACHE_PATH'] = os.environ.get('DASHBOARD_CACHE_PATH', os.path.join(basedir, 'dashboard_cache.db'))
+app.config['DASHBOARD_CACHE_TTL'] = int(os.environ.get('DASHBOARD_CACHE_TTL', 300))
+app.config['DASHBOARD_CACHE_SIZE'] = 32
+
+# Analytics snapshot: a periodically refreshed read copy for the dashboard and audit search ('' disables)
+app.config['ANALYTICS_SNAPSHOT_PATH'] = os.environ.get('ANALYTICS_SNAPSHOT_PATH', '')
+app.config['ANALYTICS_SNAPSHOT_INTERVAL'] = int(os.environ.get('ANALYTICS_SNAPSHOT_INTERVAL', 60)) # seconds between refreshes, 0 disables the scheduled refresh
+app.config['ANALYTICS_SNAPSHOT_MAX_AGE'] = int(os.environ.get('ANALYTICS_SNAPSHOT_MAX_AGE', 300)) # older copies are ignored and reads go to the live database
+
+# List pages: rows per page (overridable with ?per_page= up to MAX_PAGE_SIZE)
+app.config['PAGE_SIZE'] = int(os.environ.get('PAGE_SIZE', 50))
+app.config['MAX_PAGE_SIZE'] = 500
+
+# Logged-in user lookups: cached across requests, dropped on every admin change to a user
+app.config['USER_CACHE_SIZE'] = 256
+app.config['USER_CACHE_TTL'] = 60
+app.config['USER_CACHE_STAMP'] = os.environ.get('USER_CACHE_STAMP', '') # '' = next to the SQLite database file (app.instance_path for other databases)
+
+# Audit writes: 'async' buffers rows and bulk-inserts them from a background thread, 'sync' writes inline (tests)
+app.config['AUDIT_SINK_MODE'] = os.environ.get('AUDIT_SINK_MODE', 'async')
+app.config['AUDIT_SINK_QUEUE_SIZE'] = 10000
+app.config['AUDIT_SINK_FLUSH_COUNT'] = int(os.environ.get('AUDIT_SINK_FLUSH_COUNT', 200))
+app.config['AUDIT_SINK_FLUSH_INTERVAL'] = float(os.environ.get('AUDIT_SINK_FLUSH_INTERVAL', 1.0))
+app.config['AUDIT_SINK_PUT_TIMEOUT'] = 0.5 # how long a request waits on a full queue before the event is dropped
+
+# Largest batch the /generate_bulk_data route will create in one request (the CLI has no limit)
+app.config['GENERATOR_MAX_ROUTE_ORDERS'] = 50000
+
+# Audit retention: rows older than this many days move into per-month gzip JSONL segments
+app.config['AUDIT_RETENTION_DAYS'] = int(os.environ.get('AUDIT_RETENTION_DAYS', 365)) # 0 keeps everything in the hot table
+app.config['AUDIT_ARCHIVE_DIR'] = os.environ.get('AUDIT_ARCHIVE_DIR', os.path.join(basedir, 'audit_archive'))
+app.config['AUDIT_ARCHIVE_INTERVAL'] = int(os.environ.get('AUDIT_ARCHIVE_INTERVAL', 86400)) # seconds, 0 disables
+app.config['AUDIT_ARCHIVE_BATCH'] = 5000
+
+# Document codes are handed out from blocks reserved in document_sequence (one round trip per block)
+app.config['SEQUENCE_BLOCK_SIZE'] = int(os.environ.get('SEQUENCE_BLOCK_SIZE', 20))
+
+# Background jobs and batch invoicing
+app.config['JOBS_DIR'] = os.environ.get('JOBS_DIR', os.path.join(basedir, 'jobs'))
+app.config['BATCH_INVOICE_CHUNK'] = 2000
+app.config['BATCH_INVOICE_INLINE_LIMIT'] = 500 # larger batches run in a background job
+
+# Bulk import of clients and orders
+app.config['IMPORT_DIR'] = os.environ.get('IMPORT_DIR', os.path.join(basedir, 'imports')) # uploads are kept so a failed job can resume
+app.config['IMPORT_CHUNK'] = int(os.environ.get('IMPORT_CHUNK', 5000)) # rows per insert transaction
+app.config['IMPORT_REJECT_SAMPLES'] = 100 # rejected rows (line and reason) kept in the job status
+
+# Columnar report cache
+app.config['COLUMNAR_LOAD_CHUNK'] = 100000 # rows read per round trip while loading
+app.config['REPORT_DENSE_LIMIT'] = 1 << 22 # group-bys with up to this many possible keys use a dense bincount
+
+# Exports
+app.config['EXPORT_BATCH_ROWS'] = 1000 # rows fetched per round trip while streaming
+app.config['EXPORT_CHUNK_BYTES'] = 64 * 1024 # response body is flushed in chunks of roughly this size
+
+# Background jobs (seconds between runs, 0 disables)
+app.config['OVERDUE_SWEEP_INTERVAL'] = int(os.environ.get('OVERDUE_SWEEP_INTERVAL', 300)) # seconds, 0 disables
+
+# Instrumentation
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200)) # statements slower than this are logged, 0 disables
+app.config['METRICS_BUCKETS'] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+app.config['LAZY_LOAD_LIMIT'] = int(os.environ['LAZY_LOAD_LIMIT']) if os.environ.get('LAZY_LOAD_LIMIT') else None # set in tests: a request that lazy-loads more than this raises
+
+db = SQLAlchemy() # bound to the app by configure_app()
+
+# configure_app() listens on db.engine only: other SQLite files this app opens (read copies, scratch databases) keep SQLite's
+# defaults instead of WAL journaling and the write-tuned pragmas.
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection): return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items(): cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+@app.cli.command('db-profile')
+def db_profile_command():
+    """Show the pragmas in effect on a pooled connection."""
+    with db.engine.connect() as conn:
+        for name in app.config['SQLITE_PRAGMAS']: click.echo(f"{name} = {conn.exec_driver_sql(f'PRAGMA {name}').scalar()}")
+    click.echo(f"pool = {db.engine.pool.status()}")
+
+# --- INSTRUMENTATION ---
+# Every statement is timed by cursor hooks; inside a request the count and DB time accumulate on g and are
+# folded into per-endpoint histograms when the response goes out. Metrics are per process.
+
+slow_query_log = logging.getLogger(__name__ + '.slow_query')
+
+class Metrics:
+    """Counters and histograms rendered in the Prometheus text exposition format."""
+    def __init__(self, buckets):
+        self.buckets = {None: buckets}
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, kind, text, buckets=None):
+        self.help[name] = (kind, text)
+        if buckets: self.buckets[name] = buckets
+
+    def _buckets(self, name):
+        return self.buckets.get(name, self.buckets[None])
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock: self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None: hist = self.histograms[key] = [[0] * len(self._buckets(name)), 0, 0.0]
+            for i, bound in enumerate(self._buckets(name)):
+                if value <= bound: hist[0][i] += 1
+            hist[1] += 1
+            hist[2] += value
+
+    @staticmethod
+    def _labels(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        if not pairs: return ''
+        return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs) + '}'
+
+    def render(self, gauges=()):
+        lines, seen = [], set()
+        def header(name):
+            if name in seen or name not in self.help: return
+            seen.add(name)
+            kind, text = self.help[name]
+            lines.extend([f"# HELP {name} {text}", f"# TYPE {name} {kind}"])
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted((key, ([*h[0]], h[1], h[2])) for key, h in self.histograms.items())
+        for (name, labels), value in counters:
+            header(name)
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), (counts, count, total) in histograms:
+            header(name)
+            for bound, n in zip(self._buckets(name), counts): lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {n}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{self._labels(labels)} {total}")
+            lines.append(f"{name}_count{self._labels(labels)} {count}")
+        for name, value in gauges:
+            header(name)
+            lines.append(f"{name} {value}")
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics(app.config['METRICS_BUCKETS'])
+metrics.describe('wdp_http_requests_total', 'counter', 'Requests by endpoint, method and status.')
+metrics.describe('wdp_http_request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+metrics.describe('wdp_http_request_db_seconds', 'histogram', 'Time spent in SQL per request, by endpoint.')
+metrics.describe('wdp_http_request_db_statements', 'histogram', 'SQL statements per request, by endpoint.', buckets=(1, 2, 5, 10, 20, 50, 100, 250))
+metrics.describe('wdp_db_statements_total', 'counter', 'SQL statements executed, including background threads.')
+metrics.describe('wdp_db_seconds_total', 'counter', 'Time spent executing SQL, including background threads.')
+metrics.describe('wdp_db_slow_statements_total', 'counter', 'Statements slower than SLOW_QUERY_MS.')
+metrics.describe('wdp_orm_lazy_loads_total', 'counter', 'Relationship lazy loads that hit the database, by endpoint.')
+metrics.describe('wdp_audit_events_total', 'counter', 'Audit events emitted by log_action, by action.')
+metrics.describe('wdp_audit_rows_written_total', 'counter', 'Audit rows the sink has written.')
+metrics.describe('wdp_audit_rows_dropped_total', 'counter', 'Audit rows dropped because the sink queue stayed full.')
+metrics.describe('wdp_audit_rows_failed_total', 'counter', 'Audit rows lost to write errors.')
+metrics.describe('wdp_audit_queue_depth', 'gauge', 'Audit events waiting in the sink queue.')
+metrics.describe('wdp_worker_startup_seconds', 'gauge', 'Time from module import to the end of configure_app() in this worker.')
+metrics.describe('wdp_analytics_snapshot_age_seconds', 'gauge', 'Seconds since the analytics snapshot was last known current.')
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('statement_started', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('statement_started')
+    if not started: return
+    elapsed = time.perf_counter() - started.pop()
+    metrics.inc('wdp_db_statements_total')
+    metrics.inc('wdp_db_seconds_total', elapsed)
+    if has_request_context() and 'sql_count' in g:
+        g.sql_count += 1
+        g.sql_seconds += elapsed
+    threshold = app.config['SLOW_QUERY_MS']
+    if threshold and elapsed * 1000 >= threshold:
+        metrics.inc('wdp_db_slow_statements_total')
+        where = f"{request.method} {request.path}" if has_request_context() else threading.current_thread().name
+        slow_query_log.warning("Slow query (%.1f ms, %s): %s %s", elapsed * 1000, where, ' '.join(statement.split()), '' if executemany else parameters)
+
+@event.listens_for(db.session, 'do_orm_execute')
+def count_lazy_loads(orm_execute_state):
+    # routes declare their loader options; a lazy load that reaches the database means one was missed (an N+1)
+    if not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None or not has_request_context() or 'lazy_loads' not in g: return
+    g.lazy_loads += 1
+    metrics.inc('wdp_orm_lazy_loads_total', endpoint=request.endpoint or 'unmatched')
+    limit = app.config['LAZY_LOAD_LIMIT']
+    if limit is not None and g.lazy_loads > limit:
+        source = orm_execute_state.lazy_loaded_from.class_.__name__
+        raise RuntimeError(f"{request.endpoint} made {g.lazy_loads} lazy loads (limit {limit}); last one from a {source} row. Add a loader option to the query.")
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.sql_count, g.sql_seconds, g.lazy_loads = 0, 0.0, 0
+
+@app.after_request
+def record_request(response):
+    if 'request_started' not in g or request.endpoint == 'static': return response
+    endpoint = request.endpoint or 'unmatched'
+    elapsed = time.perf_counter() - g.request_started
+    metrics.inc('wdp_http_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+    metrics.observe('wdp_http_request_duration_seconds', elapsed, endpoint=endpoint)
+    metrics.observe('wdp_http_request_db_seconds', g.sql_seconds, endpoint=endpoint)
+    metrics.observe('wdp_http_request_db_statements', g.sql_count, endpoint=endpoint)
+    response.headers['Server-Timing'] = f'db;dur={g.sql_seconds * 1000:.1f};desc="{g.sql_count} queries", total;dur={elapsed * 1000:.1f}'
+    return response
 
 # --- TIME TRAVEL TRACKER ---
+# Legacy location of the skipped-days counter; migration 4 moves it into app_state.
 OFFSET_FILE = os.path.join(basedir, 'time_offset.json')
 
-def get_total_skipped_days():
-    if not os.path.exists(OFFSET_FILE): return 0
-    try:
-        with open(OFFSET_FILE, 'r') as f: return json.load(f).get('days_skipped', 0)
-    except: return 0
-
-def add_skipped_days(days):
-    new_total = get_total_skipped_days() + days
-    with open(OFFSET_FILE, 'w') as f: json.dump({'days_skipped': new_total}, f)
-
-def reset_skipped_days():
-    with open(OFFSET_FILE, 'w') as f: json.dump({'days_skipped': 0}, f)
-
 # --- 2. DATABASE MODELS ---
 
 class User(db.Model):
@@ -52,32 +301,39 @@ class Client(db.Model):
     company = db.Column(db.String(100))
 
 class Order(db.Model):
+    __table_args__ = (db.Index('ix_order_status_date_placed', 'status', 'date_placed'),)
     id = db.Column(db.Integer, primary_key=True)
     order_code = db.Column(db.String(50), unique=True) 
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
     description = db.Column(db.String(200), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
-    date_placed = db.Column(db.DateTime, default=datetime.utcnow)
+    amount = db.Column(db.Float, nullable=False, index=True)
+    date_placed = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     status = db.Column(db.String(50), default='Pending') 
     
     client = db.relationship('Client', backref=db.backref('orders', lazy=True))
 
 class Invoice(db.Model):
+    __table_args__ = (
+        db.Index('ix_invoice_status_date_due', 'status', 'date_due'),
+        db.Index('ix_invoice_client_date_created', 'client_id', 'date_created'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     invoice_code = db.Column(db.String(50), unique=True, nullable=False)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'))
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), index=True)
     client_id = db.Column(db.Integer, db.ForeignKey('client.id'), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.Float, nullable=False, index=True)
     status = db.Column(db.String(50), default='Pending') 
-    date_created = db.Column(db.DateTime, default=datetime.utcnow)
+    status_before_overdue = db.Column(db.String(50)) # what reopen_invoices_due_after() restores
+    date_created = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     date_due = db.Column(db.DateTime)
     
     client = db.relationship('Client', backref=db.backref('invoices', lazy=True))
     order = db.relationship('Order', backref=db.backref('invoice', uselist=False))
 
 class AuditLog(db.Model):
+    __table_args__ = (db.Index('ix_audit_log_timestamp_action', 'timestamp', 'action'),)
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     actor_type = db.Column(db.String(50), default='System') 
     actor_id = db.Column(db.String(50))
     action = db.Column(db.String(100), nullable=False)
@@ -86,14 +342,1432 @@ class AuditLog(db.Model):
     status = db.Column(db.String(50)) 
     description = db.Column(db.String(255))
 
+class AuditArchiveSegment(db.Model):
+    # One row per archived month; the file is gzip JSONL under AUDIT_ARCHIVE_DIR
+    month = db.Column(db.String(7), primary_key=True) # '2024-03'
+    filename = db.Column(db.String(100), nullable=False)
+    rows = db.Column(db.Integer, default=0)
+    first_timestamp = db.Column(db.DateTime)
+    last_timestamp = db.Column(db.DateTime)
+    min_id = db.Column(db.Integer)
+    max_id = db.Column(db.Integer)
+    actions = db.Column(db.Text, default='[]') # JSON list, so the action filter still offers archived actions
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DocumentSequence(db.Model):
+    # One counter per code prefix, e.g. 'INV-20260116-'; next_value is the first number no process has reserved
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.Integer, nullable=False)
+
+class AppState(db.Model):
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(255))
+
+class SchemaMigration(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# --- SCHEMA MIGRATIONS ---
+# Append-only (version 0 is listed first because later steps need its column). Each migration runs once, in its own
+# transaction, and is recorded in schema_migration. They run from `flask db-upgrade`, never while a worker starts.
+# A step is either a SQL string or a callable (for data moves that need Python).
+# Statements must be idempotent (IF NOT EXISTS) because create_all() may already have built the objects on a fresh database.
+
+AUDIT_FTS_DDL = """CREATE VIRTUAL TABLE IF NOT EXISTS audit_log_fts USING fts5(description, action, actor_id, actor_type, entity_id, entity_type, status, content='audit_log', content_rowid='id')"""
+
+MIGRATIONS = [
+    (0, 'Add order.order_code to databases created before the column', [
+        lambda: add_column_if_missing('order', 'order_code', 'VARCHAR(50)'),
+    ]),
+    (1, 'Composite indexes for status/date filters, client history and audit timeline', [
+        'CREATE INDEX IF NOT EXISTS ix_order_status_date_placed ON "order" (status, date_placed)',
+        'CREATE INDEX IF NOT EXISTS ix_invoice_status_date_due ON invoice (status, date_due)',
+        'CREATE INDEX IF NOT EXISTS ix_invoice_client_date_created ON invoice (client_id, date_created)',
+        'CREATE INDEX IF NOT EXISTS ix_audit_log_timestamp_action ON audit_log (timestamp, action)',
+        'CREATE INDEX IF NOT EXISTS ix_daily_rollup_kind_day ON daily_rollup (kind, day)',
+        'CREATE INDEX IF NOT EXISTS ix_monthly_rollup_kind_month ON monthly_rollup (kind, month)',
+    ]),
+    # SQLite appends the rowid to every index, so a single-column index also serves ORDER BY col, id
+    (2, 'Sort-key indexes for keyset pagination', [
+        'CREATE INDEX IF NOT EXISTS ix_order_date_placed ON "order" (date_placed)',
+        'CREATE INDEX IF NOT EXISTS ix_order_amount ON "order" (amount)',
+        'CREATE INDEX IF NOT EXISTS ix_invoice_date_created ON invoice (date_created)',
+        'CREATE INDEX IF NOT EXISTS ix_invoice_amount ON invoice (amount)',
+        'CREATE INDEX IF NOT EXISTS ix_audit_log_timestamp ON audit_log (timestamp)',
+    ]),
+    (3, 'FTS5 search indexes for the audit log, orders and invoices', [
+        # audit_log_fts reads its text from audit_log (external content); the triggers only maintain the index
+        AUDIT_FTS_DDL,
+        """CREATE TRIGGER IF NOT EXISTS audit_log_fts_ai AFTER INSERT ON audit_log BEGIN
+            INSERT INTO audit_log_fts(rowid, description, action, actor_id, actor_type, entity_id, entity_type, status)
+            VALUES (new.id, new.description, new.action, new.actor_id, new.actor_type, new.entity_id, new.entity_type, new.status);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS audit_log_fts_ad AFTER DELETE ON audit_log BEGIN
+            INSERT INTO audit_log_fts(audit_log_fts, rowid, description, action, actor_id, actor_type, entity_id, entity_type, status)
+            VALUES ('delete', old.id, old.description, old.action, old.actor_id, old.actor_type, old.entity_id, old.entity_type, old.status);
+        END""",
+        # fires only when an indexed column (or the rowid) changes, so unrelated updates leave the index alone
+        """CREATE TRIGGER IF NOT EXISTS audit_log_fts_au AFTER UPDATE OF id, description, action, actor_id, actor_type, entity_id, entity_type, status ON audit_log BEGIN
+            INSERT INTO audit_log_fts(audit_log_fts, rowid, description, action, actor_id, actor_type, entity_id, entity_type, status)
+            VALUES ('delete', old.id, old.description, old.action, old.actor_id, old.actor_type, old.entity_id, old.entity_type, old.status);
+            INSERT INTO audit_log_fts(rowid, description, action, actor_id, actor_type, entity_id, entity_type, status)
+            VALUES (new.id, new.description, new.action, new.actor_id, new.actor_type, new.entity_id, new.entity_type, new.status);
+        END""",
+        "INSERT INTO audit_log_fts(audit_log_fts) VALUES ('rebuild')",
+        # order_fts / invoice_fts carry the client name, so they store their own copy of the text
+        'CREATE VIRTUAL TABLE IF NOT EXISTS order_fts USING fts5(order_code, description, client_name)',
+        """CREATE TRIGGER IF NOT EXISTS order_fts_ai AFTER INSERT ON "order" BEGIN
+            INSERT INTO order_fts(rowid, order_code, description, client_name) VALUES (new.id, new.order_code, new.description, (SELECT name FROM client WHERE id = new.client_id));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS order_fts_ad AFTER DELETE ON "order" BEGIN
+            DELETE FROM order_fts WHERE rowid = old.id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS order_fts_au AFTER UPDATE OF order_code, description, client_id ON "order" BEGIN
+            DELETE FROM order_fts WHERE rowid = old.id;
+            INSERT INTO order_fts(rowid, order_code, description, client_name) VALUES (new.id, new.order_code, new.description, (SELECT name FROM client WHERE id = new.client_id));
+        END""",
+        'CREATE VIRTUAL TABLE IF NOT EXISTS invoice_fts USING fts5(invoice_code, client_name)',
+        """CREATE TRIGGER IF NOT EXISTS invoice_fts_ai AFTER INSERT ON invoice BEGIN
+            INSERT INTO invoice_fts(rowid, invoice_code, client_name) VALUES (new.id, new.invoice_code, (SELECT name FROM client WHERE id = new.client_id));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS invoice_fts_ad AFTER DELETE ON invoice BEGIN
+            DELETE FROM invoice_fts WHERE rowid = old.id;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS invoice_fts_au AFTER UPDATE OF invoice_code, client_id ON invoice BEGIN
+            DELETE FROM invoice_fts WHERE rowid = old.id;
+            INSERT INTO invoice_fts(rowid, invoice_code, client_name) VALUES (new.id, new.invoice_code, (SELECT name FROM client WHERE id = new.client_id));
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS client_fts_au AFTER UPDATE OF name ON client BEGIN
+            UPDATE order_fts SET client_name = new.name WHERE rowid IN (SELECT id FROM "order" WHERE client_id = new.id);
+            UPDATE invoice_fts SET client_name = new.name WHERE rowid IN (SELECT id FROM invoice WHERE client_id = new.id);
+        END""",
+        'DELETE FROM order_fts',
+        'INSERT INTO order_fts(rowid, order_code, description, client_name) SELECT o.id, o.order_code, o.description, c.name FROM "order" o LEFT JOIN client c ON c.id = o.client_id',
+        'DELETE FROM invoice_fts',
+        'INSERT INTO invoice_fts(rowid, invoice_code, client_name) SELECT i.id, i.invoice_code, c.name FROM invoice i LEFT JOIN client c ON c.id = i.client_id',
+    ]),
+    (4, 'Move the time-travel counter into app_state and remember the status an invoice had before the overdue sweep', [
+        lambda: import_legacy_time_offset(),
+        lambda: add_column_if_missing('invoice', 'status_before_overdue', 'VARCHAR(50)'),
+    ]),
+    (5, 'Index invoice.order_id for the order -> invoice lookups of batch invoicing', [
+        'CREATE INDEX IF NOT EXISTS ix_invoice_order_id ON invoice (order_id)',
+    ]),
+    (6, 'Rename legacy audit actions', [
+        "UPDATE audit_log SET action = 'Account Suspended' WHERE action = 'Suspended User'",
+        "UPDATE audit_log SET action = 'Account Reactivated' WHERE action = 'Re-activated User'",
+        "UPDATE audit_log SET action = 'Account Deleted' WHERE action = 'Delete User'",
+        "UPDATE audit_log SET action = 'Authority Changed' WHERE action = 'Edit User Role'",
+        "UPDATE audit_log SET action = 'Password Changed' WHERE action = 'Password Change'",
+    ]),
+    (7, 'Build the rollups of orders and invoices written before the rollup tables existed', [
+        lambda: backfill_rollups(),
+    ]),
+    (8, 'Create the default SuperAdmin on a database without users', [
+        lambda: create_default_admin(),
+    ]),
+    (9, 'Build the receivables aging buckets', [
+        lambda: rebucket_aging(),
+    ]),
+    (10, 'Build the per-client invoice totals behind the client ranking', [
+        'DELETE FROM client_total',
+        lambda: client_total_add_from_query(),
+    ]),
+]
+SCHEMA_VERSION = max(version for version, _, _ in MIGRATIONS)
+
+def add_column_if_missing(table, column, ddl):
+    if column not in [row[1] for row in db.session.execute(text(f'PRAGMA table_info("{table}")'))]:
+        db.session.execute(text(f'ALTER TABLE "{table}" ADD COLUMN {column} {ddl}'))
+
+def backfill_rollups():
+    if DailyRollup.query.first() is None and (Order.query.first() or Invoice.query.first()): rebuild_rollups()
+
+def create_default_admin():
+    if User.query.first() is None: db.session.add(User(username='admin', password='password123', role='SuperAdmin', custom_id='USR-ADMIN-001'))
+
+def run_migrations():
+    """Apply pending migrations in order. Each one starts by inserting its schema_migration row, which takes SQLite's
+    write lock, so a second process upgrading at the same time waits for it and then skips that migration."""
+    applied = {v for (v,) in db.session.query(SchemaMigration.version)}
+    db.session.commit() # end the read transaction: under WAL a write from an older snapshot fails instead of waiting
+    ran = []
+    for version, name, steps in MIGRATIONS:
+        if version in applied: continue
+        try:
+            db.session.add(SchemaMigration(version=version, name=name))
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            continue
+        for step in steps:
+            if callable(step): step()
+            else: db.session.execute(text(step))
+        db.session.commit()
+        ran.append(version)
+    return ran
+
+def upgrade_database():
+    db.create_all()
+    return run_migrations()
+
+def schema_version():
+    """Highest applied migration, or -1 when the database has never been upgraded."""
+    try: version = db.session.query(func.max(SchemaMigration.version)).scalar()
+    except OperationalError: # no schema_migration table yet
+        db.session.rollback()
+        return -1
+    return -1 if version is None else version
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    ran = upgrade_database()
+    click.echo(f"Applied migrations: {ran}" if ran else "Schema is up to date.")
+
+@app.cli.command('db-status')
+def db_status_command():
+    """Show the schema version and any migrations not applied yet."""
+    version = schema_version()
+    applied = {v for (v,) in db.session.query(SchemaMigration.version)} if version >= 0 else set()
+    click.echo(f"Schema version {version}, code expects {SCHEMA_VERSION}.")
+    for version, name, _ in MIGRATIONS:
+        if version not in applied: click.echo(f"  pending  {version:>3}  {name}")
+
+# --- FULL-TEXT SEARCH ---
+# The FTS5 tables are created by migration 3 and kept in sync by triggers. They live in their own
+# MetaData so create_all() never tries to build them as ordinary tables.
+
+fts_metadata = db.MetaData()
+audit_log_fts = db.Table('audit_log_fts', fts_metadata, db.Column('rowid', db.Integer), db.Column('audit_log_fts', db.String))
+order_fts = db.Table('order_fts', fts_metadata, db.Column('rowid', db.Integer), db.Column('order_fts', db.String))
+invoice_fts = db.Table('invoice_fts', fts_metadata, db.Column('rowid', db.Integer), db.Column('invoice_fts', db.String))
+
+def fts_match_expression(search):
+    """Turn free text into an FTS5 query: every word must match some column as a prefix."""
+    terms = [t for t in search.split() if any(ch.isalnum() for ch in t)]
+    return ' '.join('"' + t.replace('"', '""') + '"*' for t in terms)
+
+def fts_ids(fts_table, search):
+    return select(fts_table.c.rowid).where(fts_table.c[fts_table.name].match(fts_match_expression(search)))
+
+def parse_date_term(term):
+    """'2024', '2024-03' or '2024-03-15' -> half-open (start, end) datetimes; anything else -> None."""
+    for fmt, step in (('%Y-%m-%d', 'day'), ('%Y-%m', 'month'), ('%Y', 'year')):
+        try: start = datetime.strptime(term, fmt)
+        except ValueError: continue
+        if step == 'day': return start, start + timedelta(days=1)
+        if step == 'month': return start, (start + timedelta(days=32)).replace(day=1)
+        return start, start.replace(year=start.year + 1)
+    return None
+
+# --- ROLLUPS (pre-aggregated order/invoice totals read by the dashboard) ---
+# One row per (bucket, kind, status, client). kind is 'order' (bucketed by date_placed)
+# or 'invoice' (bucketed by date_created). Every write path keeps them in step inside its own transaction.
+# Invoices also feed ClientTotal, the all-time grain per client behind the client ranking.
+
+class DailyRollup(db.Model):
+    __table_args__ = (db.UniqueConstraint('day', 'kind', 'status', 'client_id'), db.Index('ix_daily_rollup_kind_day', 'kind', 'day'))
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    client_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+
+class MonthlyRollup(db.Model):
+    __table_args__ = (db.UniqueConstraint('month', 'kind', 'status', 'client_id'), db.Index('ix_monthly_rollup_kind_month', 'kind', 'month'))
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False) # first day of the month
+    kind = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(50), nullable=False)
+    client_id = db.Column(db.Integer, nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+
+class ClientTotal(db.Model):
+    # The ranking index keeps clients in leaderboard order: a write moves one entry (O(log n)), and the top N or any
+    # page of the ranking is a walk along the index from a keyset cursor.
+    __table_args__ = (db.Index('ix_client_total_rank', 'invoice_amount', 'client_id'),)
+    client_id = db.Column(db.Integer, db.ForeignKey('client.id'), primary_key=True)
+    invoice_count = db.Column(db.Integer, nullable=False, default=0)
+    invoice_amount = db.Column(db.Float, nullable=False, default=0)
+    id = db.synonym('client_id') # for keyset_paginate
+
+    client = db.relationship('Client')
+
+ROLLUP_SOURCES = {'order': (Order, 'date_placed'), 'invoice': (Invoice, 'date_created')}
+
+def _rollup_upsert(model, bucket_col):
+    t = model.__table__
+    stmt = sqlite_insert(t)
+    return stmt, [bucket_col, 'kind', 'status', 'client_id'], {'count': t.c.count + stmt.excluded.count, 'amount': t.c.amount + stmt.excluded.amount}
+
+def _client_total_upsert():
+    t = ClientTotal.__table__
+    stmt = sqlite_insert(t)
+    return stmt, {'invoice_count': t.c.invoice_count + stmt.excluded.invoice_count, 'invoice_amount': t.c.invoice_amount + stmt.excluded.invoice_amount}
+
+def rollup_add(kind, client_id, when, status, amount, sign=1):
+    """Apply one row's contribution (sign=1) or removal (sign=-1) to both rollup grains (and the client total for invoices)."""
+    if when is None: return
+    for model, bucket_col, bucket in ((DailyRollup, 'day', when.date()), (MonthlyRollup, 'month', when.date().replace(day=1))):
+        stmt, keys, updates = _rollup_upsert(model, bucket_col)
+        db.session.execute(stmt.on_conflict_do_update(index_elements=keys, set_=updates),
+            {bucket_col: bucket, 'kind': kind, 'status': status or '', 'client_id': client_id, 'count': sign, 'amount': sign * (amount or 0)})
+    if kind == 'invoice':
+        stmt, updates = _client_total_upsert()
+        db.session.execute(stmt.on_conflict_do_update(index_elements=['client_id'], set_=updates),
+            {'client_id': client_id, 'invoice_count': sign, 'invoice_amount': sign * (amount or 0)})
+
+def rollup_add_from_query(kind, where=None, sign=1, as_status=None):
+    """Set-based variant of rollup_add: fold every row matching `where` into the rollups with one INSERT ... SELECT per grain.
+    as_status books the rows under a different status, for adding their contribution ahead of a bulk status UPDATE."""
+    source, date_attr = ROLLUP_SOURCES[kind]
+    ts = getattr(source, date_attr)
+    status = literal(as_status) if as_status is not None else func.coalesce(source.status, '')
+    for model, bucket_col, bucket in ((DailyRollup, 'day', func.date(ts)), (MonthlyRollup, 'month', func.strftime('%Y-%m-01', ts))):
+        # the WHERE is mandatory: SQLite cannot parse INSERT ... SELECT ... ON CONFLICT without one
+        sel = select(bucket, literal(kind), status, source.client_id, func.count() * sign, func.coalesce(func.sum(source.amount), 0) * sign) \
+            .where(ts.isnot(None), where if where is not None else true()).group_by(bucket, status, source.client_id)
+        stmt, keys, updates = _rollup_upsert(model, bucket_col)
+        db.session.execute(stmt.from_select([bucket_col, 'kind', 'status', 'client_id', 'count', 'amount'], sel).on_conflict_do_update(index_elements=keys, set_=updates))
+    if kind == 'invoice': client_total_add_from_query(where, sign)
+
+def client_total_add_from_query(where=None, sign=1):
+    sel = select(Invoice.client_id, func.count() * sign, func.coalesce(func.sum(Invoice.amount), 0) * sign) \
+        .where(Invoice.date_created.isnot(None), where if where is not None else true()).group_by(Invoice.client_id)
+    stmt, updates = _client_total_upsert()
+    db.session.execute(stmt.from_select(['client_id', 'invoice_count', 'invoice_amount'], sel).on_conflict_do_update(index_elements=['client_id'], set_=updates))
+
+def rebuild_rollups():
+    db.session.flush()
+    DailyRollup.query.delete()
+    MonthlyRollup.query.delete()
+    ClientTotal.query.delete()
+    for kind in ROLLUP_SOURCES: rollup_add_from_query(kind)
+
+def rollup_totals(model, kind, start=None, end=None, status=None, session=None):
+    """(count, amount) over a half-open [start, end) bucket range."""
+    col = model.day if model is DailyRollup else model.month
+    q = (session or db.session).query(func.coalesce(func.sum(model.count), 0), func.coalesce(func.sum(model.amount), 0)).filter(model.kind == kind)
+    if start is not None: q = q.filter(col >= start)
+    if end is not None: q = q.filter(col < end)
+    if status is not None: q = q.filter(model.status == status)
+    return q.one()
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the daily/monthly rollup tables from Order and Invoice."""
+    db.create_all()
+    rebuild_rollups()
+    db.session.commit()
+    click.echo(f"Rollups rebuilt: {DailyRollup.query.count()} daily rows, {MonthlyRollup.query.count()} monthly rows, {ClientTotal.query.count()} client totals.")
+
+# --- CLIENT RANKING ---
+# Clients by all-time invoiced amount, read from ClientTotal along its ranking index. Rows whose invoices were
+# all deleted stay at zero and are filtered out.
+
+CLIENT_SORTS = {'amount_high': (ClientTotal.invoice_amount, True)}
+CLIENT_RANKING_OPTIONS = (joinedload(ClientTotal.client).load_only(Client.name),)
+
+def client_ranking_query(session=None):
+    return (session or db.session).query(ClientTotal).options(*CLIENT_RANKING_OPTIONS).filter(ClientTotal.invoice_count > 0)
+
+def top_clients(limit, session=None):
+    return client_ranking_query(session).order_by(ClientTotal.invoice_amount.desc(), ClientTotal.client_id.desc()).limit(limit).all()
+
+def client_rank(row, session=None):
+    """1-based position of a ranking row: the index entries ahead of it are counted, so the cost grows with the rank."""
+    ahead = tuple_(ClientTotal.invoice_amount, ClientTotal.client_id) > tuple_(row.invoice_amount, row.client_id)
+    return 1 + (session or db.session).query(func.count()).select_from(ClientTotal).filter(ClientTotal.invoice_count > 0, ahead).scalar()
+
+def client_ranking_page(cursor=None):
+    """(rows as dicts with their rank, next_cursor) for one page of the ranking."""
+    rows, next_cursor = keyset_paginate(client_ranking_query(), ClientTotal, CLIENT_SORTS, 'amount_high', cursor)
+    first = client_rank(rows[0]) if rows else 1
+    return [{'rank': first + i, 'client_id': row.client_id, 'client_name': row.client.name if row.client else None,
+             'invoice_count': row.invoice_count, 'invoice_amount': round(row.invoice_amount, 2)} for i, row in enumerate(rows)], next_cursor
+
+# --- RECEIVABLES AGING ---
+# Outstanding invoice amounts per (client, bucket of days past date_due), as of the date in app_state aging_as_of.
+# Invoice writes move their row's contribution between buckets like rollup_add does. Buckets only change as the
+# calendar advances, so the overdue sweep re-buckets everything once the virtual date passes aging_as_of: one
+# DELETE and one INSERT ... SELECT over the open invoices, the only full pass. The report reads this table alone.
+
+class ReceivableAging(db.Model):
+    __table_args__ = (db.UniqueConstraint('client_id', 'bucket'),)
+    id = db.Column(db.Integer, primary_key=True)
+    client_id = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.String(10), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+
+AGING_OPEN_STATUSES = ('Pending', 'Sent', 'Overdue')
+AGING_BUCKETS = (('current', 0), ('1-30', 30), ('31-60', 60), ('61-90', 90), ('90+', None)) # (name, most days past due)
+
+def aging_as_of():
+    value = get_state('aging_as_of')
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+def aging_bucket(days_past_due):
+    for name, most in AGING_BUCKETS:
+        if most is None or days_past_due <= most: return name
+
+def _aging_upsert():
+    t = ReceivableAging.__table__
+    stmt = sqlite_insert(t)
+    return stmt, {'count': t.c.count + stmt.excluded.count, 'amount': t.c.amount + stmt.excluded.amount}
+
+def aging_add(client_id, date_due, status, amount, sign=1):
+    """Apply one invoice's contribution (sign=1) or removal (sign=-1). Call it after the transaction's first write,
+    so aging_as_of cannot move between this read and the commit."""
+    as_of = aging_as_of()
+    if as_of is None or status not in AGING_OPEN_STATUSES: return # not built yet: the next re-bucketing counts it
+    stmt, updates = _aging_upsert()
+    db.session.execute(stmt.on_conflict_do_update(index_elements=['client_id', 'bucket'], set_=updates),
+        {'client_id': client_id, 'bucket': aging_bucket((as_of - date_due.date()).days if date_due else 0), 'count': sign, 'amount': sign * (amount or 0)})
+
+def aging_add_from_query(where, as_of, sign=1):
+    """Set-based variant of aging_add for every open invoice matching `where`."""
+    days = func.coalesce(func.julianday(literal(as_of.isoformat())) - func.julianday(func.date(Invoice.date_due)), 0)
+    bucket = case(*[(days <= most, name) for name, most in AGING_BUCKETS if most is not None], else_=AGING_BUCKETS[-1][0])
+    sel = select(Invoice.client_id, bucket, func.count() * sign, func.coalesce(func.sum(Invoice.amount), 0) * sign) \
+        .where(Invoice.status.in_(AGING_OPEN_STATUSES), where).group_by(Invoice.client_id, bucket)
+    stmt, updates = _aging_upsert()
+    db.session.execute(stmt.from_select(['client_id', 'bucket', 'count', 'amount'], sel).on_conflict_do_update(index_elements=['client_id', 'bucket'], set_=updates))
+
+def rebucket_aging(as_of=None):
+    as_of = as_of or virtual_now().date()
+    ReceivableAging.query.delete()
+    aging_add_from_query(true(), as_of)
+    set_state('aging_as_of', as_of.isoformat())
+    return as_of
+
+def aging_report(client_id=None):
+    """{'as_of', 'buckets', 'totals', 'clients'}: outstanding count and amount per bucket, clients by amount owed."""
+    q = db.session.query(ReceivableAging.client_id, Client.name, ReceivableAging.bucket, ReceivableAging.count, ReceivableAging.amount) \
+        .outerjoin(Client, Client.id == ReceivableAging.client_id).filter(ReceivableAging.count != 0)
+    if client_id: q = q.filter(ReceivableAging.client_id == client_id)
+    names = [name for name, _ in AGING_BUCKETS]
+    totals = {name: {'count': 0, 'amount': 0.0} for name in names}
+    clients = {}
+    for cid, client_name, bucket, count, amount in q:
+        row = clients.setdefault(cid, {'client_id': cid, 'client_name': client_name, 'total': 0.0, 'buckets': {name: {'count': 0, 'amount': 0.0} for name in names}})
+        row['buckets'][bucket] = {'count': count, 'amount': round(amount, 2)}
+        row['total'] = round(row['total'] + amount, 2)
+        totals[bucket]['count'] += count
+        totals[bucket]['amount'] = round(totals[bucket]['amount'] + amount, 2)
+    as_of = aging_as_of()
+    return {'as_of': as_of.isoformat() if as_of else None, 'buckets': names, 'totals': totals,
+            'clients': sorted(clients.values(), key=lambda row: (-row['total'], row['client_id']))}
+
+@app.cli.command('rebucket-aging')
+def rebucket_aging_command():
+    """Recompute the receivables aging buckets as of today (the overdue sweep does this once a day)."""
+    as_of = rebucket_aging()
+    db.session.commit()
+    click.echo(f"Aging buckets rebuilt as of {as_of}: {ReceivableAging.query.count()} rows.")
+
+# --- DATA VERSION & DASHBOARD CACHE ---
+# data_version is a single counter in app_state. Every write bumps it inside its own transaction,
+# so a cached result keyed by the version can never outlive the data it was computed from.
+
+def data_version_bump_stmt(key='data_version'):
+    stmt = sqlite_insert(AppState.__table__).values(key=key, value='1')
+    return stmt.on_conflict_do_update(index_elements=['key'], set_={'value': func.cast(AppState.__table__.c.value, db.Integer) + 1})
+
+def bump_data_version():
+    db.session.execute(data_version_bump_stmt())
+
+def get_data_version(session=None):
+    state = (session or db.session).get(AppState, 'data_version')
+    return int(state.value) if state else 0
+
+def get_state(key, default=None):
+    state = db.session.get(AppState, key)
+    return state.value if state else default
+
+def set_state(key, value):
+    stmt = sqlite_insert(AppState.__table__).values(key=key, value=str(value))
+    db.session.execute(stmt.on_conflict_do_update(index_elements=['key'], set_={'value': stmt.excluded.value}))
+
+# --- VIRTUAL CLOCK ---
+# Time travel is a logical offset: "now" is the wall clock plus clock_offset_days, and every date comparison
+# asks virtual_now() instead of datetime.now(). Skipping time is a single app_state write instead of a rewrite
+# of every Order, Invoice and AuditLog row. stored_shift_days records dates that were physically rewritten
+# (by the old implementation, or by `flask materialize-clock`) so they can still be undone.
+
+def time_offset_days():
+    if not has_request_context(): return int(get_state('clock_offset_days', 0))
+    if 'time_offset_days' not in g: g.time_offset_days = int(get_state('clock_offset_days', 0))
+    return g.time_offset_days
+
+def set_time_offset_days(days):
+    set_state('clock_offset_days', days)
+    if has_request_context(): g.pop('time_offset_days', None)
+
+def virtual_now():
+    return datetime.now() + timedelta(days=time_offset_days())
+
+def virtual_utcnow():
+    return datetime.utcnow() + timedelta(days=time_offset_days())
+
+def day_start(moment):
+    return datetime.combine(moment.date(), datetime.min.time())
+
+def shift_stored_dates(days, chunk_size=20000):
+    """Move every stored date by `days` with one set-based UPDATE per table, run in id-range chunks.
+    Each chunk commits together with a progress marker, so an interrupted run resumes when called again with the same days."""
+    progress = json.loads(get_state('date_shift_progress') or '{}')
+    if progress and progress['days'] != days: raise ValueError(f"An interrupted shift of {progress['days']} days must be finished first.")
+    modifier = f'{days:+d} days'
+    for index, (model, columns) in enumerate(((Order, ('date_placed',)), (Invoice, ('date_created', 'date_due')), (AuditLog, ('timestamp',)))):
+        if index < progress.get('table', 0): continue
+        next_id = progress.get('next_id', 0) if index == progress.get('table', 0) else 0
+        max_id = db.session.query(func.max(model.id)).scalar() or 0
+        # datetime() drops the microseconds, so the original fractional suffix is appended back
+        values = {c: func.datetime(getattr(model, c), modifier).concat(func.substr(getattr(model, c), 20)) for c in columns}
+        while next_id <= max_id:
+            db.session.execute(update(model).where(model.id >= next_id, model.id < next_id + chunk_size).values(values))
+            next_id += chunk_size
+            set_state('date_shift_progress', json.dumps({'days': days, 'table': index, 'next_id': next_id}))
+            db.session.commit()
+    AppState.query.filter_by(key='date_shift_progress').delete()
+    rebuild_rollups()
+    rebucket_aging()
+    bump_data_version()
+    bump_columnar_generation()
+    db.session.commit()
+
+def reopen_invoices_due_after(moment):
+    """Undo the overdue flag on invoices whose due date is no longer in the past, restoring the status they had before.
+    Uses the sweep's day boundary, so an invoice due today stays open either way."""
+    reopened = 0
+    for previous in ('Pending', 'Sent'):
+        # invoices flagged before status_before_overdue existed go back to Pending
+        predicate = and_(Invoice.status == 'Overdue', Invoice.date_due >= day_start(moment), func.coalesce(Invoice.status_before_overdue, 'Pending') == previous)
+        rollup_add_from_query('invoice', predicate, -1)
+        rollup_add_from_query('invoice', predicate, as_status=previous)
+        reopened += db.session.execute(update(Invoice).where(predicate).values(status=previous, status_before_overdue=None)).rowcount
+    bump_columnar_generation()
+    return reopened
+
+def import_legacy_time_offset():
+    if not os.path.exists(OFFSET_FILE): return
+    try:
+        with open(OFFSET_FILE, 'r') as f: days = int(json.load(f).get('days_skipped', 0))
+    except (ValueError, OSError): days = 0
+    set_state('stored_shift_days', days)
+    os.replace(OFFSET_FILE, OFFSET_FILE + '.migrated')
+
+@app.cli.command('materialize-clock')
+def materialize_clock_command():
+    """Fold the virtual clock offset into the stored dates (chunked UPDATEs) and reset the offset to zero."""
+    days = time_offset_days()
+    if days:
+        shift_stored_dates(-days)
+        set_state('stored_shift_days', int(get_state('stored_shift_days', 0)) + days)
+        set_time_offset_days(0)
+        db.session.commit()
+    click.echo(f"Shifted stored dates back by {days} days.")
+
+class LRUCache:
+    """In-process cache: least recently used eviction plus a TTL fallback."""
+    def __init__(self, maxsize=32, ttl=300):
+        self.maxsize, self.ttl = maxsize, ttl
+        self.hits = self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.time():
+                if item is not None: del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.time() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize: self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock: self._data.clear()
+
+    def stats(self):
+        return {'backend': 'memory', 'hits': self.hits, 'misses': self.misses, 'entries': len(self._data)}
+
+class SQLiteCache:
+    """Cache stored in a small side database so several worker processes share one computed result."""
+    def __init__(self, path, maxsize=32, ttl=300):
+        self.path, self.maxsize, self.ttl = path, maxsize, ttl
+        self.hits = self.misses = 0
+        self._ready = False
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        if not self._ready: # created on first use rather than while a worker starts
+            with conn: conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+            self._ready = True
+        return conn
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM cache WHERE key = ? AND expires >= ?", (key, time.time())).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)", (key, json.dumps(value), time.time() + self.ttl))
+            conn.execute("DELETE FROM cache WHERE expires < ? OR key NOT IN (SELECT key FROM cache ORDER BY expires DESC LIMIT ?)", (time.time(), self.maxsize))
+
+    def clear(self):
+        with self._connect() as conn: conn.execute("DELETE FROM cache")
+
+    def stats(self):
+        with self._connect() as conn: entries = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {'backend': 'sqlite', 'hits': self.hits, 'misses': self.misses, 'entries': entries}
+
+def make_cache(backend, path, maxsize, ttl):
+    if backend == 'sqlite': return SQLiteCache(path, maxsize, ttl)
+    return LRUCache(maxsize, ttl)
+
+dashboard_cache = None # built by configure_app() from the DASHBOARD_CACHE_* settings
+
+# --- ANALYTICS SNAPSHOT ---
+# An optional copy of the database for the long reads of /dashboard and /audit, made with SQLite's online backup
+# API. Under WAL the backup is one read transaction, so writers keep committing while it runs. A refresh that finds
+# data_version unchanged only touches the file's mtime, so an idle database is never copied twice. The copy is
+# built in a temp file and renamed into place; readers open it immutable, and open sessions keep the old file.
+# The file's mtime is the time its contents were last known current; older than MAX_AGE, reads go to the live database.
+
+class AnalyticsSnapshot:
+    def __init__(self, app=None):
+        self.app, self.path, self.max_age = None, '', 0
+        self.copies = self.skipped = 0
+        self.last_copy_seconds = None
+        self._engine, self._inode = None, None
+        self._lock = threading.Lock()
+        if app is not None: self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.path = app.config['ANALYTICS_SNAPSHOT_PATH']
+        self.max_age = app.config['ANALYTICS_SNAPSHOT_MAX_AGE']
+
+    def source_path(self):
+        url = db.engine.url
+        if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'): return None
+        return url.database
+
+    def _stat(self):
+        try: return os.stat(self.path)
+        except OSError: return None
+
+    def age(self):
+        """Seconds since the copy was last known to match the live database, or None if there is no copy."""
+        st = self._stat() if self.path else None
+        return None if st is None else max(0.0, time.time() - st.st_mtime)
+
+    def version(self):
+        try:
+            with sqlite3.connect(f'file:{self.path}?mode=ro&immutable=1', uri=True) as conn:
+                row = conn.execute("SELECT value FROM app_state WHERE key = 'data_version'").fetchone()
+        except sqlite3.Error: return None
+        return int(row[0]) if row else 0
+
+    def refresh(self, force=False):
+        """Bring the copy up to date; returns 'copied', 'unchanged' or None when snapshots are off."""
+        source = self.source_path()
+        if not self.path or source is None: return None
+        current = get_data_version()
+        db.session.commit()
+        if not force and self._stat() is not None and self.version() == current:
+            os.utime(self.path)
+            self.skipped += 1
+            return 'unchanged'
+        started = time.perf_counter()
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        src, dst = sqlite3.connect(source, timeout=30), sqlite3.connect(tmp)
+        try:
+            src.backup(dst) # all pages in one step: stepping would restart whenever another connection writes
+            dst.execute("PRAGMA journal_mode = DELETE") # the copy must not point at a -wal file of its own
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp, self.path)
+        self.copies += 1
+        self.last_copy_seconds = round(time.perf_counter() - started, 3)
+        return 'copied'
+
+    def engine(self):
+        st = self._stat()
+        if st is None: return None
+        with self._lock:
+            if self._inode != st.st_ino: # a refresh renamed a new copy into place
+                if self._engine is not None: self._engine.dispose()
+                self._engine = create_engine(f'sqlite:///file:{self.path}?mode=ro&immutable=1&uri=true', connect_args={'check_same_thread': False})
+                self._inode = st.st_ino
+            return self._engine
+
+    def fresh_engine(self):
+        age = self.age()
+        if age is None or age > self.max_age: return None
+        return self.engine()
+
+    def stats(self):
+        age = self.age()
+        return {'enabled': bool(self.path), 'age_seconds': None if age is None else round(age, 1), 'max_age': self.max_age,
+                'copies': self.copies, 'skipped': self.skipped, 'last_copy_seconds': self.last_copy_seconds}
+
+analytics_snapshot = AnalyticsSnapshot()
+
+@contextmanager
+def analytics_source():
+    """Yield (session, data version, snapshot age) for a heavy read: the snapshot while it is fresh, else the live database (age None)."""
+    engine = analytics_snapshot.fresh_engine()
+    if engine is None:
+        yield db.session, get_data_version(), None
+        return
+    with Session(bind=engine) as session:
+        yield session, get_data_version(session), analytics_snapshot.age()
+
+# --- COLUMNAR ANALYTICS CACHE ---
+# Orders and invoices as NumPy columns (id, timestamp, amount, status code, client id) for /api/reports.
+# Each process loads them once, in id order, and picks up inserts by reading the rows past its last id.
+# Writes that change existing rows also bump app_state.columnar_generation in their transaction. The
+# writing process then re-reads just those rows (patch); a process that finds a generation it has not
+# applied reloads everything. Reports slice a copy sorted by timestamp, so a date range is two binary
+# searches and its total is a difference of prefix sums. Group-bys are one bincount over the slice.
+
+class ColumnStore:
+    """Growable columns for one table in id order. Deleted rows stay in place with alive=False."""
+    FIELDS = (('id', np.int64), ('ts', np.int64), ('amount', np.float64), ('status', np.int16), ('client_id', np.int64), ('alive', np.bool_))
+
+    def __init__(self):
+        self.n = 0
+        self.cols = {name: np.empty(1024, dtype) for name, dtype in self.FIELDS}
+        self.statuses, self.codes = [], {} # status code <-> status text
+        self._sorted = None
+
+    def code(self, status):
+        if status not in self.codes:
+            self.codes[status] = len(self.statuses)
+            self.statuses.append(status)
+        return self.codes[status]
+
+    def last_id(self):
+        return int(self.cols['id'][self.n - 1]) if self.n else 0
+
+    def _reserve(self, extra):
+        capacity = len(self.cols['id'])
+        if self.n + extra <= capacity: return
+        while capacity < self.n + extra: capacity *= 2
+        for name, col in self.cols.items():
+            grown = np.empty(capacity, col.dtype)
+            grown[:self.n] = col[:self.n]
+            self.cols[name] = grown
+
+    def append(self, rows):
+        """rows: (id, epoch seconds, amount, status, client_id) tuples with ascending ids past last_id()."""
+        if not rows: return
+        ids, stamps, amounts, statuses, clients = zip(*rows)
+        self._reserve(len(rows))
+        part = slice(self.n, self.n + len(rows))
+        self.cols['id'][part], self.cols['ts'][part], self.cols['amount'][part] = ids, stamps, amounts
+        self.cols['status'][part] = [self.code(s) for s in statuses]
+        self.cols['client_id'][part], self.cols['alive'][part] = clients, True
+        self.n += len(rows)
+        self._sorted = None
+
+    def replace(self, ids, rows):
+        """Overwrite already-loaded rows with freshly read values; ids missing from rows were deleted."""
+        fresh = {r[0]: r for r in rows}
+        loaded = self.cols['id'][:self.n]
+        for row_id in ids:
+            i = int(np.searchsorted(loaded, row_id))
+            if i >= self.n or loaded[i] != row_id: continue
+            row = fresh.get(row_id)
+            if row is None:
+                self.cols['alive'][i] = False
+                continue
+            _, self.cols['ts'][i], self.cols['amount'][i], status, self.cols['client_id'][i] = row
+            self.cols['status'][i], self.cols['alive'][i] = self.code(status), True
+        # SQLite hands the highest id out again once its row is gone, so deleted rows at the end are dropped
+        while self.n and not self.cols['alive'][self.n - 1]: self.n -= 1
+        self._sorted = None
+
+    def sorted_view(self):
+        """Live rows ordered by timestamp, plus a prefix sum of amount. Rebuilt lazily after any change."""
+        if self._sorted is None:
+            alive = np.flatnonzero(self.cols['alive'][:self.n])
+            order = alive[np.argsort(self.cols['ts'][alive], kind='stable')]
+            view = {name: self.cols[name][order] for name in ('ts', 'amount', 'status', 'client_id')}
+            view['cum_amount'] = np.concatenate(([0.0], np.cumsum(view['amount'])))
+            view['statuses'] = list(self.statuses)
+            self._sorted = view
+        return self._sorted
+
+class ColumnarCache:
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.stores = {}
+        self.generation = None
+        self.loads = self.patches = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _read(self, kind, where, limit=None):
+        model, date_attr = ROLLUP_SOURCES[kind]
+        ts = getattr(model, date_attr)
+        stmt = select(model.id, func.cast(func.strftime('%s', ts), db.Integer), model.amount, func.coalesce(model.status, ''), model.client_id) \
+            .where(ts.isnot(None), where).order_by(model.id).limit(limit)
+        return db.session.execute(stmt).all()
+
+    def sync(self):
+        """Reload if another process changed existing rows since our last sync, then append rows past each store's last id."""
+        generation = int(get_state('columnar_generation', 0))
+        with self._lock:
+            if self._pid != os.getpid() or generation != self.generation:
+                self.stores = {kind: ColumnStore() for kind in ROLLUP_SOURCES}
+                self.generation, self._pid = generation, os.getpid()
+                self.loads += 1
+            for kind, store in self.stores.items():
+                model = ROLLUP_SOURCES[kind][0]
+                while True:
+                    rows = self._read(kind, model.id > store.last_id(), self.chunk_size)
+                    store.append(rows)
+                    if len(rows) < self.chunk_size: break
+
+    def patch(self, generation, **ids_by_kind):
+        """Apply this process's committed write, identified by the generation it bumped to. If another write got in
+        between, do nothing: the next sync sees the gap and reloads."""
+        with self._lock:
+            if self.generation is None or self._pid != os.getpid() or generation != self.generation + 1: return
+            for kind, ids in ids_by_kind.items():
+                store, model = self.stores[kind], ROLLUP_SOURCES[kind][0]
+                ids = [i for i in ids if i <= store.last_id()] # later rows arrive with the next sync
+                for start in range(0, len(ids), 500):
+                    part = ids[start:start + 500]
+                    store.replace(part, self._read(kind, model.id.in_(part)))
+            self.generation = generation
+            self.patches += 1
+
+    def view(self, kind):
+        with self._lock: return self.stores[kind].sorted_view()
+
+    def stats(self):
+        return {'generation': self.generation, 'loads': self.loads, 'patches': self.patches,
+                'rows': {kind: int(store.cols['alive'][:store.n].sum()) for kind, store in self.stores.items()}}
+
+columnar = ColumnarCache(app.config['COLUMNAR_LOAD_CHUNK'])
+
+def bump_columnar_generation():
+    """Call inside a transaction that changes or deletes existing orders/invoices; returns the new generation for patch()."""
+    return int(db.session.execute(data_version_bump_stmt('columnar_generation').returning(AppState.__table__.c.value)).scalar_one())
+
+REPORT_GROUPS = ('day', 'week', 'month')
+REPORT_BY = ('status', 'client')
+EPOCH = datetime(1970, 1, 1)
+
+def report_periods(start, end, group):
+    """Start of every day, week (Monday) or month that overlaps [start, end)."""
+    first = day_start(start)
+    if group == 'week': first -= timedelta(days=first.weekday())
+    if group == 'month': first = first.replace(day=1)
+    periods = []
+    while first < end:
+        periods.append(first)
+        first = first + timedelta(days=1 if group == 'day' else 7) if group != 'month' else (first + timedelta(days=32)).replace(day=1)
+    return periods
+
+def columnar_report(kind, start, end, group='day', by=(), status=None, client_id=None):
+    """Count and amount over [start, end) for one kind, per period and optionally per status and/or client."""
+    view = columnar.view(kind)
+    periods = report_periods(start, end, group)
+    # rows are sorted by timestamp, so every period is a contiguous run between two binary-search positions
+    bounds = [max(p, start) for p in periods] + [end]
+    edges = np.searchsorted(view['ts'], [(b - EPOCH).total_seconds() for b in bounds])
+    lo, hi = int(edges[0]), int(edges[-1])
+    statuses, cum = view['statuses'], view['cum_amount']
+    if status is None and client_id is None and not by:
+        # no per-row work at all: counts are position differences and amounts are prefix-sum differences
+        counts, sums = np.diff(edges), cum[edges[1:]] - cum[edges[:-1]]
+        keep = np.flatnonzero(counts)
+        decoded, counts, sums = {'period': keep}, counts[keep], sums[keep]
+        total = (hi - lo, float(cum[hi] - cum[lo]))
+    else:
+        period = np.repeat(np.arange(len(periods)), np.diff(edges))
+        amount, codes, clients = view['amount'][lo:hi], view['status'][lo:hi], view['client_id'][lo:hi]
+        if status is not None or client_id is not None:
+            mask = np.ones(hi - lo, bool)
+            if status is not None: mask &= codes == (statuses.index(status) if status in statuses else -1)
+            if client_id is not None: mask &= clients == client_id
+            period, amount, codes, clients = period[mask], amount[mask], codes[mask], clients[mask]
+        total = (len(amount), float(amount.sum()))
+        # mixed-radix key over the value range of each column: one bincount when the key space is small, np.unique otherwise
+        key, radices = np.zeros(len(amount), np.int64), []
+        for name, col in [('period', period)] + [(name, {'status': codes, 'client': clients}[name]) for name in by]:
+            low = int(col.min()) if len(col) else 0
+            width = int(col.max()) - low + 1 if len(col) else 1
+            key = key * width + (col - low)
+            radices.append((name, low, width))
+        space = int(np.prod([w for _, _, w in radices], dtype=np.float64))
+        if space <= app.config['REPORT_DENSE_LIMIT']:
+            counts = np.bincount(key, minlength=space)
+            sums = np.bincount(key, weights=amount, minlength=space)
+            values = np.flatnonzero(counts)
+            counts, sums = counts[values], sums[values]
+        else:
+            values, inverse = np.unique(key, return_inverse=True)
+            counts, sums = np.bincount(inverse), np.bincount(inverse, weights=amount)
+        decoded = {}
+        for name, low, width in reversed(radices):
+            decoded[name] = values % width + low
+            values = values // width
+
+    names = {}
+    if 'client' in decoded:
+        names = dict(db.session.query(Client.id, Client.name).filter(Client.id.in_(np.unique(decoded['client']).tolist())))
+    label = '%Y-%m' if group == 'month' else '%Y-%m-%d'
+    rows = []
+    for i in range(len(counts)):
+        row = {'period': periods[int(decoded['period'][i])].strftime(label)}
+        if 'status' in decoded: row['status'] = statuses[int(decoded['status'][i])]
+        if 'client' in decoded:
+            client = int(decoded['client'][i])
+            row.update(client_id=client, client=names.get(client))
+        row.update(count=int(counts[i]), amount=round(float(sums[i]), 2))
+        rows.append(row)
+    return {'count': int(total[0]), 'amount': round(total[1], 2), 'rows_scanned': hi - lo, 'groups': rows}
+
+# --- AUDIT SINK ---
+# log_action used to commit once per event. Events now go into a bounded queue that a background thread
+# drains, writing each batch (plus one data_version bump) with a single executemany in one transaction.
+
+class AuditSink:
+    _STOP = object()
+
+    def __init__(self, app=None):
+        self.app, self.mode = None, None
+        self.queue = queue.Queue()
+        self.written = self.batches = self.backpressured = self.dropped = self.failed = 0
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        if app is not None: self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.mode = app.config['AUDIT_SINK_MODE']
+        self.flush_count = app.config['AUDIT_SINK_FLUSH_COUNT']
+        self.flush_interval = app.config['AUDIT_SINK_FLUSH_INTERVAL']
+        self.put_timeout = app.config['AUDIT_SINK_PUT_TIMEOUT']
+        self.queue = queue.Queue(maxsize=app.config['AUDIT_SINK_QUEUE_SIZE'])
+
+    def emit(self, row):
+        if self.mode == 'sync': return self._write_in_session([row])
+        self._ensure_started()
+        try: self.queue.put_nowait(row)
+        except queue.Full:
+            self.backpressured += 1
+            try: self.queue.put(row, timeout=self.put_timeout)
+            except queue.Full: self.dropped += 1
+
+    def emit_many(self, rows):
+        if self.mode == 'sync': return self._write_in_session(rows)
+        for row in rows: self.emit(row)
+
+    def _ensure_started(self):
+        # started lazily and per process, so a pre-forking server does not inherit a dead thread
+        if self._thread is not None and self._pid == os.getpid(): return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid(): return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-sink', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        batch, deadline = [], None
+        while True:
+            wait = self.flush_interval if not batch else max(0, deadline - time.monotonic())
+            try: item = self.queue.get(timeout=wait)
+            except queue.Empty: item = None
+            if item is self._STOP or isinstance(item, threading.Event):
+                batch += self._drain()
+                self._write(batch)
+                batch = []
+                if item is self._STOP: return
+                item.set()
+                continue
+            if item is not None:
+                if not batch: deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            if batch and (len(batch) >= self.flush_count or time.monotonic() >= deadline):
+                self._write(batch)
+                batch = []
+
+    def _drain(self):
+        rows = []
+        while True:
+            try: item = self.queue.get_nowait()
+            except queue.Empty: return rows
+            if isinstance(item, dict): rows.append(item)
+
+    def _write(self, rows):
+        if not rows: return
+        try:
+            with self.app.app_context(), db.engine.begin() as conn:
+                conn.execute(AuditLog.__table__.insert(), rows)
+                conn.execute(data_version_bump_stmt())
+            self.written += len(rows)
+            self.batches += 1
+        except Exception:
+            self.failed += len(rows)
+            logging.getLogger(__name__).exception("Audit sink failed to write %d rows", len(rows))
+
+    def _write_in_session(self, rows):
+        if not rows: return
+        try:
+            db.session.execute(AuditLog.__table__.insert(), rows)
+            bump_data_version()
+            db.session.commit()
+            self.written += len(rows)
+        except Exception:
+            db.session.rollback()
+            self.failed += len(rows)
+
+    def flush(self, timeout=10):
+        """Block until everything queued so far is on disk."""
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            self._write(self._drain())
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            self.queue.put(self._STOP)
+            self._thread.join(timeout=10)
+        else: self._write(self._drain())
+
+    def stats(self):
+        return {'mode': self.mode, 'queued': self.queue.qsize(), 'written': self.written, 'batches': self.batches,
+                'backpressured': self.backpressured, 'dropped': self.dropped, 'failed': self.failed}
+
+audit_sink = AuditSink()
+atexit.register(audit_sink.close)
+
 # --- 3. HELPER FUNCTIONS ---
 
 def log_action(actor_type, actor_id, action, entity_type, entity_id, status, description):
+    metrics.inc('wdp_audit_events_total', action=action)
+    audit_sink.emit(dict(timestamp=virtual_utcnow(), actor_type=actor_type, actor_id=actor_id, action=action, entity_type=entity_type, entity_id=entity_id, status=status, description=description))
+
+def log_actions(rows):
+    """log_action() for many prepared rows at once; the sync sink writes them with one executemany."""
+    for action, count in Counter(row['action'] for row in rows).items(): metrics.inc('wdp_audit_events_total', count, action=action)
+    audit_sink.emit_many(rows)
+
+def overdue_predicate(now):
+    return and_(Invoice.status.in_(['Pending', 'Sent']), Invoice.date_due < now)
+
+def overdue_invoice_query(now):
+    return Invoice.query.filter(overdue_predicate(now))
+
+# --- LOADING STRATEGIES ---
+# Every relationship the list and detail templates read is a many-to-one, so each is joined into the main
+# SELECT (one statement per page) and narrowed to the columns shown.
+
+ORDER_LIST_OPTIONS = (joinedload(Order.client).load_only(Client.name),)
+INVOICE_LIST_OPTIONS = (joinedload(Invoice.client).load_only(Client.name), joinedload(Invoice.order).load_only(Order.order_code))
+ORDER_DETAIL_OPTIONS = (joinedload(Order.client).load_only(Client.name, Client.email, Client.company),)
+INVOICE_DETAIL_OPTIONS = (joinedload(Invoice.client).load_only(Client.name, Client.email, Client.company),
+                          joinedload(Invoice.order).load_only(Order.order_code, Order.description, Order.amount, Order.date_placed, Order.status))
+
+def get_or_404(model, object_id, options):
+    obj = db.session.get(model, object_id, options=options)
+    if obj is None: abort(404)
+    return obj
+
+# --- DOCUMENT CODES ---
+# Codes keep their historical shapes (INV-YYYYMMDD-NNN, USR-YYYY-NNN) but the numbers come from a counter per
+# prefix instead of randint() or COUNT(*)+1. Each process reserves a block of numbers with one UPDATE ... RETURNING
+# and hands them out from memory, so numbers are unique across workers but may have gaps and need not be
+# in creation order. A prefix's counter starts after the highest number already used with it.
+
+DOCUMENT_CODES = {
+    # kind: (code column, prefix for a moment, digits, numbers reserved per round trip)
+    'invoice': (Invoice.invoice_code, lambda now: f"INV-{now.strftime('%Y%m%d')}-", 3, app.config['SEQUENCE_BLOCK_SIZE']),
+    'user': (User.custom_id, lambda now: f"USR-{now.year}-", 3, 1),
+}
+
+def highest_code_number(column, prefix):
+    suffix = func.substr(column, len(prefix) + 1)
+    return select(func.coalesce(func.max(func.cast(suffix, db.Integer)), 0)).where(column.op('GLOB')(prefix + '[0-9]*')).scalar_subquery()
+
+class SequenceAllocator:
+    def __init__(self):
+        self._blocks = {} # prefix -> [next, end)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def reserve(self, prefix, column, count):
+        """Claim `count` consecutive numbers for a prefix in their own committed transaction; returns the first.
+        Call it before the caller's transaction writes, since it needs the database write lock."""
+        with db.engine.begin() as conn:
+            conn.execute(sqlite_insert(DocumentSequence).values(name=prefix, next_value=highest_code_number(column, prefix) + 1).on_conflict_do_nothing())
+            end = conn.execute(update(DocumentSequence).where(DocumentSequence.name == prefix)
+                .values(next_value=DocumentSequence.next_value + count).returning(DocumentSequence.next_value)).scalar_one()
+        return end - count
+
+    def next(self, prefix, column, block_size):
+        with self._lock:
+            if self._pid != os.getpid(): # a forked worker must not reuse its parent's block
+                self._blocks.clear()
+                self._pid = os.getpid()
+            block = self._blocks.get(prefix)
+            if block is None or block[0] >= block[1]:
+                first = self.reserve(prefix, column, block_size)
+                block = self._blocks[prefix] = [first, first + block_size]
+                if len(self._blocks) > 64: # prefixes roll over daily; forget stale ones
+                    for stale in [p for p in self._blocks if p != prefix][:32]: del self._blocks[stale]
+            number = block[0]
+            block[0] += 1
+            return number
+
+sequence_allocator = SequenceAllocator()
+
+def allocate_code(kind, now=None):
+    column, prefix_for, digits, block_size = DOCUMENT_CODES[kind]
+    prefix = prefix_for(now or virtual_now())
+    return f"{prefix}{sequence_allocator.next(prefix, column, block_size):0{digits}d}"
+
+def check_sequences(fix=False):
+    """Return (kind, prefix, next_value, highest used) for every counter that would hand out a code already in use."""
+    problems = []
+    for kind, (column, prefix_for, digits, block_size) in DOCUMENT_CODES.items():
+        family = prefix_for(datetime(2000, 1, 1)).split('-')[0] + '-'
+        for seq in DocumentSequence.query.filter(DocumentSequence.name.startswith(family)):
+            highest = db.session.execute(select(highest_code_number(column, seq.name))).scalar()
+            if seq.next_value <= highest:
+                problems.append((kind, seq.name, seq.next_value, highest))
+                if fix: seq.next_value = highest + 1
+    if fix: db.session.commit()
+    return problems
+
+# --- KEYSET PAGINATION ---
+# Cursors encode (sort name, last sort value, last id); the id breaks ties so pages never skip or repeat rows.
+
+ORDER_SORTS = {'date_desc': (Order.date_placed, True), 'date_asc': (Order.date_placed, False), 'price_high': (Order.amount, True), 'price_low': (Order.amount, False)}
+INVOICE_SORTS = {'date_desc': (Invoice.date_created, True), 'date_asc': (Invoice.date_created, False), 'amount_high': (Invoice.amount, True), 'amount_low': (Invoice.amount, False)}
+AUDIT_SORTS = {'date_desc': (AuditLog.timestamp, True)}
+
+def encode_cursor(sort_by, value, row_id):
+    if isinstance(value, datetime): value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort_by, value, row_id]).encode()).decode()
+
+def decode_cursor(token, sort_by, column):
     try:
-        log = AuditLog(actor_type=actor_type, actor_id=actor_id, action=action, entity_type=entity_type, entity_id=entity_id, status=status, description=description)
-        db.session.add(log)
+        name, value, row_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if name != sort_by: return None
+        if isinstance(column.type, db.DateTime): value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except Exception: return None
+
+def get_page_size():
+    size = request.args.get('per_page', type=int) or app.config['PAGE_SIZE']
+    return max(1, min(size, app.config['MAX_PAGE_SIZE']))
+
+def keyset_paginate(query, model, sorts, sort_by, cursor=None, page_size=None):
+    """Return (rows, next_cursor). Fetches one extra row to know whether a next page exists, so no COUNT(*) is needed."""
+    if sort_by not in sorts: sort_by = next(iter(sorts))
+    column, descending = sorts[sort_by]
+    page_size = page_size or get_page_size()
+    position = decode_cursor(cursor, sort_by, column) if cursor else None
+    if position:
+        key, bound = tuple_(column, model.id), tuple_(*position)
+        query = query.filter(key < bound if descending else key > bound)
+    query = query.order_by(*((column.desc(), model.id.desc()) if descending else (column.asc(), model.id.asc())))
+    rows = query.limit(page_size + 1).all()
+    if len(rows) <= page_size: return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(sort_by, getattr(rows[-1], column.key), rows[-1].id)
+
+def orders_query(args):
+    search_q = args.get('search', '')
+    status_filter = args.get('status', 'All')
+    query = Order.query
+    if fts_match_expression(search_q):
+        query = query.filter(Order.id.in_(fts_ids(order_fts, search_q)))
+    if status_filter != 'All':
+        query = query.filter(Order.status == status_filter)
+    return query
+
+def invoices_query(args):
+    search_query = args.get('search', '')
+    status_filter = args.get('status', 'All')
+    query = Invoice.query
+    if fts_match_expression(search_query):
+        query = query.filter(Invoice.id.in_(fts_ids(invoice_fts, search_query)))
+    if status_filter != 'All':
+        query = query.filter(Invoice.status == status_filter)
+    return query
+
+def audit_search_terms(args):
+    """Split the audit filters into FTS words and a half-open [start, end) timestamp window (None = unbounded)."""
+    words, start, end = [], None, None
+    def narrow(lo, hi):
+        nonlocal start, end
+        if lo is not None: start = lo if start is None else max(start, lo)
+        if hi is not None: end = hi if end is None else min(end, hi)
+    for term in args.get('q', '').split():
+        date_range = parse_date_term(term)
+        if date_range: narrow(*date_range)
+        else: words.append(term)
+    # structured range, both ends inclusive, e.g. date_from=2024-01-01&date_to=2024-03
+    date_from = parse_date_term(args.get('date_from', ''))
+    if date_from: narrow(date_from[0], None)
+    date_to = parse_date_term(args.get('date_to', ''))
+    if date_to: narrow(None, date_to[1])
+    return ' '.join(words), start, end
+
+def audit_query(args, query=None):
+    words, start, end = audit_search_terms(args)
+    action_filter = args.get('action_type', '')
+    query = query if query is not None else AuditLog.query
+    
+    # 1. UNIVERSAL SEARCH: date-looking words narrow the timestamp window, everything else goes to the FTS index
+    if fts_match_expression(words):
+        query = query.filter(AuditLog.id.in_(fts_ids(audit_log_fts, words)))
+
+    # 2. DATE RANGE
+    if start is not None: query = query.filter(AuditLog.timestamp >= start)
+    if end is not None: query = query.filter(AuditLog.timestamp < end)
+
+    # 3. FILTER
+    if action_filter and action_filter != 'All':
+        query = query.filter(AuditLog.action == action_filter)
+    return query
+
+# --- AUDIT ARCHIVE ---
+# archive_audit_log() moves rows older than AUDIT_RETENTION_DAYS out of audit_log into one gzip JSONL file per
+# month (rewritten atomically on each append) and records each month in audit_archive_segment. For search,
+# a segment is unpacked once into a SQLite file under .cache/ with the same audit_log and FTS schema, so
+# the exact audit_query() filters run against it. audit_page() reads the hot table first and opens only
+# the segments whose time span can still contribute rows to the requested page.
+
+AUDIT_COLUMNS = [c.key for c in AuditLog.__table__.columns]
+_segment_engines = {}
+
+def archive_path(*parts):
+    return os.path.join(app.config['AUDIT_ARCHIVE_DIR'], *parts)
+
+def append_audit_segment(month, rows):
+    """Append rows to a month's gzip file (as a new gzip member, via temp file + rename) and update the manifest."""
+    segment = db.session.get(AuditArchiveSegment, month) or AuditArchiveSegment(month=month, filename=f'audit-{month}.jsonl.gz', rows=0, actions='[]')
+    path, tmp = archive_path(segment.filename), archive_path(segment.filename + '.tmp')
+    with open(tmp, 'wb') as out:
+        if os.path.exists(path):
+            with open(path, 'rb') as existing: shutil.copyfileobj(existing, out)
+        with gzip.GzipFile(fileobj=out, mode='wb') as gz:
+            for row in rows: gz.write((json.dumps({k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in row.items()}) + '\n').encode())
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+    stamps, ids = [r['timestamp'] for r in rows], [r['id'] for r in rows]
+    segment.rows = (segment.rows or 0) + len(rows)
+    segment.first_timestamp = min([t for t in (segment.first_timestamp, *stamps) if t is not None])
+    segment.last_timestamp = max([t for t in (segment.last_timestamp, *stamps) if t is not None])
+    segment.min_id = min(ids + ([segment.min_id] if segment.min_id is not None else []))
+    segment.max_id = max(ids + ([segment.max_id] if segment.max_id is not None else []))
+    segment.actions = json.dumps(sorted(set(json.loads(segment.actions or '[]')) | {r['action'] for r in rows}))
+    segment.updated_at = datetime.utcnow()
+    db.session.add(segment)
+
+def archive_audit_log(retention_days=None, batch_size=None):
+    """Move audit rows older than the retention window into archive segments. Returns the number moved."""
+    retention_days = app.config['AUDIT_RETENTION_DAYS'] if retention_days is None else retention_days
+    if retention_days <= 0: return 0
+    batch_size = batch_size or app.config['AUDIT_ARCHIVE_BATCH']
+    cutoff = day_start(virtual_utcnow()) - timedelta(days=retention_days)
+    os.makedirs(archive_path(), exist_ok=True)
+    moved = 0
+    while True:
+        # write first so the transaction holds SQLite's write lock: another worker running the same job waits
+        # here instead of archiving the same batch
+        set_state('audit_archive_last_run', virtual_now().isoformat())
+        db.session.flush()
+        # the newest row always stays: SQLite gives a new row MAX(id) + 1, which must not be an archived id
+        newest = select(func.max(AuditLog.id)).scalar_subquery()
+        rows = db.session.execute(select(AuditLog.__table__).where(AuditLog.timestamp < cutoff, AuditLog.id < newest).order_by(AuditLog.id).limit(batch_size)).mappings().all()
+        if not rows:
+            db.session.commit()
+            return moved
+        by_month = {}
+        for row in rows: by_month.setdefault(row['timestamp'].strftime('%Y-%m'), []).append(row)
+        for month, items in sorted(by_month.items()): append_audit_segment(month, items)
+        db.session.execute(delete(AuditLog).where(AuditLog.id.in_([r['id'] for r in rows])))
+        bump_data_version()
         db.session.commit()
-    except: db.session.rollback()
+        moved += len(rows)
+
+def segment_engine(segment):
+    """Engine over the searchable SQLite copy of a segment, rebuilt when the gzip file is newer."""
+    source, cache = archive_path(segment.filename), archive_path('.cache', segment.filename.replace('.jsonl.gz', '.db'))
+    if not os.path.exists(cache) or os.path.getmtime(cache) < os.path.getmtime(source):
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        tmp = f"{cache}.{os.getpid()}.{threading.get_ident()}.tmp"
+        engine = create_engine('sqlite:///' + tmp)
+        AuditLog.__table__.create(engine)
+        with engine.begin() as conn:
+            conn.exec_driver_sql(AUDIT_FTS_DDL)
+            with gzip.open(source, 'rt') as lines:
+                batch = []
+                for line in lines:
+                    row = json.loads(line)
+                    row['timestamp'] = datetime.fromisoformat(row['timestamp']) if row['timestamp'] else None
+                    batch.append(row)
+                    if len(batch) >= 5000:
+                        conn.execute(AuditLog.__table__.insert().prefix_with('OR IGNORE'), batch)
+                        batch = []
+                if batch: conn.execute(AuditLog.__table__.insert().prefix_with('OR IGNORE'), batch)
+            conn.exec_driver_sql("INSERT INTO audit_log_fts(audit_log_fts) VALUES ('rebuild')")
+        engine.dispose()
+        os.replace(tmp, cache)
+        old = _segment_engines.pop(cache, None)
+        if old is not None: old.dispose()
+    if cache not in _segment_engines: _segment_engines[cache] = create_engine('sqlite:///' + cache)
+    return _segment_engines[cache]
+
+def query_segment(segment, build):
+    """Run build(query) against one archive segment and return detached AuditLog rows."""
+    with Session(bind=segment_engine(segment)) as archive_session:
+        rows = build(archive_session.query(AuditLog))
+        archive_session.expunge_all()
+    return rows
+
+def audit_page(args, cursor=None, page_size=None, read_session=None):
+    """Keyset page over the hot table plus whichever archive segments could still hold rows for it."""
+    page_size = page_size or get_page_size()
+    read_session = read_session or db.session
+    rows, more = keyset_paginate(audit_query(args, read_session.query(AuditLog)), AuditLog, AUDIT_SORTS, 'date_desc', cursor, page_size)
+    more = more is not None
+    position = decode_cursor(cursor, 'date_desc', AuditLog.timestamp) if cursor else None
+    _, start, end = audit_search_terms(args)
+    segments = read_session.query(AuditArchiveSegment).order_by(AuditArchiveSegment.last_timestamp.desc())
+    if start is not None: segments = segments.filter(AuditArchiveSegment.last_timestamp >= start)
+    if end is not None: segments = segments.filter(AuditArchiveSegment.first_timestamp < end)
+    if position: segments = segments.filter(AuditArchiveSegment.first_timestamp <= position[0])
+    seen = {r.id for r in rows}
+    for segment in segments:
+        # segments are visited newest first, so once the page is full and ends after this segment's newest row, stop
+        if len(rows) >= page_size and rows[-1].timestamp > segment.last_timestamp:
+            more = True
+            break
+        archived, segment_more = query_segment(segment, lambda q: keyset_paginate(audit_query(args, q), AuditLog, AUDIT_SORTS, 'date_desc', cursor, page_size))
+        more = more or segment_more is not None
+        rows += [r for r in archived if r.id not in seen] # a row can sit in both places if a run died before its commit; the hot copy wins
+        seen.update(r.id for r in archived)
+        rows.sort(key=lambda r: (r.timestamp, r.id), reverse=True)
+        if len(rows) > page_size:
+            rows, more = rows[:page_size], True
+    return rows, (encode_cursor('date_desc', rows[-1].timestamp, rows[-1].id) if more and rows else None)
+
+def archived_audit_row(log_id):
+    for segment in AuditArchiveSegment.query.filter(AuditArchiveSegment.min_id <= log_id, AuditArchiveSegment.max_id >= log_id):
+        row = query_segment(segment, lambda q: q.filter(AuditLog.id == log_id).first())
+        if row: return row
+    return None
+
+def archived_audit_actions(read_session=None):
+    return set().union(*(json.loads(a or '[]') for (a,) in (read_session or db.session).query(AuditArchiveSegment.actions)))
+
+def remove_audit_archive_files():
+    for engine in _segment_engines.values(): engine.dispose()
+    _segment_engines.clear()
+    shutil.rmtree(archive_path(), ignore_errors=True)
+
+# --- EXPORTS ---
+# Full-table downloads reuse the list filters and sorts but select plain columns, stream them with yield_per
+# (no identity map, no ORM objects) and write the body in fixed-size chunks, so memory stays flat at any size.
+# The audit export also streams every archive segment that overlaps the requested range, merged by the sort key.
+
+EXPORTS = {
+    'orders': (orders_query, Order, ORDER_SORTS, lambda: [Order.id, Order.order_code, Client.name.label('client'), Order.description, Order.amount, Order.status, Order.date_placed]),
+    'invoices': (invoices_query, Invoice, INVOICE_SORTS, lambda: [Invoice.id, Invoice.invoice_code, Invoice.order_id, Client.name.label('client'), Invoice.amount, Invoice.status, Invoice.date_created, Invoice.date_due]),
+    'audit': (audit_query, AuditLog, AUDIT_SORTS, lambda: [AuditLog.id, AuditLog.timestamp, AuditLog.actor_type, AuditLog.actor_id, AuditLog.action, AuditLog.entity_type, AuditLog.entity_id, AuditLog.status, AuditLog.description]),
+}
+
+def _export_query(kind, args, query=None):
+    build_query, model, sorts, columns = EXPORTS[kind]
+    sort_by = args.get('sort', 'date_desc')
+    if sort_by not in sorts: sort_by = 'date_desc'
+    column, descending = sorts[sort_by]
+    query = (build_query(args, query) if query is not None else build_query(args)).with_entities(*columns())
+    if model is not AuditLog: query = query.outerjoin(Client, Client.id == model.client_id)
+    query = query.order_by(*((column.desc(), model.id.desc()) if descending else (column.asc(), model.id.asc())))
+    return query.yield_per(app.config['EXPORT_BATCH_ROWS']), column.key, descending
+
+def _archived_export_rows(segment, args):
+    with Session(bind=segment_engine(segment)) as archive_session:
+        yield from _export_query('audit', args, archive_session.query(AuditLog))[0]
+
+def export_rows(kind, args):
+    rows, sort_key, descending = _export_query(kind, args)
+    if kind != 'audit': return rows
+    _, start, end = audit_search_terms(args)
+    segments = AuditArchiveSegment.query
+    if start is not None: segments = segments.filter(AuditArchiveSegment.last_timestamp >= start)
+    if end is not None: segments = segments.filter(AuditArchiveSegment.first_timestamp < end)
+    sources = [rows] + [_archived_export_rows(segment, args) for segment in segments]
+    if len(sources) == 1: return rows
+    merged = heapq.merge(*sources, key=lambda row: (getattr(row, sort_key), row.id), reverse=descending)
+    def unique(): # a row can sit in both places if an archive run died before its commit; the copies are adjacent here
+        last = None
+        for row in merged:
+            key = (getattr(row, sort_key), row.id)
+            if key != last: yield row
+            last = key
+    return unique()
+
+def export_stream(rows, fmt, compress=False):
+    """Yield the encoded body: CSV with a header row, or one JSON object per line."""
+    compressor = zlib.compressobj(wbits=31) if compress else None # 31 = gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    def drain():
+        data = buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+    header = None
+    for row in rows:
+        if header is None:
+            header = list(row._fields)
+            if writer: writer.writerow(header)
+        values = [v.isoformat() if isinstance(v, datetime) else v for v in row]
+        if writer: writer.writerow(values)
+        else: buffer.write(json.dumps(dict(zip(header, values))) + '\n')
+        if buffer.tell() >= app.config['EXPORT_CHUNK_BYTES']:
+            chunk = drain()
+            if chunk: yield chunk
+    chunk = drain()
+    if compressor: chunk += compressor.flush()
+    if chunk: yield chunk
 
 def get_change(current, previous):
     if previous == 0: return 100 if current > 0 else 0
@@ -104,10 +1778,71 @@ def format_k(value):
     if value >= 1000: return f"{value/1000:.1f}k"
     return str(value)
 
+# What g.user holds: read-only, the same type on a cache hit or miss, and never attached to a session
+CurrentUser = namedtuple('CurrentUser', 'id username role must_change_password is_suspended')
+
+class UserCache:
+    """Bounded cache of the logged-in user's id, username, role and flags for load_user. invalidate() also touches a stamp file,
+    and every lookup compares its mtime, so an admin change made in one worker process is seen by all of them on the next request."""
+    def __init__(self, maxsize, ttl):
+        self.maxsize, self.ttl, self.stamp_path = maxsize, ttl, None
+        self._data = OrderedDict()
+        self._seen_stamp = None
+        self._lock = threading.Lock()
+
+    def _stamp_path(self):
+        """Resolved on first use, inside an app context: the default stamp sits next to the database file the engine resolved."""
+        if self.stamp_path is None:
+            url = db.engine.url
+            if current_app.config['USER_CACHE_STAMP']: self.stamp_path = current_app.config['USER_CACHE_STAMP']
+            elif url.get_backend_name() == 'sqlite' and url.database not in (None, '', ':memory:'): self.stamp_path = url.database + '.user_cache_stamp'
+            else:
+                os.makedirs(current_app.instance_path, exist_ok=True)
+                self.stamp_path = os.path.join(current_app.instance_path, '.user_cache_stamp')
+        return self.stamp_path
+
+    def _stamp(self):
+        try: return os.stat(self._stamp_path()).st_mtime_ns
+        except OSError: return 0
+
+    def get(self, user_id):
+        stamp = self._stamp()
+        with self._lock:
+            if stamp != self._seen_stamp:
+                self._data.clear()
+                self._seen_stamp = stamp
+            item = self._data.get(user_id)
+            if item is not None and item[0] >= time.time():
+                self._data.move_to_end(user_id)
+                return item[1]
+        row = db.session.query(*(getattr(User, field) for field in CurrentUser._fields)).filter(User.id == user_id).first()
+        if row is None: return None
+        user = CurrentUser(*row)
+        with self._lock:
+            self._data[user_id] = (time.time() + self.ttl, user)
+            while len(self._data) > self.maxsize: self._data.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None: self._data.clear()
+            else: self._data.pop(user_id, None)
+        path = self._stamp_path()
+        with open(path, 'a'): os.utime(path)
+
+user_cache = UserCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
 @app.before_request
 def load_user():
     g.user = None
-    if 'user_id' in session: g.user = User.query.get(session['user_id'])
+    if request.endpoint == 'static': return
+    if 'user_id' not in session: return
+    user = user_cache.get(session['user_id'])
+    if user is None or user.is_suspended:
+        # a deleted or suspended account loses its session on the next request, not at its next login
+        session.clear()
+        return
+    g.user = user
 
 def admin_required(f):
     @wraps(f)
@@ -127,6 +1862,539 @@ def operator_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# --- SCHEDULED JOBS ---
+# Periodic maintenance runs on a background thread in each worker instead of inside GET requests.
+# Jobs must be idempotent: with several workers the same job can run more than once per interval.
+
+def run_overdue_sweep(now=None):
+    """Flip every open invoice past its due date to Overdue with one UPDATE and log the transitions in bulk.
+    Also the daily re-bucketing of the receivables aging."""
+    now = now or virtual_now()
+    if aging_as_of() != now.date(): rebucket_aging(now.date()) # first sweep of a new day; the status flip itself keeps the buckets
+    predicate = overdue_predicate(day_start(now))
+    rollup_add_from_query('invoice', predicate, -1)
+    rollup_add_from_query('invoice', predicate, as_status='Overdue')
+    swept = db.session.execute(update(Invoice).where(predicate).values(status='Overdue', status_before_overdue=Invoice.status).returning(Invoice.id, Invoice.invoice_code, Invoice.date_due)).all()
+    generation = None
+    if swept:
+        stamp = virtual_utcnow()
+        db.session.execute(AuditLog.__table__.insert(), [
+            dict(timestamp=stamp, actor_type='System', actor_id='Auto-Check', action='Invoice Overdue', entity_type='Invoice', entity_id=code, status='Warning', description=f'Invoice marked overdue (Due: {due})')
+            for _, code, due in swept])
+        bump_data_version()
+        generation = bump_columnar_generation()
+    set_state('overdue_sweep_last_run', now.isoformat())
+    db.session.commit()
+    if generation: columnar.patch(generation, invoice=[invoice_id for invoice_id, _, _ in swept])
+    return len(swept)
+
+class Scheduler:
+    def __init__(self, app):
+        self.app = app
+        self.jobs = [] # [name, interval seconds, fn, next run (monotonic)]
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def add_job(self, name, interval, fn):
+        # the first run lands at a random point of the first interval, so workers booting together neither
+        # all run every job during startup nor keep running them in lockstep
+        if interval > 0: self.jobs.append([name, interval, fn, None])
+
+    def ensure_started(self):
+        if not self.jobs or (self._thread is not None and self._pid == os.getpid()): return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid(): return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        for job in self.jobs: job[3] = time.monotonic() + random.uniform(0, job[1])
+        while True:
+            now = time.monotonic()
+            for job in self.jobs:
+                name, interval, fn, due = job
+                if now < due: continue
+                job[3] = now + interval
+                try:
+                    with self.app.app_context(): fn()
+                except Exception:
+                    logging.getLogger(__name__).exception("Scheduled job %s failed", name)
+            time.sleep(max(0.5, min(job[3] for job in self.jobs) - time.monotonic()))
+
+scheduler = Scheduler(app) # jobs are added by configure_app()
+
+@app.before_request
+def start_scheduler():
+    scheduler.ensure_started()
+
+# --- BACKGROUND JOBS ---
+# Long operations run in a thread of the worker that accepted them. Progress goes to one JSON file per job
+# (replaced atomically), not the database: the job may be holding the write lock, and any worker can read
+# the file when the client polls /jobs/<id>.
+
+class JobRegistry:
+    def __init__(self, app, directory):
+        self.app, self.directory = app, directory
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f'{job_id}.json')
+
+    def get(self, job_id):
+        if not job_id.isalnum(): return None
+        try:
+            with open(self._path(job_id)) as f: return json.load(f)
+        except (OSError, ValueError): return None
+
+    def update(self, job, **fields):
+        job.update(fields)
+        elapsed = time.time() - job['started_at']
+        job['rows_per_sec'] = round(job['done'] / elapsed, 1) if elapsed > 0 else None
+        tmp = self._path(job['id']) + '.tmp'
+        with open(tmp, 'w') as f: json.dump(job, f)
+        os.replace(tmp, self._path(job['id']))
+
+    def start(self, kind, fn, **params):
+        """Run fn(progress=callback, **params) in a background thread and return the job id. fn calls
+        progress(done, total, **fields); extra fields are stored in the job status as they are."""
+        os.makedirs(self.directory, exist_ok=True)
+        job = {'id': uuid.uuid4().hex[:12], 'kind': kind, 'params': params, 'status': 'running', 'done': 0, 'total': None,
+               'started': virtual_now().isoformat(), 'started_at': time.time(), 'finished': None, 'result': None, 'error': None}
+        self.update(job)
+        def run():
+            with self.app.app_context():
+                try:
+                    result = fn(progress=lambda done, total, **fields: self.update(job, done=done, total=total, **fields), **params)
+                    self.update(job, status='done', result=result, finished=virtual_now().isoformat())
+                except Exception as e:
+                    db.session.rollback()
+                    logging.getLogger(__name__).exception("Job %s (%s) failed", job['id'], kind)
+                    self.update(job, status='failed', error=str(e), finished=virtual_now().isoformat())
+        threading.Thread(target=run, name=f'job-{kind}', daemon=True).start()
+        return job['id']
+
+jobs = JobRegistry(app, app.config['JOBS_DIR'])
+
+# --- BATCH INVOICING ---
+# Invoices every Pending order matching a filter in one transaction. Codes are reserved as one block up front,
+# then each chunk is an INSERT ... SELECT into invoice (ROW_NUMBER() numbers the codes), the rollup moves and one
+# UPDATE of the order statuses. A single commit closes the batch; the per-invoice and summary audit rows then go
+# through the audit sink like every other log_action(), read back in chunks from the invoice ids the batch used.
+
+def batch_invoice_filter(client_id=None, date_from=None, date_to=None):
+    clauses = [Order.status == 'Pending', ~select(Invoice.id).where(Invoice.order_id == Order.id).exists()]
+    if client_id: clauses.append(Order.client_id == client_id)
+    if date_from: clauses.append(Order.date_placed >= parse_date_term(date_from)[0])
+    if date_to: clauses.append(Order.date_placed < parse_date_term(date_to)[1])
+    return and_(*clauses)
+
+def batch_invoice_count(client_id=None, date_from=None, date_to=None):
+    return db.session.query(func.count(Order.id)).filter(batch_invoice_filter(client_id, date_from, date_to)).scalar()
+
+def batch_invoice(client_id=None, date_from=None, date_to=None, actor=None, chunk_size=None, progress=None):
+    """Invoice all matching Pending orders and return a summary; progress(done, total) is called after each chunk."""
+    started = time.perf_counter()
+    where = batch_invoice_filter(client_id, date_from, date_to)
+    total = db.session.query(func.count(Order.id)).filter(where).scalar()
+    db.session.commit() # end the read transaction: writing from a snapshot older than the reservation below would fail
+    if not total: return {'invoiced': 0, 'first_code': None, 'last_code': None, 'seconds': 0}
+    chunk_size = chunk_size or app.config['BATCH_INVOICE_CHUNK']
+    column, prefix_for, digits, block_size = DOCUMENT_CODES['invoice']
+    prefix = prefix_for(virtual_now())
+    first = sequence_allocator.reserve(prefix, column, total)
+    created = virtual_utcnow()
+    due = created + timedelta(days=30)
+
+    bump_data_version() # a write first, so the batch holds the write lock from here to its commit
+    bump_columnar_generation() # too many order status changes to patch; every process reloads its columnar cache
+    aging_as = aging_as_of()
+    done, last_order_id = 0, 0
+    first_invoice_id = db.session.query(func.coalesce(func.max(Invoice.id), 0)).scalar() + 1 # under the lock, every id from here on is ours
+    while done < total:
+        max_before = db.session.query(func.coalesce(func.max(Invoice.id), 0)).scalar()
+        chunk = select(Order.id, Order.client_id, Order.amount).where(where, Order.id > last_order_id).order_by(Order.id).limit(min(chunk_size, total - done)).subquery()
+        number = first + done + func.row_number().over(order_by=chunk.c.id) - 1
+        db.session.execute(Invoice.__table__.insert().from_select(['invoice_code', 'order_id', 'client_id', 'amount', 'status', 'date_created', 'date_due'],
+            select(func.printf(f'{prefix}%0{digits}d', number), chunk.c.id, chunk.c.client_id, chunk.c.amount, literal('Pending'), literal(created, db.DateTime), literal(due, db.DateTime))))
+        new_invoices = Invoice.id > max_before
+        new_orders = Order.id.in_(select(Invoice.order_id).where(new_invoices))
+        rollup_add_from_query('order', new_orders, -1)
+        rollup_add_from_query('order', new_orders, as_status='Invoiced')
+        db.session.execute(update(Order).where(new_orders).values(status='Invoiced').execution_options(synchronize_session=False))
+        rollup_add_from_query('invoice', new_invoices)
+        if aging_as: aging_add_from_query(new_invoices, aging_as)
+        inserted, last = db.session.query(func.count(Invoice.id), func.max(Invoice.order_id)).filter(new_invoices).one()
+        if not inserted: break
+        done, last_order_id = done + inserted, last
+        if progress: progress(done, total)
+
+    last_invoice_id = db.session.query(func.coalesce(func.max(Invoice.id), 0)).scalar()
+    db.session.commit()
+
+    after_id = first_invoice_id - 1
+    while after_id < last_invoice_id: # read back in id order, a chunk at a time: a sync sink commits between chunks
+        rows = db.session.query(Invoice.id, Invoice.invoice_code, Order.order_code).join(Order, Order.id == Invoice.order_id) \
+            .filter(Invoice.id > after_id, Invoice.id <= last_invoice_id).order_by(Invoice.id).limit(chunk_size).all()
+        if not rows: break
+        log_actions([dict(timestamp=created, actor_type='System', actor_id='AI-Invoice-Bot', action='Invoice Generated', entity_type='Invoice', entity_id=code,
+                          status='Success', description=f'Auto-generated invoice for Order {order_code}') for _, code, order_code in rows])
+        after_id = rows[-1].id
+    first_code, last_code = (f'{prefix}{first:0{digits}d}', f'{prefix}{first + done - 1:0{digits}d}') if done else (None, None)
+    scope = ', '.join(f'{k}={v}' for k, v in (('client', client_id), ('from', date_from), ('to', date_to)) if v) or 'all pending orders'
+    log_action('User', actor, 'Batch Invoiced', 'Invoice', f'{first_code}..{last_code}' if done else 'N/A', 'Success', f'Generated {done} invoices ({scope})')
+    return {'invoiced': done, 'first_code': first_code, 'last_code': last_code, 'seconds': round(time.perf_counter() - started, 3)}
+
+@app.cli.command('invoice-batch')
+@click.option('--client-id', type=int, default=None)
+@click.option('--date-from', default=None, help='YYYY, YYYY-MM or YYYY-MM-DD (inclusive)')
+@click.option('--date-to', default=None, help='YYYY, YYYY-MM or YYYY-MM-DD (inclusive)')
+@click.option('--chunk-size', type=int, default=None)
+def invoice_batch_command(client_id, date_from, date_to, chunk_size):
+    """Invoice every Pending order matching the filter in one transaction."""
+    result = batch_invoice(client_id, date_from, date_to, actor='cli', chunk_size=chunk_size, progress=lambda done, total: click.echo(f"  {done}/{total}"))
+    click.echo(f"Invoiced {result['invoiced']} orders ({result['first_code']} .. {result['last_code']}) in {result['seconds']}s.")
+
+@app.cli.command('archive-audit')
+@click.option('--days', type=int, default=None, help='Retention window (defaults to AUDIT_RETENTION_DAYS).')
+def archive_audit_command(days):
+    """Move audit rows older than the retention window into monthly archive segments."""
+    db.create_all()
+    moved = archive_audit_log(days)
+    click.echo(f"Archived {moved} audit rows into {archive_path()}.")
+
+@app.cli.command('check-sequences')
+@click.option('--fix', is_flag=True, help='Move lagging counters past the highest code in use.')
+def check_sequences_command(fix):
+    """Verify no document counter would hand out a code that already exists (e.g. after an import)."""
+    db.create_all()
+    problems = check_sequences(fix)
+    for kind, prefix, next_value, highest in problems:
+        click.echo(f"{'fixed' if fix else 'LAGGING'}  {kind:<8} {prefix:<16} next {next_value}, highest in use {highest}")
+    click.echo(f"{len(problems)} counters {'fixed' if fix else 'behind existing codes'}." if problems else "All document counters are ahead of existing codes.")
+    if problems and not fix: raise SystemExit(1)
+
+@app.cli.command('sweep-overdue')
+def sweep_overdue_command():
+    """Mark past-due Pending/Sent invoices as Overdue now."""
+    click.echo(f"Marked {run_overdue_sweep()} invoices overdue.")
+
+@app.cli.command('refresh-snapshot')
+@click.option('--force', is_flag=True, help='Copy even if the data version has not changed.')
+def refresh_snapshot_command(force):
+    """Refresh the analytics snapshot now (for cron when ANALYTICS_SNAPSHOT_INTERVAL is 0)."""
+    result = analytics_snapshot.refresh(force)
+    if result is None: raise SystemExit("Analytics snapshot is off: set ANALYTICS_SNAPSHOT_PATH (SQLite databases only).")
+    stats = analytics_snapshot.stats()
+    click.echo(f"Snapshot {result}: {analytics_snapshot.path}" + (f" ({stats['last_copy_seconds']}s)" if result == 'copied' else ''))
+
+# --- SYNTHETIC DATA GENERATOR ---
+# Ids are reserved up front from MAX(id), so invoices can point at their orders without a round trip per row,
+# and document codes are derived from those ids (zero-padded to 6 digits, wider than the legacy random 4-digit
+# suffixes) so they can never collide. Rows go in with one executemany per table per chunk.
+
+CLIENT_NAMES = ["Vogue Styles", "Urban Trends Boutique", "Silk & Cotton Co", "Velvet Runway", "Modern Menswear", "Chic Streetwear", "Luxe Fabrics Ltd", "Denim Supply Depot", "Kids Corner Fashion", "Summer Breeze Apparel", "Winter Warmth Gear", "Athletic Aesthetics", "Vintage Threads", "Haute Couture House", "Basic Essentials", "Fashion Forward Inc"]
+ORDER_DESCRIPTIONS = ["Summer Collection Shipment", "Bulk T-Shirts Printing", "Winter Coats Manufacturing", "Silk Scarf Production", "Denim Jeans Supply", "Fashion Photoshoot Styling", "Runway Accessories", "Custom Embroidery Service", "Leather Jacket Order", "Sustainable Cotton Fabrics", "Activewear Line Launch", "Vintage Dress Restoration"]
+AUDIT_SAMPLE_ACTIONS = [('User', 'Login', 'Session', 'Success', 'User logged in successfully'), ('User', 'Login Failed', 'Session', 'Failure', 'Invalid password attempt'),
+                        ('System', 'Invoice Generated', 'Invoice', 'Success', 'Auto-generated invoice'), ('SuperAdmin', 'Invoice Edited', 'Invoice', 'Success', 'Updated invoice details')]
+
+def generate_synthetic_data(orders=150, seed=None, audit_rows=0, chunk_size=10000, end_date=None, days=730, on_chunk=None):
+    """Seed mock clients, orders, paid invoices and audit rows. The same seed and end_date give the same rows."""
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    end_date = end_date or virtual_now()
+    span = days * 86400
+
+    db.session.commit() # end any read transaction: under WAL a write from an older snapshot fails instead of waiting
+    bump_data_version() # a write first: the client lookup and insert below run under the write lock
+    client_ids = dict(db.session.query(Client.name, Client.id).filter(Client.name.in_(CLIENT_NAMES)))
+    missing = [name for name in CLIENT_NAMES if name not in client_ids]
+    if missing:
+        db.session.execute(Client.__table__.insert(), [dict(name=name, email=f"contact@{name.replace(' ','').lower()}.com", company=name) for name in missing])
+        client_ids = dict(db.session.query(Client.name, Client.id).filter(Client.name.in_(CLIENT_NAMES)))
+    client_ids = [client_ids[name] for name in CLIENT_NAMES]
+    db.session.commit()
+
+    totals = {'orders': 0, 'invoices': 0, 'audit': 0}
+    for chunk_start in range(0, orders, chunk_size):
+        bump_data_version() # a write first: the ids below are reserved under the write lock, held until the chunk commits
+        next_order_id = (db.session.query(func.max(Order.id)).scalar() or 0) + 1
+        next_invoice_id = (db.session.query(func.max(Invoice.id)).scalar() or 0) + 1
+        first_order_id, first_invoice_id = next_order_id, next_invoice_id
+        order_rows, invoice_rows = [], []
+        for _ in range(min(chunk_size, orders - chunk_start)):
+            order_date = end_date - timedelta(seconds=rng.randrange(span))
+            client_id = rng.choice(client_ids)
+            amount = rng.uniform(500, 4000)
+            status = 'Invoiced' if rng.random() > 0.3 else 'Pending'
+            order_rows.append(dict(id=next_order_id, order_code=f"ORD-{order_date.strftime('%Y%m')}-{next_order_id:06d}", client_id=client_id,
+                description=rng.choice(ORDER_DESCRIPTIONS), amount=amount, date_placed=order_date, status=status))
+            if status == 'Invoiced':
+                invoice_rows.append(dict(id=next_invoice_id, invoice_code=f"INV-{order_date.strftime('%Y%m')}-{next_invoice_id:06d}", order_id=next_order_id,
+                    client_id=client_id, amount=amount, status='Paid', date_created=order_date, date_due=order_date))
+                next_invoice_id += 1
+            next_order_id += 1
+        db.session.execute(Order.__table__.insert(), order_rows)
+        if invoice_rows: db.session.execute(Invoice.__table__.insert(), invoice_rows)
+        rollup_add_from_query('order', Order.id >= first_order_id)
+        rollup_add_from_query('invoice', Invoice.id >= first_invoice_id)
+        db.session.commit()
+        totals['orders'] += len(order_rows)
+        totals['invoices'] += len(invoice_rows)
+        if on_chunk: on_chunk(totals)
+
+    for chunk_start in range(0, audit_rows, chunk_size):
+        rows = []
+        for _ in range(min(chunk_size, audit_rows - chunk_start)):
+            actor_type, action, entity_type, status, description = rng.choice(AUDIT_SAMPLE_ACTIONS)
+            rows.append(dict(timestamp=end_date - timedelta(seconds=rng.randrange(span)), actor_type=actor_type, actor_id='seed', action=action,
+                entity_type=entity_type, entity_id='N/A', status=status, description=description))
+        db.session.execute(AuditLog.__table__.insert(), rows)
+        bump_data_version()
+        db.session.commit()
+        totals['audit'] += len(rows)
+        if on_chunk: on_chunk(totals)
+
+    totals['seconds'] = time.perf_counter() - started
+    totals['rows_per_sec'] = (totals['orders'] + totals['invoices'] + totals['audit']) / max(totals['seconds'], 1e-9)
+    return totals
+
+@app.cli.command('generate-data')
+@click.option('--orders', default=1000, show_default=True, help='Orders to create (about 70% also get a paid invoice).')
+@click.option('--audit', 'audit_rows', default=0, show_default=True, help='Synthetic audit log rows to create.')
+@click.option('--seed', type=int, default=None, help='Random seed for reproducible output.')
+@click.option('--chunk-size', default=10000, show_default=True, help='Rows per executemany/commit.')
+@click.option('--end-date', type=click.DateTime(), default=None, help='Newest order date (default: now). Orders span the previous two years.')
+def generate_data_command(orders, audit_rows, seed, chunk_size, end_date):
+    """Seed the database with synthetic orders, invoices and audit rows."""
+    db.create_all()
+    result = generate_synthetic_data(orders=orders, seed=seed, audit_rows=audit_rows, chunk_size=chunk_size, end_date=end_date,
+        on_chunk=lambda t: click.echo(f"  {t['orders']:,} orders, {t['invoices']:,} invoices, {t['audit']:,} audit rows"))
+    click.echo(f"Inserted {result['orders']:,} orders, {result['invoices']:,} invoices and {result['audit']:,} audit rows "
+               f"in {result['seconds']:.1f}s ({result['rows_per_sec']:,.0f} rows/sec).")
+
+# --- BULK IMPORT ---
+# Clients and orders stream in from a CSV file (header row) or JSONL, one record per row:
+# client_name, client_email, client_company, order_code, description, amount, date_placed, status.
+# A record without order fields only adds its client. Clients are matched by name through a map loaded once;
+# the first record of a new client must carry its email. The calling thread parses and validates the next chunk
+# while a writer thread inserts the previous one with one executemany per table. There is a single writer
+# because SQLite has a single write lock: more insert threads would only queue on it. Every chunk commits on
+# its own, and progress reports the byte offset after the last committed chunk, so a failed import resumes there.
+
+IMPORT_FORMATS = {'.csv': 'csv', '.jsonl': 'jsonl', '.ndjson': 'jsonl'}
+IMPORT_ORDER_STATUSES = ('Pending', 'Invoiced')
+
+def read_import_file(path, offset=0, line=0):
+    """Yield (line, (end offset, end line), record) from byte `offset`, which is `line` lines into the file. record is
+    a dict, or a string saying why the row cannot be read. (end offset, end line) is where the next record starts."""
+    fmt = IMPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt is None: raise ValueError(f"Unsupported import file {os.path.basename(path)}: use .csv or .jsonl")
+    with open(path, 'rb') as f:
+        state = {'offset': offset, 'line': line}
+        def lines():
+            for raw in f:
+                state['offset'] += len(raw)
+                state['line'] += 1
+                yield raw.decode('utf-8', errors='replace')
+        if fmt == 'csv':
+            header = [h.strip().lower() for h in next(csv.reader([f.readline().decode('utf-8-sig', errors='replace')]), [])]
+            if 'client_name' not in header: raise ValueError("The CSV header row must include client_name")
+            if not offset: state['offset'], state['line'] = f.tell(), 1
+            f.seek(state['offset'])
+            reader = csv.reader(lines())
+            while True:
+                start = state['line'] + 1
+                row = next(reader, None)
+                if row is None: return
+                if not row: continue
+                record = dict(zip(header, row)) if len(row) == len(header) else f"expected {len(header)} fields, found {len(row)}"
+                yield start, (state['offset'], state['line']), record
+        else:
+            f.seek(offset)
+            for text_line in lines():
+                if not text_line.strip(): continue
+                try: record = json.loads(text_line)
+                except ValueError as e: record = f"invalid JSON: {e}"
+                else:
+                    if not isinstance(record, dict): record = 'expected a JSON object'
+                yield state['line'], (state['offset'], state['line']), record
+
+def clean_import_record(record):
+    """Return (client, order) for one record, or raise ValueError with the reason it is rejected. order is None for
+    a client-only record."""
+    def get(key, limit=None):
+        value = record.get(key)
+        value = '' if value is None else str(value).strip()
+        if limit and len(value) > limit: raise ValueError(f"{key} is longer than {limit} characters")
+        return value
+    client = dict(name=get('client_name', 100), email=get('client_email', 100), company=get('client_company', 100) or None)
+    if not client['name']: raise ValueError("client_name is required")
+    if not any(get(key) for key in ('order_code', 'description', 'amount')): return client, None
+    description = get('description', 200)
+    if not description: raise ValueError("description is required for an order")
+    try: amount = float(get('amount'))
+    except ValueError: raise ValueError(f"amount {get('amount')!r} is not a number")
+    if not math.isfinite(amount) or amount < 0: raise ValueError(f"amount {get('amount')} must be zero or more")
+    if get('date_placed'):
+        try: placed = datetime.fromisoformat(get('date_placed'))
+        except ValueError: raise ValueError(f"date_placed {get('date_placed')!r} is not an ISO date")
+        if placed.tzinfo: placed = placed.astimezone(timezone.utc).replace(tzinfo=None)
+    else: placed = virtual_utcnow()
+    status = get('status') or 'Pending'
+    if status not in IMPORT_ORDER_STATUSES: raise ValueError(f"status {status!r} is not one of {', '.join(IMPORT_ORDER_STATUSES)}")
+    return client, dict(order_code=get('order_code', 50) or None, description=description, amount=amount, date_placed=placed, status=status)
+
+def write_import_chunk(rows, clients):
+    """Insert cleaned (line, client, order) rows in one transaction and return (clients added, orders added, rejected
+    (line, reason) pairs). `clients` maps name -> id and gains the new clients once the chunk commits."""
+    with app.app_context():
+        bump_data_version() # a write first: the ids below are read under the write lock
+        next_client_id = (db.session.query(func.max(Client.id)).scalar() or 0) + 1
+        next_order_id = (db.session.query(func.max(Order.id)).scalar() or 0) + 1
+        codes = [order['order_code'] for _, _, order in rows if order and order['order_code']]
+        taken = {code for (code,) in db.session.query(Order.order_code).filter(Order.order_code.in_(codes))} if codes else set()
+        new_clients, client_rows, order_rows, rejected = {}, [], [], []
+        for line, client, order in rows:
+            client_id = clients.get(client['name']) or new_clients.get(client['name'])
+            if client_id is None:
+                if not client['email']:
+                    rejected.append((line, f"client_email is required for new client {client['name']!r}"))
+                    continue
+                client_id = new_clients[client['name']] = next_client_id
+                client_rows.append(dict(client, id=client_id))
+                next_client_id += 1
+            if order is None: continue
+            code = order['order_code'] or f"ORD-{order['date_placed'].strftime('%Y%m')}-{next_order_id:06d}"
+            if code in taken:
+                rejected.append((line, f"order_code {code} already exists"))
+                continue
+            taken.add(code)
+            order_rows.append(dict(order, id=next_order_id, order_code=code, client_id=client_id))
+            next_order_id += 1
+        if client_rows: db.session.execute(Client.__table__.insert(), client_rows)
+        if order_rows:
+            db.session.execute(Order.__table__.insert(), order_rows)
+            rollup_add_from_query('order', Order.id >= order_rows[0]['id'])
+        db.session.commit()
+    clients.update(new_clients)
+    return len(client_rows), len(order_rows), rejected
+
+def import_file(path, offset=0, line=0, actor=None, chunk_size=None, progress=None):
+    """Import clients and orders from a CSV or JSONL file, starting at byte `offset` (`line` lines in), and return a
+    summary. progress(done, None, **fields) is called after each committed chunk with the offset to resume from."""
+    started = time.perf_counter()
+    chunk_size = chunk_size or app.config['IMPORT_CHUNK']
+    clients = dict(db.session.query(Client.name, func.min(Client.id)).group_by(Client.name))
+    db.session.commit() # end the read transaction before the writer thread takes the write lock
+    totals = {'rows': 0, 'clients': 0, 'orders': 0, 'rejected': 0, 'offset': offset, 'line': line, 'size': os.path.getsize(path)}
+    samples = []
+    failed = []
+
+    def write(rows):
+        if failed: raise RuntimeError("an earlier chunk failed") # never commit past a chunk that rolled back
+        try: return write_import_chunk(rows, clients)
+        except Exception:
+            failed.append(True)
+            raise
+
+    def collect(future, count, invalid, end):
+        added_clients, added_orders, rejected = future.result()
+        for bad in sorted(invalid + rejected):
+            totals['rejected'] += 1
+            if len(samples) < app.config['IMPORT_REJECT_SAMPLES']: samples.append({'line': bad[0], 'reason': bad[1]})
+        totals['rows'] += count
+        totals['clients'] += added_clients
+        totals['orders'] += added_orders
+        totals['offset'], totals['line'] = end
+        if progress: progress(totals['rows'], None, rejected_rows=samples, **{k: v for k, v in totals.items() if k != 'rows'})
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix='import-writer') as writer:
+        pending, rows, invalid, end = None, [], [], None
+        for line_no, end, record in read_import_file(path, offset, line):
+            try:
+                if isinstance(record, str): raise ValueError(record)
+                rows.append((line_no, *clean_import_record(record)))
+            except ValueError as e: invalid.append((line_no, str(e)))
+            if len(rows) + len(invalid) >= chunk_size:
+                future = writer.submit(write, rows) # inserts this chunk while the loop parses the next one
+                if pending: collect(*pending)
+                pending, rows, invalid = (future, len(rows) + len(invalid), invalid, end), [], []
+        if rows or invalid:
+            future = writer.submit(write, rows)
+            if pending: collect(*pending)
+            pending = (future, len(rows) + len(invalid), invalid, end)
+        if pending: collect(*pending)
+
+    log_action('User', actor or 'System', 'Bulk Import', 'Order', os.path.basename(path), 'Success',
+               f"Imported {totals['orders']} orders and {totals['clients']} new clients, {totals['rejected']} rows rejected")
+    totals['seconds'] = round(time.perf_counter() - started, 3)
+    totals['rows_per_sec'] = round(totals['rows'] / max(totals['seconds'], 1e-9), 1)
+    return dict(totals, rejected_rows=samples)
+
+@app.cli.command('import-data')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--offset', default=0, show_default=True, help='Byte offset to resume from (printed after every chunk).')
+@click.option('--line', default=0, show_default=True, help='Lines before --offset, so rejected rows keep their line numbers.')
+@click.option('--chunk-size', type=int, default=None, help='Rows per insert transaction (default IMPORT_CHUNK).')
+def import_data_command(path, offset, line, chunk_size):
+    """Import clients and orders from a CSV or JSONL file."""
+    result = import_file(path, offset, line, actor='cli', chunk_size=chunk_size,
+        progress=lambda done, total, **p: click.echo(f"  {done:,} rows, {p['orders']:,} orders, {p['rejected']:,} rejected; resume with --offset {p['offset']} --line {p['line']}"))
+    for bad in result['rejected_rows']: click.echo(f"  line {bad['line']}: {bad['reason']}")
+    click.echo(f"Imported {result['orders']:,} orders and {result['clients']:,} new clients, {result['rejected']:,} rows rejected, "
+               f"in {result['seconds']:.1f}s ({result['rows_per_sec']:,.0f} rows/sec).")
+
+# --- QUERY PLAN CHECK ---
+# Representative statements issued by the hot routes. `flask check-query-plans` runs EXPLAIN QUERY PLAN
+# on each and exits non-zero if SQLite would answer any of them with a full table scan.
+
+def hot_route_queries():
+    now = datetime.now()
+    today = now.date()
+    return [
+        ('invoices: overdue sweep', overdue_invoice_query(now)),
+        ('orders: status filter, newest first', Order.query.filter(Order.status == 'Pending').order_by(Order.date_placed.desc())),
+        ('invoices: status filter', Invoice.query.filter(Invoice.status == 'Paid').order_by(Invoice.date_created.desc())),
+        ('invoices: client history', Invoice.query.filter(Invoice.client_id == 1).order_by(Invoice.date_created.desc())),
+        ('audit: timeline', AuditLog.query.order_by(AuditLog.timestamp.desc())),
+        ('audit: date range', AuditLog.query.filter(AuditLog.timestamp >= now - timedelta(days=7), AuditLog.timestamp < now).order_by(AuditLog.timestamp.desc())),
+        ('orders: next page by date', Order.query.filter(tuple_(Order.date_placed, Order.id) < tuple_(now, 1000)).order_by(Order.date_placed.desc(), Order.id.desc()).limit(51)),
+        ('orders: next page by price', Order.query.filter(tuple_(Order.amount, Order.id) > tuple_(100.0, 1000)).order_by(Order.amount.asc(), Order.id.asc()).limit(51)),
+        ('invoices: next page by amount', Invoice.query.filter(tuple_(Invoice.amount, Invoice.id) < tuple_(100.0, 1000)).order_by(Invoice.amount.desc(), Invoice.id.desc()).limit(51)),
+        ('audit: next page', AuditLog.query.filter(tuple_(AuditLog.timestamp, AuditLog.id) < tuple_(now, 1000)).order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(51)),
+        ('orders: full-text search', orders_query({'search': 'vogue summer'}).order_by(Order.date_placed.desc(), Order.id.desc()).limit(51)),
+        ('invoices: full-text search', invoices_query({'search': 'INV-2024'}).order_by(Invoice.date_created.desc(), Invoice.id.desc()).limit(51)),
+        ('audit: full-text search in a month', audit_query({'q': '2024-03 login'}).order_by(AuditLog.timestamp.desc(), AuditLog.id.desc()).limit(51)),
+        ('audit: distinct actions', db.session.query(AuditLog.action).distinct()),
+        ('aging: one client', ReceivableAging.query.filter(ReceivableAging.client_id == 1)),
+        ('clients: top of the ranking', client_ranking_query().order_by(ClientTotal.invoice_amount.desc(), ClientTotal.client_id.desc()).limit(4)),
+        ('clients: next ranking page', client_ranking_query().filter(tuple_(ClientTotal.invoice_amount, ClientTotal.client_id) < tuple_(100.0, 10)).order_by(ClientTotal.invoice_amount.desc(), ClientTotal.client_id.desc()).limit(51)),
+        ('dashboard: monthly window', db.session.query(func.sum(MonthlyRollup.count), func.sum(MonthlyRollup.amount)).filter(MonthlyRollup.kind == 'order', MonthlyRollup.month >= today.replace(day=1))),
+        ('dashboard: daily window', db.session.query(DailyRollup.day, func.sum(DailyRollup.count)).filter(DailyRollup.kind == 'order', DailyRollup.day >= today - timedelta(days=4)).group_by(DailyRollup.day)),
+    ]
+
+def full_scans(query):
+    """Return the EXPLAIN QUERY PLAN lines that scan a table without an index."""
+    stmt = query.statement if hasattr(query, 'statement') else query
+    compiled = stmt.compile(dialect=db.engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in (compiled.positiontup or []))
+    plan = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+    details = [row[-1] for row in plan]
+    return [d for d in details if d.startswith('SCAN ') and not any(ok in d for ok in ('USING', 'CONSTANT ROW', 'VIRTUAL TABLE'))], details
+
+@app.cli.command('check-query-plans')
+@click.option('--verbose', is_flag=True, help='Print the full plan for every query.')
+def check_query_plans_command(verbose):
+    """Fail if any hot route query falls back to a full table scan."""
+    failures = 0
+    for label, query in hot_route_queries():
+        scans, details = full_scans(query)
+        click.echo(f"{'FAIL' if scans else 'ok  '} {label}")
+        for d in (details if verbose else scans): click.echo(f"       {d}")
+        failures += bool(scans)
+    if failures: raise SystemExit(f"{failures} hot route queries use a full table scan.")
+
 # --- 4. ROUTES ---
 
 @app.route('/')
@@ -163,17 +2431,17 @@ def logout():
 
 @app.route('/change_password', methods=['GET', 'POST'])
 def change_password():
-    if 'user_id' not in session: return redirect(url_for('login'))
-    user = User.query.get(session['user_id'])
+    if not g.user: return redirect(url_for('login'))
+    user = db.session.get(User, g.user.id)
     if request.method == 'POST':
         new_pass = request.form['new_password']
         confirm_pass = request.form['confirm_password']
         if new_pass != confirm_pass or len(new_pass) < 4:
             flash('Invalid password or mismatch.')
             return redirect(url_for('change_password'))
-        user.password = new_pass
-        user.must_change_password = False 
+        User.query.filter_by(id=user.id).update({'password': new_pass, 'must_change_password': False})
         db.session.commit()
+        user_cache.invalidate(user.id)
         log_action('User', user.username, 'Password Changed', 'User', user.custom_id, 'Success', 'User updated their own password')
         return redirect(url_for('dashboard'))
     return render_template('change_password.html', user=user)
@@ -183,86 +2451,46 @@ def change_password():
 def orders():
     if 'user_id' not in session: return redirect(url_for('login'))
     
-    search_q = request.args.get('search', '')
-    status_filter = request.args.get('status', 'All')
     sort_by = request.args.get('sort', 'date_desc')
+    orders, next_cursor = keyset_paginate(orders_query(request.args).options(*ORDER_LIST_OPTIONS), Order, ORDER_SORTS, sort_by, request.args.get('cursor'))
+    return render_template('orders.html', orders=orders, next_cursor=next_cursor, page_size=get_page_size())
 
-    query = Order.query
-
-    if search_q:
-        search_term = f"%{search_q}%"
-        query = query.join(Client).filter(
-            or_(
-                Client.name.like(search_term),
-                Order.description.like(search_term),
-                Order.order_code.like(search_term)
-            )
-        )
-
-    if status_filter != 'All':
-        query = query.filter(Order.status == status_filter)
-
-    if sort_by == 'price_high':
-        query = query.order_by(Order.amount.desc())
-    elif sort_by == 'price_low':
-        query = query.order_by(Order.amount.asc())
-    elif sort_by == 'date_asc':
-        query = query.order_by(Order.date_placed.asc())
-    else: 
-        query = query.order_by(Order.date_placed.desc())
-
-    orders = query.all()
-    return render_template('orders.html', orders=orders)
+@app.route('/clients')
+def clients():
+    if 'user_id' not in session: return redirect(url_for('login'))
+    ranking, next_cursor = client_ranking_page(request.args.get('cursor'))
+    return render_template('clients.html', clients=ranking, next_cursor=next_cursor, page_size=get_page_size())
 
 # --- INVOICE ROUTES ---
 @app.route('/invoices', methods=['GET'])
 def invoices():
     if 'user_id' not in session: return redirect(url_for('login'))
     
-    today = datetime.now().date()
-    overdue_invoices = Invoice.query.filter(
-        or_(Invoice.status == 'Pending', Invoice.status == 'Sent'), 
-        func.date(Invoice.date_due) < today
-    ).all()
-    
-    if overdue_invoices:
-        for inv in overdue_invoices:
-            inv.status = 'Overdue'
-            log_action('System', 'Auto-Check', 'Invoice Overdue', 'Invoice', inv.invoice_code, 'Warning', f'Invoice marked overdue (Due: {inv.date_due})')
-        db.session.commit()
-
-    search_query = request.args.get('search', '')
-    status_filter = request.args.get('status', 'All')
     sort_by = request.args.get('sort', 'date_desc')
-
-    query = Invoice.query
-
-    if search_query:
-        search_term = f"%{search_query}%"
-        query = query.join(Client).filter(or_(Invoice.invoice_code.like(search_term), Client.name.like(search_term)))
-
-    if status_filter != 'All':
-        query = query.filter(Invoice.status == status_filter)
-
-    if sort_by == 'amount_high': query = query.order_by(Invoice.amount.desc())
-    elif sort_by == 'amount_low': query = query.order_by(Invoice.amount.asc())
-    elif sort_by == 'date_asc': query = query.order_by(Invoice.date_created.asc())
-    else: query = query.order_by(Invoice.date_created.desc())
-
-    invoices = query.all()
-    return render_template('invoices.html', invoices=invoices)
+    invoices, next_cursor = keyset_paginate(invoices_query(request.args).options(*INVOICE_LIST_OPTIONS), Invoice, INVOICE_SORTS, sort_by, request.args.get('cursor'))
+    last_sweep = get_state('overdue_sweep_last_run')
+    return render_template('invoices.html', invoices=invoices, next_cursor=next_cursor, page_size=get_page_size(),
+        overdue_sweep_last_run=datetime.fromisoformat(last_sweep) if last_sweep else None)
 
 @app.route('/invoices/create/<int:order_id>', methods=['GET', 'POST'])
 @operator_required
 def create_invoice(order_id):
-    order = Order.query.get_or_404(order_id)
+    order = get_or_404(Order, order_id, ORDER_DETAIL_OPTIONS)
     if request.method == 'POST':
         try:
-            new_code = f"INV-{datetime.now().strftime('%Y%m%d')}-{random.randint(100,999)}"
-            new_invoice = Invoice(invoice_code=new_code, order_id=order.id, client_id=order.client_id, amount=order.amount, status='Pending', date_due=datetime.utcnow() + timedelta(days=30))
+            new_code = allocate_code('invoice')
+            created = virtual_utcnow()
+            new_invoice = Invoice(invoice_code=new_code, order_id=order.id, client_id=order.client_id, amount=order.amount, status='Pending', date_created=created, date_due=created + timedelta(days=30))
             db.session.add(new_invoice)
+            rollup_add('invoice', new_invoice.client_id, new_invoice.date_created, new_invoice.status, new_invoice.amount)
+            aging_add(new_invoice.client_id, new_invoice.date_due, new_invoice.status, new_invoice.amount)
+            rollup_add('order', order.client_id, order.date_placed, order.status, order.amount, -1)
             order.status = 'Invoiced'
+            rollup_add('order', order.client_id, order.date_placed, order.status, order.amount)
+            bump_data_version()
+            generation = bump_columnar_generation()
             db.session.commit()
+            columnar.patch(generation, order=[order.id])
             log_action('System', 'AI-Invoice-Bot', 'Invoice Generated', 'Invoice', new_code, 'Success', f'Auto-generated invoice for Order {order.order_code}')
             flash(f'Invoice {new_code} generated successfully!')
             return redirect(url_for('invoices'))
@@ -271,16 +2499,70 @@ def create_invoice(order_id):
             return redirect(url_for('error_page'))
     return render_template('create_invoice.html', order=order)
 
+@app.route('/invoices/batch', methods=['POST'])
+@operator_required
+def batch_create_invoices():
+    params = dict(client_id=request.form.get('client_id', type=int), date_from=request.form.get('date_from') or None, date_to=request.form.get('date_to') or None)
+    for key in ('date_from', 'date_to'):
+        if params[key] and not parse_date_term(params[key]):
+            flash(f"Invalid {key.replace('_', ' ')}: use YYYY, YYYY-MM or YYYY-MM-DD.", 'danger')
+            return redirect(url_for('invoices'))
+    count = batch_invoice_count(**params)
+    if count == 0:
+        flash('No pending orders match that filter.', 'warning')
+    elif count <= app.config['BATCH_INVOICE_INLINE_LIMIT']:
+        try: result = batch_invoice(actor=g.user.username, **params)
+        except Exception:
+            db.session.rollback()
+            logging.getLogger(__name__).exception("Batch invoicing failed")
+            flash('Batch invoicing failed; no invoices were generated.', 'danger')
+            return redirect(url_for('invoices'))
+        flash(f"{result['invoiced']} invoices generated ({result['first_code']} to {result['last_code']}).")
+    else:
+        job_id = jobs.start('batch-invoice', batch_invoice, actor=g.user.username, **params)
+        flash(f"Generating {count} invoices in the background. Progress: {url_for('job_status', job_id=job_id)}")
+    return redirect(url_for('invoices'))
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    if not g.user: return api_error("Login required", 401)
+    job = jobs.get(job_id)
+    if job is None: return api_error("Unknown job", 404)
+    return jsonify(job)
+
+@app.route('/imports', methods=['POST'])
+@operator_required
+def upload_import():
+    upload = request.files.get('file')
+    ext = os.path.splitext(upload.filename)[1].lower() if upload and upload.filename else ''
+    if ext not in IMPORT_FORMATS:
+        flash("Upload a .csv or .jsonl file of clients and orders.", 'danger')
+        return redirect(url_for('dashboard'))
+    os.makedirs(app.config['IMPORT_DIR'], exist_ok=True)
+    path = os.path.join(app.config['IMPORT_DIR'], uuid.uuid4().hex[:12] + ext)
+    upload.save(path)
+    job_id = jobs.start('import', import_file, path=path, actor=g.user.username)
+    return redirect(url_for('job_status', job_id=job_id))
+
+@app.route('/imports/<job_id>/resume', methods=['POST'])
+@operator_required
+def resume_import(job_id):
+    job = jobs.get(job_id)
+    if job is None or job['kind'] != 'import': return api_error("Unknown import job", 404)
+    if job['status'] != 'failed': return api_error(f"Only a failed import can be resumed; this one is {job['status']}", 409)
+    params = dict(job['params'], offset=job.get('offset', job['params'].get('offset', 0)), line=job.get('line', job['params'].get('line', 0)), actor=g.user.username)
+    return redirect(url_for('job_status', job_id=jobs.start('import', import_file, **params)))
+
 @app.route('/invoices/view/<int:invoice_id>')
 def view_invoice(invoice_id):
     if 'user_id' not in session: return redirect(url_for('login'))
-    invoice = Invoice.query.get_or_404(invoice_id)
+    invoice = get_or_404(Invoice, invoice_id, INVOICE_DETAIL_OPTIONS)
     return render_template('view_invoice.html', invoice=invoice)
 
 @app.route('/invoices/edit/<int:invoice_id>', methods=['GET', 'POST'])
 @admin_required
 def edit_invoice(invoice_id):
-    invoice = Invoice.query.get_or_404(invoice_id)
+    invoice = get_or_404(Invoice, invoice_id, INVOICE_DETAIL_OPTIONS)
     if request.method == 'POST':
         try:
             new_amount = float(request.form['amount'])
@@ -288,22 +2570,31 @@ def edit_invoice(invoice_id):
             new_issue_date = datetime.strptime(request.form['date_created'], '%Y-%m-%d')
             new_due_date = datetime.strptime(request.form['date_due'], '%Y-%m-%d')
             
+            rollup_add('invoice', invoice.client_id, invoice.date_created, invoice.status, invoice.amount, -1)
+            aging_add(invoice.client_id, invoice.date_due, invoice.status, invoice.amount, -1)
             invoice.amount = new_amount
             invoice.date_created = new_issue_date
             invoice.date_due = new_due_date
             
-            today_date = datetime.now().date()
+            today_date = virtual_now().date()
             due_date_obj = new_due_date.date()
             
+            invoice.status_before_overdue = None
             if new_status == 'Paid': invoice.status = 'Paid'
             elif due_date_obj < today_date:
                 invoice.status = 'Overdue'
+                if new_status in ('Pending', 'Sent'): invoice.status_before_overdue = new_status
                 flash(f'Notice: Status automatically set to Overdue because the due date ({due_date_obj}) is in the past.', 'warning')
             else:
                 if new_status == 'Overdue': invoice.status = 'Pending'
                 else: invoice.status = new_status
 
+            rollup_add('invoice', invoice.client_id, invoice.date_created, invoice.status, invoice.amount)
+            aging_add(invoice.client_id, invoice.date_due, invoice.status, invoice.amount)
+            bump_data_version()
+            generation = bump_columnar_generation()
             db.session.commit()
+            columnar.patch(generation, invoice=[invoice.id])
             log_action('SuperAdmin', session.get('username'), 'Invoice Edited', 'Invoice', invoice.invoice_code, 'Success', "Updated invoice details")
             flash(f'Invoice {invoice.invoice_code} updated successfully.')
             return redirect(url_for('view_invoice', invoice_id=invoice.id))
@@ -315,11 +2606,22 @@ def edit_invoice(invoice_id):
 @app.route('/invoices/delete/<int:invoice_id>', methods=['POST'])
 @admin_required
 def delete_invoice(invoice_id):
-    invoice = Invoice.query.get_or_404(invoice_id)
+    invoice = get_or_404(Invoice, invoice_id, (joinedload(Invoice.order),))
     try:
-        if invoice.order: invoice.order.status = 'Pending'
+        rollup_add('invoice', invoice.client_id, invoice.date_created, invoice.status, invoice.amount, -1)
+        aging_add(invoice.client_id, invoice.date_due, invoice.status, invoice.amount, -1)
+        order_ids = []
+        if invoice.order:
+            o = invoice.order
+            rollup_add('order', o.client_id, o.date_placed, o.status, o.amount, -1)
+            o.status = 'Pending'
+            rollup_add('order', o.client_id, o.date_placed, o.status, o.amount)
+            order_ids.append(o.id)
         db.session.delete(invoice)
+        bump_data_version()
+        generation = bump_columnar_generation()
         db.session.commit()
+        columnar.patch(generation, invoice=[invoice_id], order=order_ids)
         log_action('SuperAdmin', session.get('username'), 'Invoice Deleted', 'Invoice', invoice.invoice_code, 'Success', "Deleted invoice")
         flash('Invoice deleted successfully.')
         return redirect(url_for('invoices'))
@@ -330,82 +2632,115 @@ def delete_invoice(invoice_id):
 @app.route('/dashboard')
 def dashboard():
     if 'user_id' not in session: return redirect(url_for('login'))
-    if User.query.get(session['user_id']).must_change_password: return redirect(url_for('change_password'))
+    if not g.user: return redirect(url_for('login'))
+    if g.user.must_change_password: return redirect(url_for('change_password'))
     
-    now = datetime.now()
+    with analytics_source() as (read_session, version, snapshot_age):
+        return render_template('dashboard.html', snapshot_age=snapshot_age, **dashboard_context(virtual_now(), version, read_session))
+
+def dashboard_context(now, version, read_session=None):
+    cache_key = f"dashboard:v{version}:{now.date()}"
+    context = dashboard_cache.get(cache_key)
+    if context is None:
+        context = build_dashboard_context(now, read_session)
+        dashboard_cache.set(cache_key, context)
+    return context
+
+@app.route('/admin/cache_stats')
+@admin_required
+def cache_stats():
+    return jsonify(data_version=get_data_version(), dashboard=dashboard_cache.stats(), audit_sink=audit_sink.stats(), analytics_snapshot=analytics_snapshot.stats(), columnar=columnar.stats(), worker=worker_startup)
+
+@app.route('/metrics')
+@admin_required
+def metrics_endpoint():
+    sink = audit_sink.stats()
+    gauges = [('wdp_audit_rows_written_total', sink['written']), ('wdp_audit_rows_dropped_total', sink['dropped']),
+              ('wdp_audit_rows_failed_total', sink['failed']), ('wdp_audit_queue_depth', sink['queued'])]
+    if worker_startup: gauges.append(('wdp_worker_startup_seconds', worker_startup['startup_seconds']))
+    snapshot_age = analytics_snapshot.age()
+    if snapshot_age is not None: gauges.append(('wdp_analytics_snapshot_age_seconds', round(snapshot_age, 1)))
+    return app.response_class(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+def build_dashboard_context(now, read_session=None):
+    read_session = read_session or db.session
+    totals = partial(rollup_totals, session=read_session)
     current_year = now.year
     last_year = current_year - 1
-    current_month = now.month
     prev_month_date = now.replace(day=1) - timedelta(days=1)
-    prev_month = prev_month_date.month
-    prev_month_year = prev_month_date.year
 
-    total_orders = Order.query.count()
-    total_orders_prev = Order.query.filter(Order.date_placed < now - timedelta(days=30)).count()
+    today = now.date()
+    cutoff_30 = (now - timedelta(days=30)).date()
+    month_start = today.replace(day=1)
+    prev_month_start = prev_month_date.date().replace(day=1)
+    year_start = today.replace(month=1, day=1)
+    last_year_start = year_start.replace(year=last_year)
+    next_year_start = year_start.replace(year=current_year + 1)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+
+    # "before X" figures are all-time totals minus the recent window, so only the short tail is read from the daily grain
+    total_orders, _ = totals(MonthlyRollup, 'order')
+    total_orders_prev = total_orders - totals(DailyRollup, 'order', start=cutoff_30)[0]
     order_growth = get_change(total_orders, total_orders_prev)
 
-    total_sales = db.session.query(func.sum(Invoice.amount)).scalar() or 0
-    sales_prev = db.session.query(func.sum(Invoice.amount)).filter(Invoice.date_created < now.replace(day=1)).scalar() or 0
+    total_sales = totals(MonthlyRollup, 'invoice')[1]
+    sales_prev = total_sales - totals(MonthlyRollup, 'invoice', start=month_start)[1]
     sales_growth = get_change(total_sales, sales_prev)
 
-    products_sold = Invoice.query.filter_by(status='Paid').count()
-    products_prev = Invoice.query.filter(Invoice.status=='Paid', Invoice.date_created < now - timedelta(days=30)).count()
+    products_sold = totals(MonthlyRollup, 'invoice', status='Paid')[0]
+    products_prev = products_sold - totals(DailyRollup, 'invoice', start=cutoff_30, status='Paid')[0]
     product_growth = get_change(products_sold, products_prev)
 
-    new_customers = Client.query.count() 
+    new_customers = read_session.query(func.count(Client.id)).scalar() 
     customer_growth = 1.29 
 
-    ytd_sales = db.session.query(func.sum(Order.amount)).filter(extract('year', Order.date_placed) == current_year).scalar() or 0
-    last_ytd_sales = db.session.query(func.sum(Order.amount)).filter(extract('year', Order.date_placed) == last_year).scalar() or 0
+    ytd_count, ytd_sales = totals(MonthlyRollup, 'order', start=year_start, end=next_year_start)
+    last_ytd_count, last_ytd_sales = totals(MonthlyRollup, 'order', start=last_year_start, end=year_start)
     ytd_sales_growth = ytd_sales - last_ytd_sales
-
-    ytd_count = Order.query.filter(extract('year', Order.date_placed) == current_year).count()
-    last_ytd_count = Order.query.filter(extract('year', Order.date_placed) == last_year).count()
     ytd_count_growth = ytd_count - last_ytd_count
 
-    mtd_sales = db.session.query(func.sum(Order.amount)).filter(extract('year', Order.date_placed) == current_year, extract('month', Order.date_placed) == current_month).scalar() or 0
-    last_mtd_sales = db.session.query(func.sum(Order.amount)).filter(extract('year', Order.date_placed) == prev_month_year, extract('month', Order.date_placed) == prev_month).scalar() or 0
+    mtd_count, mtd_sales = totals(MonthlyRollup, 'order', start=month_start, end=next_month_start)
+    last_mtd_count, last_mtd_sales = totals(MonthlyRollup, 'order', start=prev_month_start, end=month_start)
     mtd_sales_diff = mtd_sales - last_mtd_sales
-
-    mtd_count = Order.query.filter(extract('year', Order.date_placed) == current_year, extract('month', Order.date_placed) == current_month).count()
-    last_mtd_count = Order.query.filter(extract('year', Order.date_placed) == prev_month_year, extract('month', Order.date_placed) == prev_month).count()
     mtd_count_diff = mtd_count - last_mtd_count
 
     chart_invoice_months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sept', 'Oct', 'Nov', 'Dec']
     chart_invoice_reality = [0] * 12 
-    monthly_sales_query = db.session.query(extract('month', Invoice.date_created), func.sum(Invoice.amount)).filter(extract('year', Invoice.date_created) == current_year).group_by(extract('month', Invoice.date_created)).all()
-    for m, total in monthly_sales_query: chart_invoice_reality[int(m)-1] = total
+    monthly_sales_query = read_session.query(MonthlyRollup.month, func.sum(MonthlyRollup.amount)).filter(MonthlyRollup.kind == 'invoice', MonthlyRollup.month >= year_start, MonthlyRollup.month < next_year_start).group_by(MonthlyRollup.month).all()
+    for m, total in monthly_sales_query: chart_invoice_reality[m.month-1] = total
         
     chart_invoice_target = [20000] * 12 
 
-    ytd_invoiced_amt = db.session.query(func.sum(Order.amount)).filter(extract('year', Order.date_placed) == current_year, Order.status == 'Invoiced').scalar() or 0
-    ytd_pending_amt = db.session.query(func.sum(Order.amount)).filter(extract('year', Order.date_placed) == current_year, Order.status == 'Pending').scalar() or 0
+    ytd_invoiced_amt = totals(MonthlyRollup, 'order', start=year_start, end=next_year_start, status='Invoiced')[1]
+    ytd_pending_amt = totals(MonthlyRollup, 'order', start=year_start, end=next_year_start, status='Pending')[1]
     chart_orders_ytd_pct = [round(ytd_invoiced_amt), round(ytd_pending_amt)]
     if sum(chart_orders_ytd_pct) == 0: chart_orders_ytd_pct = [0, 1]
 
-    mtd_invoiced_amt = db.session.query(func.sum(Order.amount)).filter(extract('year', Order.date_placed) == current_year, extract('month', Order.date_placed) == current_month, Order.status == 'Invoiced').scalar() or 0
-    mtd_pending_amt = db.session.query(func.sum(Order.amount)).filter(extract('year', Order.date_placed) == current_year, extract('month', Order.date_placed) == current_month, Order.status == 'Pending').scalar() or 0
+    mtd_invoiced_amt = totals(MonthlyRollup, 'order', start=month_start, end=next_month_start, status='Invoiced')[1]
+    mtd_pending_amt = totals(MonthlyRollup, 'order', start=month_start, end=next_month_start, status='Pending')[1]
     chart_orders_mtd_pct = [round(mtd_invoiced_amt), round(mtd_pending_amt)]
     if sum(chart_orders_mtd_pct) == 0: chart_orders_mtd_pct = [0, 1]
 
-    top_clients_query = db.session.query(Client.name, func.sum(Invoice.amount)).join(Invoice).group_by(Client.name).order_by(func.sum(Invoice.amount).desc()).limit(4).all()
+    top_clients_query = top_clients(4, read_session)
     top_clients_progress = []
     if top_clients_query:
-        max_val = top_clients_query[0][1] if top_clients_query[0][1] > 0 else 1
+        max_val = top_clients_query[0].invoice_amount if top_clients_query[0].invoice_amount > 0 else 1
         for client in top_clients_query:
-            percent = min(round((client[1] / max_val) * 100), 100)
-            top_clients_progress.append({'name': client[0], 'amount': client[1], 'percent': percent})
+            percent = min(round((client.invoice_amount / max_val) * 100), 100)
+            top_clients_progress.append({'name': client.client.name if client.client else None, 'amount': client.invoice_amount, 'percent': percent})
 
+    first_day = today - timedelta(days=4)
+    daily_counts = {(day, kind): cnt for day, kind, cnt in read_session.query(DailyRollup.day, DailyRollup.kind, func.sum(DailyRollup.count)).filter(DailyRollup.day >= first_day, DailyRollup.day <= today).group_by(DailyRollup.day, DailyRollup.kind)}
     chart_vol_service_labels = []
     chart_vol_data = []
     chart_service_data = []
     for i in range(4, -1, -1):
         day = now - timedelta(days=i)
         chart_vol_service_labels.append(day.strftime('%a'))
-        chart_vol_data.append(Order.query.filter(func.date(Order.date_placed) == day.date()).count())
-        chart_service_data.append(Invoice.query.filter(func.date(Invoice.date_created) == day.date()).count())
+        chart_vol_data.append(daily_counts.get((day.date(), 'order'), 0))
+        chart_service_data.append(daily_counts.get((day.date(), 'invoice'), 0))
     
-    return render_template('dashboard.html',
+    return dict(
         total_orders=format_k(total_orders), order_growth=order_growth,
         total_sales=format_k(total_sales), sales_growth=sales_growth,
         products_sold=products_sold, product_growth=product_growth,
@@ -421,45 +2756,150 @@ def dashboard():
         chart_vol_service_labels=chart_vol_service_labels, chart_vol_data=chart_vol_data, chart_service_data=chart_service_data
     )
 
+# --- JSON API ---
+# Read-only JSON for tools that poll. The ETag is the data version (plus the virtual day for the dashboard),
+# so an unchanged poll costs one primary-key lookup and gets a 304 before any list or aggregate query runs.
+
+API_FIELDS = {
+    'orders': {'id': Order.id, 'order_code': Order.order_code, 'client_id': Order.client_id, 'description': Order.description,
+               'amount': Order.amount, 'date_placed': Order.date_placed, 'status': Order.status, 'client': None},
+    'invoices': {'id': Invoice.id, 'invoice_code': Invoice.invoice_code, 'order_id': Invoice.order_id, 'client_id': Invoice.client_id,
+                 'amount': Invoice.amount, 'status': Invoice.status, 'date_created': Invoice.date_created, 'date_due': Invoice.date_due, 'client': None},
+}
+
+def api_error(message, status):
+    return jsonify(error=message), status
+
+def requested_fields(available):
+    """Parse ?fields=a,b into a list (all fields when absent); returns None if any name is unknown."""
+    raw = request.args.get('fields', '')
+    fields = [f.strip() for f in raw.split(',') if f.strip()] or list(available)
+    return fields if all(f in available for f in fields) else None
+
+def not_modified(etag):
+    if not request.if_none_match.contains(etag): return None
+    return tagged(app.response_class(status=304), etag)
+
+def tagged(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def api_list(kind, build_query, model, sorts):
+    if not g.user: return api_error("Login required", 401)
+    available = API_FIELDS[kind]
+    fields = requested_fields(available)
+    if fields is None: return api_error(f"Unknown field; choose from {', '.join(available)}", 400)
+    version = get_data_version()
+    etag = f"v{version}-{time_offset_days()}"
+    cached = not_modified(etag)
+    if cached: return cached
+
+    sort_by = request.args.get('sort', 'date_desc')
+    sort_column = sorts.get(sort_by, sorts['date_desc'])[0]
+    columns = {available[f] for f in fields if available[f] is not None} | {model.id, sort_column}
+    query = build_query(request.args).options(load_only(*columns))
+    if 'client' in fields: query = query.options(joinedload(model.client).load_only(Client.name))
+    rows, next_cursor = keyset_paginate(query, model, sorts, sort_by, request.args.get('cursor'))
+    def value(row, field):
+        v = row.client.name if field == 'client' else getattr(row, field)
+        return v.isoformat() if isinstance(v, datetime) else v
+    items = [{f: value(row, f) for f in fields} for row in rows]
+    return tagged(jsonify(data_version=version, next_cursor=next_cursor, items=items), etag)
+
+@app.route('/api/dashboard')
+def api_dashboard():
+    if not g.user: return api_error("Login required", 401)
+    now = virtual_now()
+    with analytics_source() as (read_session, version, snapshot_age):
+        etag = f"v{version}-{now.date()}"
+        cached = not_modified(etag)
+        if cached: return cached
+        context = dashboard_context(now, version, read_session)
+    fields = requested_fields(context)
+    if fields is None: return api_error(f"Unknown field; choose from {', '.join(context)}", 400)
+    return tagged(jsonify(data_version=version, date=now.date().isoformat(), snapshot_age=None if snapshot_age is None else round(snapshot_age, 1), **{f: context[f] for f in fields}), etag)
+
+@app.route('/api/orders')
+def api_orders():
+    return api_list('orders', orders_query, Order, ORDER_SORTS)
+
+@app.route('/api/invoices')
+def api_invoices():
+    return api_list('invoices', invoices_query, Invoice, INVOICE_SORTS)
+
+@app.route('/api/clients')
+def api_clients():
+    if not g.user: return api_error("Login required", 401)
+    version = get_data_version()
+    etag = f"v{version}"
+    cached = not_modified(etag)
+    if cached: return cached
+    ranking, next_cursor = client_ranking_page(request.args.get('cursor'))
+    return tagged(jsonify(data_version=version, next_cursor=next_cursor, items=ranking), etag)
+
+@app.route('/api/reports/aging')
+def api_aging_report():
+    if not g.user: return api_error("Login required", 401)
+    return jsonify(aging_report(request.args.get('client_id', type=int)))
+
+@app.route('/api/reports/<kind>')
+def api_report(kind):
+    """Totals for any date range from the columnar cache: ?date_from=&date_to= (inclusive, YYYY[-MM[-DD]], default the
+    last 30 days), group=day|week|month, by=status,client, and optional status= / client_id= filters."""
+    if not g.user: return api_error("Login required", 401)
+    kind = {'orders': 'order', 'invoices': 'invoice'}.get(kind)
+    if kind is None: return api_error("Unknown report; choose orders or invoices", 404)
+    group = request.args.get('group', 'day')
+    if group not in REPORT_GROUPS: return api_error(f"Unknown group; choose from {', '.join(REPORT_GROUPS)}", 400)
+    by = [b.strip() for b in request.args.get('by', '').split(',') if b.strip()]
+    if not all(b in REPORT_BY for b in by): return api_error(f"Unknown breakdown; choose from {', '.join(REPORT_BY)}", 400)
+    today = day_start(virtual_now())
+    start, end = today - timedelta(days=29), today + timedelta(days=1)
+    for key in ('date_from', 'date_to'):
+        if not request.args.get(key): continue
+        bounds = parse_date_term(request.args[key])
+        if bounds is None: return api_error(f"Invalid {key}: use YYYY, YYYY-MM or YYYY-MM-DD", 400)
+        if key == 'date_from': start = bounds[0]
+        else: end = bounds[1]
+    started = time.perf_counter()
+    columnar.sync()
+    synced = time.perf_counter()
+    report = columnar_report(kind, start, end, group, by, request.args.get('status') or None, request.args.get('client_id', type=int))
+    return jsonify(kind=kind, date_from=start.date().isoformat(), date_to=(end - timedelta(days=1)).date().isoformat(), group=group, by=by,
+                   sync_ms=round((synced - started) * 1000, 2), report_ms=round((time.perf_counter() - synced) * 1000, 2), **report)
+
 # --- AUDIT LOG ROUTE (FIXED SEARCH) ---
 @app.route('/audit')
 def audit_log():
     if 'user_id' not in session: return redirect(url_for('login'))
-    search_q = request.args.get('q', '')
-    action_filter = request.args.get('action_type', '')
-    
-    query = AuditLog.query
-    
-    # 1. UNIVERSAL SEARCH
-    if search_q:
-        search_term = f"%{search_q}%"
-        query = query.filter(
-            or_(
-                AuditLog.description.like(search_term),
-                AuditLog.action.like(search_term),
-                AuditLog.actor_id.like(search_term),
-                AuditLog.actor_type.like(search_term), # Added Actor Type (SuperAdmin)
-                AuditLog.entity_id.like(search_term),
-                AuditLog.entity_type.like(search_term), # Added Entity Type (User, Invoice)
-                AuditLog.status.like(search_term),
-                func.cast(AuditLog.timestamp, db.String).like(search_term) # Added Timestamp
-            )
-        )
-        
-    # 2. FILTER
-    if action_filter and action_filter != 'All':
-        query = query.filter(AuditLog.action == action_filter)
-        
-    logs = query.order_by(AuditLog.timestamp.desc()).all()
-    unique_actions = [r.action for r in db.session.query(AuditLog.action).distinct()]
-    return render_template('audit_log.html', logs=logs, unique_actions=unique_actions)
+    with analytics_source() as (read_session, _, snapshot_age):
+        logs, next_cursor = audit_page(request.args, request.args.get('cursor'), read_session=read_session)
+        unique_actions = [r.action for r in read_session.query(AuditLog.action).distinct()]
+        unique_actions += sorted(archived_audit_actions(read_session) - set(unique_actions))
+        return render_template('audit_log.html', logs=logs, unique_actions=unique_actions, next_cursor=next_cursor, page_size=get_page_size(), snapshot_age=snapshot_age)
 
 @app.route('/audit/view/<int:log_id>')
 def audit_details(log_id):
     if 'user_id' not in session: return redirect(url_for('login'))
-    log = AuditLog.query.get_or_404(log_id)
+    log = db.session.get(AuditLog, log_id) or archived_audit_row(log_id)
+    if log is None: abort(404)
     return render_template('audit_details.html', log=log)
 
+@app.route('/export/<kind>')
+def export(kind):
+    if 'user_id' not in session: return redirect(url_for('login'))
+    if kind not in EXPORTS: return "Unknown export", 404
+    fmt = 'jsonl' if request.args.get('format') == 'jsonl' else 'csv'
+    compress = request.args.get('gzip') == '1'
+    stream = export_stream(export_rows(kind, request.args), fmt, compress)
+    first = next(stream, b'') # runs the query now, so a failing export errors here instead of mid-download
+    log_action('User', g.user.username if g.user else None, 'Data Exported', 'Export', kind, 'Success', f"Exported {kind} as {fmt}{' (gzip)' if compress else ''}")
+    filename = f"{kind}-{virtual_now().strftime('%Y%m%d-%H%M%S')}.{fmt}" + ('.gz' if compress else '')
+    mimetype = 'application/gzip' if compress else ('text/csv' if fmt == 'csv' else 'application/x-ndjson')
+    body = stream_with_context(itertools.chain([first], stream))
+    return app.response_class(body, mimetype=mimetype, headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @app.route('/admin/panel')
 @admin_required
 def admin_panel():
@@ -476,9 +2916,8 @@ def create_admin():
         if User.query.filter_by(username=request.form['username']).first():
             flash('Username already exists.')
             return redirect(url_for('create_admin'))
-        count = User.query.count() + 1
         new_user = User(
-            custom_id=f"USR-{datetime.now().year}-{count:03d}",
+            custom_id=allocate_code('user', datetime.now()),
             username=request.form['username'],
             password=request.form['password'],
             role=request.form['role'],
@@ -500,7 +2939,7 @@ def edit_admin(user_id):
 
     if request.method == 'POST':
         admin_password = request.form.get('admin_password')
-        if not admin_password or admin_password != g.user.password:
+        if not admin_password or admin_password != db.session.get(User, g.user.id).password:
             flash("Incorrect password. Authority change denied.", "danger")
             log_action('SuperAdmin', g.user.username, 'Edit Role Failed', 'User', user.custom_id, 'Failure', 'Incorrect password confirmation')
             return redirect(url_for('edit_admin', user_id=user.id))
@@ -510,6 +2949,7 @@ def edit_admin(user_id):
         
         user.role = new_role
         db.session.commit()
+        user_cache.invalidate(user.id)
         
         log_action('SuperAdmin', g.user.username, 'Authority Changed', 'User', user.custom_id, 'Success', f'Changed role from {old_role} to {new_role}')
         flash(f'User {user.username} updated to {new_role}.', 'success')
@@ -526,6 +2966,7 @@ def reset_password(user_id):
     if new_username: user.username = new_username
     user.must_change_password = True
     db.session.commit()
+    user_cache.invalidate(user.id)
     log_action('SuperAdmin', session.get('username'), 'Credentials Updated', 'User', user.custom_id, 'Success', f'Reset password for {user.username}')
     return redirect(url_for('admin_panel'))
 
@@ -535,6 +2976,7 @@ def suspend_admin(user_id):
     user = User.query.get(user_id)
     user.is_suspended = not user.is_suspended
     db.session.commit()
+    user_cache.invalidate(user.id)
     
     action_type = "Account Suspended" if user.is_suspended else "Account Reactivated"
     log_action('SuperAdmin', session.get('username'), action_type, 'User', user.custom_id, 'Warning', f'User {user.username} status toggled.')
@@ -549,13 +2991,14 @@ def delete_admin(user_id):
         u_id = user.custom_id
         db.session.delete(user)
         db.session.commit()
+        user_cache.invalidate(user_id)
         log_action('SuperAdmin', session.get('username'), 'Account Deleted', 'User', u_id, 'Danger', f'Deleted user: {u_name}')
     return redirect(url_for('admin_panel'))
 
 @app.route('/admin/danger_zone', methods=['GET', 'POST'])
 @admin_required
 def danger_zone():
-    current_skipped = get_total_skipped_days()
+    current_skipped = time_offset_days() + int(get_state('stored_shift_days', 0))
     
     if request.method == 'POST':
         action = request.form.get('action')
@@ -566,8 +3009,17 @@ def danger_zone():
                 Order.query.delete()
                 Client.query.delete()
                 AuditLog.query.delete()
-                reset_skipped_days()
+                AuditArchiveSegment.query.delete()
+                DailyRollup.query.delete()
+                MonthlyRollup.query.delete()
+                ReceivableAging.query.delete()
+                ClientTotal.query.delete()
+                set_time_offset_days(0)
+                set_state('stored_shift_days', 0)
+                bump_data_version()
+                bump_columnar_generation()
                 db.session.commit()
+                remove_audit_archive_files()
                 log_action('SuperAdmin', session.get('username'), 'Hard Reset', 'System', 'ALL', 'Success', 'Wiped all business data.')
                 flash('SYSTEM WIPE SUCCESSFUL: All data cleared.', 'success')
             except Exception as e:
@@ -578,20 +3030,10 @@ def danger_zone():
             try:
                 days = int(request.form.get('days', 0))
                 if days > 0:
-                    delta = timedelta(days=days)
-                    orders = Order.query.all()
-                    for o in orders: o.date_placed -= delta
-                    invoices = Invoice.query.all()
-                    for i in invoices:
-                        i.date_created -= delta
-                        i.date_due -= delta
-                        if i.status in ['Pending', 'Sent'] and i.date_due < datetime.now():
-                            i.status = 'Overdue'
-                    logs = AuditLog.query.all()
-                    for l in logs: l.timestamp -= delta
-                    
-                    add_skipped_days(days)
+                    set_time_offset_days(time_offset_days() + days)
+                    bump_data_version()
                     db.session.commit()
+                    run_overdue_sweep()
                     log_action('SuperAdmin', session.get('username'), 'Time Travel', 'System', 'ALL', 'Success', f'Shifted data back by {days} days.')
                     flash(f'Time Travel Successful: Data is now {days} days older.', 'success')
             except Exception as e:
@@ -600,22 +3042,16 @@ def danger_zone():
 
         elif action == 'undo_time_skip':
             try:
-                days_to_restore = get_total_skipped_days()
+                days_to_restore = current_skipped
                 if days_to_restore > 0:
-                    delta = timedelta(days=days_to_restore)
-                    orders = Order.query.all()
-                    for o in orders: o.date_placed += delta
-                    invoices = Invoice.query.all()
-                    today = datetime.now()
-                    for i in invoices:
-                        i.date_created += delta
-                        i.date_due += delta
-                        if i.status == 'Overdue' and i.date_due >= today:
-                            i.status = 'Pending'
-                    logs = AuditLog.query.all()
-                    for l in logs: l.timestamp += delta
-                    
-                    reset_skipped_days()
+                    stored = int(get_state('stored_shift_days', 0))
+                    if stored:
+                        shift_stored_dates(stored)
+                        set_state('stored_shift_days', 0)
+                    set_time_offset_days(0)
+                    reopen_invoices_due_after(virtual_now())
+                    rebucket_aging()
+                    bump_data_version()
                     db.session.commit()
                     log_action('SuperAdmin', session.get('username'), 'Undo Time Travel', 'System', 'ALL', 'Success', f'Restored {days_to_restore} days.')
                     flash(f'Undo Successful: System restored to original time.', 'success')
@@ -632,37 +3068,9 @@ def danger_zone():
 @app.route('/generate_bulk_data')
 @operator_required
 def generate_bulk_data():
-    client_names = ["Vogue Styles", "Urban Trends Boutique", "Silk & Cotton Co", "Velvet Runway", "Modern Menswear", "Chic Streetwear", "Luxe Fabrics Ltd", "Denim Supply Depot", "Kids Corner Fashion", "Summer Breeze Apparel", "Winter Warmth Gear", "Athletic Aesthetics", "Vintage Threads", "Haute Couture House", "Basic Essentials", "Fashion Forward Inc"]
-    clients = []
-    for name in client_names:
-        exists = Client.query.filter_by(name=name).first()
-        if not exists:
-            c = Client(name=name, email=f"contact@{name.replace(' ','').lower()}.com", company=name)
-            db.session.add(c)
-            clients.append(c)
-        else: clients.append(exists)
-    db.session.commit()
-
-    descriptions = ["Summer Collection Shipment", "Bulk T-Shirts Printing", "Winter Coats Manufacturing", "Silk Scarf Production", "Denim Jeans Supply", "Fashion Photoshoot Styling", "Runway Accessories", "Custom Embroidery Service", "Leather Jacket Order", "Sustainable Cotton Fabrics", "Activewear Line Launch", "Vintage Dress Restoration"]
-    start_date = datetime.now() - timedelta(days=730) 
-    end_date = datetime.now()
-    for _ in range(150): 
-        days_between = (end_date - start_date).days
-        order_date = start_date + timedelta(days=random.randrange(days_between))
-        client = random.choice(clients)
-        desc = random.choice(descriptions)
-        amount = random.uniform(500, 4000)
-        status = 'Invoiced' if random.random() > 0.3 else 'Pending'
-        code = f"ORD-{order_date.strftime('%Y%m')}-{random.randint(1000,9999)}"
-        o = Order(order_code=code, client_id=client.id, description=desc, amount=amount, date_placed=order_date, status=status)
-        db.session.add(o)
-        db.session.commit()
-        if status == 'Invoiced':
-            inv_code = f"INV-{order_date.strftime('%Y%m')}-{random.randint(1000,9999)}"
-            inv = Invoice(invoice_code=inv_code, order_id=o.id, client_id=client.id, amount=amount, status='Paid', date_created=order_date, date_due=order_date)
-            db.session.add(inv)
-    db.session.commit()
-    flash("Success! Added 150+ fashion-related mock orders with Proper IDs.")
+    orders = min(request.args.get('orders', 150, type=int), app.config['GENERATOR_MAX_ROUTE_ORDERS'])
+    result = generate_synthetic_data(orders=orders, seed=request.args.get('seed', type=int))
+    flash(f"Success! Added {result['orders']} fashion-related mock orders and {result['invoices']} invoices ({result['rows_per_sec']:,.0f} rows/sec).")
     return redirect(url_for('dashboard'))
 
 @app.route('/guide')
@@ -671,32 +3079,50 @@ def guide(): return render_template('guide.html')
 @app.route('/error')
 def error_page(): return render_template('error.html')
 
-if __name__ == '__main__':
+# --- 5. APPLICATION SETUP ---
+# Everything above only defines the module-level app. configure_app() binds it to the database and the background
+# services; it does no DDL and scans no table. The one query it makes reads the schema version, to warn when
+# `flask db-upgrade` has not been run. Entry points: `gunicorn 'app:configure_app()'` and
+# `flask --app 'app:configure_app()' <command>`.
+
+startup_log = logging.getLogger(__name__ + '.startup')
+worker_startup = {}
+
+def configure_app(config=None):
+    """Bind the module-level app and return it. This is not a factory: every call configures the same app, whose
+    database engine is created on the first call. `config` overrides settings taken from the environment; a later
+    call may change other settings but not the database URL."""
+    global dashboard_cache
+    started = time.perf_counter()
+    if config:
+        if 'sqlalchemy' in app.extensions and config.get('SQLALCHEMY_DATABASE_URI', app.config['SQLALCHEMY_DATABASE_URI']) != app.config['SQLALCHEMY_DATABASE_URI']:
+            raise RuntimeError('configure_app() cannot change the database URL once the app is bound; start a new process instead.')
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    if 'sqlalchemy' not in app.extensions: db.init_app(app)
+    dashboard_cache = make_cache(app.config['DASHBOARD_CACHE_BACKEND'], app.config['DASHBOARD_CACHE_PATH'], app.config['DASHBOARD_CACHE_SIZE'], app.config['DASHBOARD_CACHE_TTL'])
+    audit_sink.init_app(app)
+    analytics_snapshot.init_app(app)
+    scheduler.jobs.clear()
+    scheduler.add_job('overdue-sweep', app.config['OVERDUE_SWEEP_INTERVAL'], run_overdue_sweep)
+    scheduler.add_job('audit-archive', app.config['AUDIT_ARCHIVE_INTERVAL'], archive_audit_log)
+    if app.config['ANALYTICS_SNAPSHOT_PATH']: scheduler.add_job('analytics-snapshot', app.config['ANALYTICS_SNAPSHOT_INTERVAL'], analytics_snapshot.refresh)
     with app.app_context():
-        try:
-            with db.engine.connect() as conn:
-                try: conn.execute(text("ALTER TABLE `order` ADD COLUMN order_code VARCHAR(50)"))
-                except: pass
-        except: pass
-        
-        db.create_all()
-        
-        # --- DATA MIGRATION ---
-        # Consolidate "Suspended User" to "Account Suspended"
-        try:
-            db.session.execute(text("UPDATE audit_log SET action = 'Account Suspended' WHERE action = 'Suspended User'"))
-            db.session.execute(text("UPDATE audit_log SET action = 'Account Reactivated' WHERE action = 'Re-activated User'"))
-            db.session.execute(text("UPDATE audit_log SET action = 'Account Deleted' WHERE action = 'Delete User'"))
-            db.session.execute(text("UPDATE audit_log SET action = 'Authority Changed' WHERE action = 'Edit User Role'"))
-            db.session.execute(text("UPDATE audit_log SET action = 'Password Changed' WHERE action = 'Password Change'"))
-            db.session.commit()
-        except Exception as e:
-            print(f"Migration Notice: {e}")
-        # ----------------------
+        if not event.contains(db.engine, 'connect', apply_sqlite_pragmas): event.listen(db.engine, 'connect', apply_sqlite_pragmas)
+        version = schema_version()
+        db.session.remove()
+    if version < SCHEMA_VERSION:
+        startup_log.warning("Database schema is at version %d but this code expects %d; run `flask --app 'app:configure_app()' db-upgrade`.", version, SCHEMA_VERSION)
+    finished = time.perf_counter()
+    worker_startup.update(pid=os.getpid(), schema_version=version, import_seconds=round(started - _import_started, 4),
+                          configure_app_seconds=round(finished - started, 4), startup_seconds=round(finished - _import_started, 4))
+    startup_log.info("Worker %d ready in %.0f ms (import %.0f ms, configure_app %.0f ms)", os.getpid(), worker_startup['startup_seconds'] * 1000,
+                     worker_startup['import_seconds'] * 1000, worker_startup['configure_app_seconds'] * 1000)
+    return app
 
-        if not User.query.first():
-            admin = User(username='admin', password='password123', role='SuperAdmin', custom_id='USR-ADMIN-001')
-            db.session.add(admin)
-            db.session.commit()
-            
-    app.run(debug=True)
\ No newline at end of file
+if __name__ == '__main__':
+    # Development server only: applies pending migrations itself. See README for the multi-worker launch.
+    configure_app()
+    with app.app_context(): upgrade_database()
+    app.run(debug=os.environ.get('FLASK_DEBUG', '1') == '1')
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""Route-level benchmark for the hot pages.
+
+Seeds a database per size with the synthetic data generator (cached under --data-dir), then drives the
+routes through the Flask test client and records worker startup time, latency percentiles, SQL statements per request and
+peak Python memory. Each size runs in its own process, because the database URL is read at import time.
+Templates missing from the checkout render as empty pages, so the timings cover the queries and the
+context each view builds, not the markup.
+
+    python bench_routes.py --sizes 1000 100000 1000000 --out bench/today.json
+    python bench_routes.py --sizes 1000 --out bench/new.json --compare bench/today.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+from jinja2 import BaseLoader, ChoiceLoader
+
+ROUTES = [
+    ('dashboard', '/dashboard'),
+    ('dashboard (cold cache)', '/dashboard'),
+    ('orders', '/orders'),
+    ('orders by price', '/orders?sort=price_high'),
+    ('orders search', '/orders?search=vogue'),
+    ('invoices', '/invoices'),
+    ('invoices paid', '/invoices?status=Paid'),
+    ('audit', '/audit'),
+    ('audit search', '/audit?q=login'),
+    ('api dashboard', '/api/dashboard'),
+    ('api orders', '/api/orders?fields=id,order_code,client,amount,status'),
+    ('api invoices paid', '/api/invoices?status=Paid'),
+    ('report by month', '/api/reports/orders?date_from=2024&date_to=2025&group=month&by=status'),
+    ('report week x client', '/api/reports/invoices?date_from=2025-01&date_to=2025-12&group=week&by=client'),
+]
+SEED_END_DATE = datetime(2026, 1, 1)
+ADMIN = {'username': 'bench-admin', 'password': 'bench-password'}
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples_ms):
+    return {'n': len(samples_ms), 'mean_ms': sum(samples_ms) / len(samples_ms), 'p50_ms': percentile(samples_ms, 50),
+            'p95_ms': percentile(samples_ms, 95), 'p99_ms': percentile(samples_ms, 99), 'max_ms': max(samples_ms)}
+
+
+class EmptyTemplates(BaseLoader):
+    """Fallback loader: any template the app cannot find renders as an empty page instead of a 500."""
+    def get_source(self, environment, template):
+        return '', template, lambda: True
+
+
+def load_app(db_file):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_file
+    os.environ.setdefault('OVERDUE_SWEEP_INTERVAL', '0')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as wdp
+    wdp.configure_app()
+    wdp.app.jinja_env.loader = ChoiceLoader([wdp.app.jinja_env.loader, EmptyTemplates()])
+    return wdp
+
+
+def seed(wdp, size):
+    with wdp.app.app_context():
+        wdp.upgrade_database()
+        if not wdp.User.query.filter_by(username=ADMIN['username']).first():
+            wdp.db.session.add(wdp.User(role='SuperAdmin', custom_id='USR-BENCH-001', **ADMIN))
+            wdp.db.session.commit()
+        missing = size - wdp.Order.query.count()
+        if missing > 0:
+            result = wdp.generate_synthetic_data(orders=missing, audit_rows=missing // 2, seed=size, end_date=SEED_END_DATE, chunk_size=20000)
+            print(f"  seeded {size:,} orders in {result['seconds']:.1f}s", file=sys.stderr)
+
+
+def login(wdp):
+    client = wdp.app.test_client()
+    client.post('/login', data=ADMIN)
+    return client
+
+
+def count_statements(wdp):
+    counter = {'n': 0}
+    with wdp.app.app_context():
+        wdp.event.listen(wdp.db.engine, 'before_cursor_execute', lambda *args: counter.__setitem__('n', counter['n'] + 1))
+    return counter
+
+
+def bench_routes(wdp, iterations, warmup):
+    client = login(wdp)
+    counter = count_statements(wdp)
+    results = {}
+    for name, url in ROUTES:
+        cold = 'cold cache' in name
+        statuses = {client.get(url).status_code for _ in range(max(warmup, 1))}
+        if statuses != {200}:
+            # an error page is not a timing: record the failure instead of percentiles that compare() could misread
+            results[name] = {'url': url, 'status': sorted(statuses)[-1], 'error': f"HTTP {', '.join(map(str, sorted(statuses)))}"}
+            print(f"  {name:<24} FAILED {results[name]['error']}", file=sys.stderr)
+            continue
+        samples, statements = [], []
+        for _ in range(iterations):
+            if cold: wdp.dashboard_cache.clear()
+            counter['n'] = 0
+            started = time.perf_counter()
+            statuses.add(client.get(url).status_code)
+            samples.append((time.perf_counter() - started) * 1000)
+            statements.append(counter['n'])
+        status = 200 if statuses == {200} else max(statuses - {200})
+        # memory is measured in a separate pass: tracemalloc slows every allocation down
+        if cold: wdp.dashboard_cache.clear()
+        tracemalloc.start()
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[name] = dict(summarize(samples), url=url, status=status, sql_statements=max(statements), peak_kib=round(peak / 1024, 1))
+        if status != 200: results[name]['error'] = f"HTTP {status} during the timed requests"
+        print(f"  {name:<24} p50 {results[name]['p50_ms']:8.2f} ms  p95 {results[name]['p95_ms']:8.2f} ms  "
+              f"p99 {results[name]['p99_ms']:8.2f} ms  sql {results[name]['sql_statements']:3d}  peak {results[name]['peak_kib']:9.1f} KiB", file=sys.stderr)
+    return results
+
+
+def bench_concurrency(wdp, readers, writers, seconds):
+    """Readers hammer /dashboard and /audit while writers log in (one log_action each) and run the overdue sweep."""
+    stop = time.monotonic() + seconds
+    latencies = {'/dashboard': [], '/audit': []}
+    errors = {'reader': 0, 'writer': 0}
+    writes = [0]
+    lock = threading.Lock()
+
+    def reader(index):
+        client = login(wdp)
+        url = '/dashboard' if index % 2 == 0 else '/audit'
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            status = client.get(url).status_code
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                # an error page is not a page timing: count it, keep it out of the percentiles
+                if status == 200: latencies[url].append(elapsed)
+                else: errors['reader'] += 1
+
+    def writer():
+        client = wdp.app.test_client()
+        while time.monotonic() < stop:
+            status = client.post('/login', data=ADMIN).status_code
+            with wdp.app.app_context():
+                try: wdp.run_overdue_sweep()
+                except Exception:
+                    wdp.db.session.rollback()
+                    status = 500
+            with lock:
+                writes[0] += 1
+                if status >= 500: errors['writer'] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)] + [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wdp.audit_sink.flush()
+    result = {'readers': readers, 'writers': writers, 'seconds': seconds, 'writer_iterations': writes[0], 'errors': errors,
+              'audit_sink': wdp.audit_sink.stats(), 'routes': {url: summarize(s) for url, s in latencies.items() if s}}
+    for url, stats in result['routes'].items():
+        print(f"  concurrent {url:<13} n {stats['n']:5d}  p50 {stats['p50_ms']:8.2f} ms  p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms", file=sys.stderr)
+    print(f"  writers: {writes[0]} iterations, errors {errors}", file=sys.stderr)
+    return result
+
+
+def run_worker(args):
+    db_file = os.path.join(args.data_dir, f'bench_{args.size}.db')
+    wdp = load_app(db_file)
+    seed(wdp, args.size)
+    result = {'startup': dict(wdp.worker_startup), 'routes': bench_routes(wdp, args.iterations, args.warmup)}
+    if args.readers or args.writers:
+        result['concurrency'] = bench_concurrency(wdp, args.readers, args.writers, args.seconds)
+    with open(args.worker_out, 'w') as f: json.dump(result, f)
+
+
+def failed_routes(report):
+    failures = [(size, name, stats['error']) for size, data in report['sizes'].items() for name, stats in data['routes'].items() if stats.get('error')]
+    for size, data in report['sizes'].items():
+        errors = data.get('concurrency', {}).get('errors', {})
+        if any(errors.values()): failures.append((size, 'concurrency', f"{errors['reader']} reader and {errors['writer']} writer errors"))
+    return failures
+
+
+def compare(current, baseline, threshold):
+    """Print per-route p50/p95 changes and return the routes that regressed by more than `threshold` or now fail.
+    Routes that errored on either side are reported but not compared: their timings are not page timings."""
+    regressions = []
+    for size, data in current['sizes'].items():
+        for name, stats in data['routes'].items():
+            old = baseline.get('sizes', {}).get(size, {}).get('routes', {}).get(name)
+            if not old: continue
+            if stats.get('error') or old.get('error') or old.get('status', 200) != 200:
+                side = f"now fails ({stats['error']})" if stats.get('error') else f"baseline failed ({old.get('error') or 'HTTP ' + str(old.get('status'))})"
+                print(f"{size:>9} {name:<24} not compared: {side}")
+                if stats.get('error'): regressions.append((size, name))
+                continue
+            changes = {p: (stats[f'{p}_ms'] - old[f'{p}_ms']) / old[f'{p}_ms'] if old[f'{p}_ms'] else 0 for p in ('p50', 'p95')}
+            flag = 'REGRESSION' if max(changes.values()) > threshold else ''
+            print(f"{size:>9} {name:<24} p50 {old['p50_ms']:8.2f} -> {stats['p50_ms']:8.2f} ms ({changes['p50']:+.0%})  "
+                  f"p95 {old['p95_ms']:8.2f} -> {stats['p95_ms']:8.2f} ms ({changes['p95']:+.0%})  "
+                  f"sql {old['sql_statements']} -> {stats['sql_statements']}  {flag}")
+            if flag: regressions.append((size, name))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000], help='Order counts to seed and benchmark')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--readers', type=int, default=4, help='Concurrent reader threads (0 skips the contention scenario)')
+    parser.add_argument('--writers', type=int, default=2, help='Concurrent writer threads')
+    parser.add_argument('--seconds', type=float, default=10, help='Duration of the contention scenario')
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '.bench'), help='Where seeded databases are kept between runs')
+    parser.add_argument('--out', help='Write results as JSON to this file')
+    parser.add_argument('--compare', help='Baseline JSON to diff against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p50 or p95 slowdown that counts as a regression (0.2 = 20%%)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-out', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    if args.worker: return run_worker(args)
+
+    report = {'meta': {'started': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                       'platform': platform.platform(), 'iterations': args.iterations, 'readers': args.readers, 'writers': args.writers}, 'sizes': {}}
+    for size in args.sizes:
+        print(f"== {size:,} orders", file=sys.stderr)
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp: worker_out = tmp.name
+        command = [sys.executable, os.path.abspath(__file__), '--worker', '--size', str(size), '--worker-out', worker_out, '--data-dir', args.data_dir,
+                   '--iterations', str(args.iterations), '--warmup', str(args.warmup), '--readers', str(args.readers), '--writers', str(args.writers), '--seconds', str(args.seconds)]
+        subprocess.run(command, check=True)
+        with open(worker_out) as f: report['sizes'][str(size)] = json.load(f)
+        os.remove(worker_out)
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f: json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f: regressions = compare(report, json.load(f), args.threshold)
+        if regressions: sys.exit(f"{len(regressions)} routes failed or regressed by more than {args.threshold:.0%}.")
+    failures = failed_routes(report)
+    if failures: sys.exit(f"{len(failures)} routes did not return 200 or errored under contention: " + ', '.join(f"{name} @ {size} ({error})" for size, name, error in failures))
+
+
+if __name__ == '__main__':
+    main()
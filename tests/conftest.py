@@ -0,0 +1,67 @@
+"""Boot the app once per test session against a seeded throwaway SQLite database.
+
+app.py reads its settings at import time, so the environment is set before the first import.
+"""
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADMIN = {'username': 'admin', 'password': 'password123'}
+SEED_END_DATE = datetime(2026, 1, 1)
+
+
+def seed(wdp, orders=300):
+    """Clients, orders over the two years before SEED_END_DATE and a paid invoice for about 70% of them."""
+    rng = random.Random(1)
+    clients = [wdp.Client(name=f'Seed Client {n:02d}', email=f'client{n:02d}@example.com', company=f'Seed Client {n:02d} Ltd') for n in range(16)]
+    wdp.db.session.add_all(clients)
+    wdp.db.session.flush()
+    for n in range(orders):
+        placed = SEED_END_DATE - timedelta(seconds=rng.randrange(730 * 86400))
+        client, amount, invoiced = rng.choice(clients), round(rng.uniform(500, 4000), 2), rng.random() > 0.3
+        order = wdp.Order(order_code=f'ORD-SEED-{n:05d}', client_id=client.id, description=rng.choice(['Denim Jeans Supply', 'Silk Scarf Production', 'Runway Accessories']),
+                          amount=amount, date_placed=placed, status='Invoiced' if invoiced else 'Pending')
+        wdp.db.session.add(order)
+        wdp.db.session.flush()
+        if invoiced: wdp.db.session.add(wdp.Invoice(invoice_code=f'INV-SEED-{n:05d}', order_id=order.id, client_id=client.id, amount=amount, status='Paid', date_created=placed, date_due=placed))
+    wdp.rebuild_rollups()
+
+
+@pytest.fixture(scope='session')
+def wdp(tmp_path_factory):
+    root = tmp_path_factory.mktemp('wdp')
+    os.environ.update(DATABASE_URL=f"sqlite:///{root / 'test.db'}", AUDIT_SINK_MODE='sync', OVERDUE_SWEEP_INTERVAL='0', LAZY_LOAD_LIMIT='0',
+                      AUDIT_ARCHIVE_INTERVAL='0', AUDIT_ARCHIVE_DIR=str(root / 'audit_archive'), JOBS_DIR=str(root / 'jobs'), IMPORT_DIR=str(root / 'imports'))
+    import app as wdp
+    wdp.configure_app()
+    with wdp.app.app_context():
+        wdp.upgrade_database() # migration 8 creates the ADMIN account
+        seed(wdp)
+        wdp.db.session.commit()
+    return wdp
+
+
+@pytest.fixture(scope='session')
+def archived_audit(wdp):
+    """Old audit rows moved into monthly archive segments. The last one inserted is both old and the newest row,
+    so archiving must leave it in the hot table. Returns every audit id, newest first, as it was before archiving."""
+    with wdp.app.app_context():
+        wdp.generate_synthetic_data(orders=0, audit_rows=600, seed=2, end_date=SEED_END_DATE)
+        wdp.db.session.add(wdp.AuditLog(timestamp=SEED_END_DATE - timedelta(days=400), actor_type='System', actor_id='seed', action='Seeded',
+                                        entity_type='System', entity_id='N/A', status='Success', description='oldest and newest'))
+        wdp.db.session.commit()
+        ids = [id_ for (id_,) in wdp.db.session.query(wdp.AuditLog.id).order_by(wdp.AuditLog.timestamp.desc(), wdp.AuditLog.id.desc())]
+        assert wdp.archive_audit_log(365) > 0
+    return ids
+
+
+@pytest.fixture
+def client(wdp):
+    client = wdp.app.test_client()
+    assert client.post('/login', data=ADMIN).status_code == 302
+    return client
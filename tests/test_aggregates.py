@@ -0,0 +1,88 @@
+"""The maintained aggregates must always equal a live GROUP BY over the source tables."""
+from datetime import datetime, timedelta
+
+
+def live_rollups(wdp, grain):
+    rows = {}
+    for kind, (source, date_attr) in wdp.ROLLUP_SOURCES.items():
+        ts = getattr(source, date_attr)
+        bucket = wdp.func.date(ts) if grain == 'day' else wdp.func.strftime('%Y-%m-01', ts)
+        status = wdp.func.coalesce(source.status, '')
+        query = wdp.db.session.query(bucket, status, source.client_id, wdp.func.count(), wdp.func.sum(source.amount)) \
+            .filter(ts.isnot(None)).group_by(bucket, status, source.client_id)
+        rows.update({(str(b), kind, s, c): (n, round(a, 4)) for b, s, c, n, a in query})
+    return rows
+
+
+def stored_rollups(wdp, model):
+    bucket = model.day if model is wdp.DailyRollup else model.month
+    return {(str(b), kind, s, c): (n, round(a, 4)) for b, kind, s, c, n, a in
+            wdp.db.session.query(bucket, model.kind, model.status, model.client_id, model.count, model.amount).filter(model.count != 0)}
+
+
+def live_aging(wdp):
+    as_of, rows = wdp.aging_as_of(), {}
+    for client_id, date_due, amount in wdp.db.session.query(wdp.Invoice.client_id, wdp.Invoice.date_due, wdp.Invoice.amount) \
+            .filter(wdp.Invoice.status.in_(wdp.AGING_OPEN_STATUSES)):
+        key = (client_id, wdp.aging_bucket((as_of - date_due.date()).days if date_due else 0))
+        count, total = rows.get(key, (0, 0))
+        rows[key] = (count + 1, total + (amount or 0))
+    return {key: (n, round(a, 4)) for key, (n, a) in rows.items()}
+
+
+def stored_aging(wdp):
+    model = wdp.ReceivableAging
+    return {(c, b): (n, round(a, 4)) for c, b, n, a in wdp.db.session.query(model.client_id, model.bucket, model.count, model.amount).filter(model.count != 0)}
+
+
+def live_client_totals(wdp):
+    invoice = wdp.Invoice
+    return {c: (n, round(a, 4)) for c, n, a in wdp.db.session.query(invoice.client_id, wdp.func.count(), wdp.func.sum(invoice.amount))
+            .filter(invoice.date_created.isnot(None)).group_by(invoice.client_id)}
+
+
+def stored_client_totals(wdp):
+    model = wdp.ClientTotal
+    return {c: (n, round(a, 4)) for c, n, a in wdp.db.session.query(model.client_id, model.invoice_count, model.invoice_amount).filter(model.invoice_count != 0)}
+
+
+def assert_aggregates_match(wdp):
+    with wdp.app.app_context():
+        assert stored_rollups(wdp, wdp.DailyRollup) == live_rollups(wdp, 'day')
+        assert stored_rollups(wdp, wdp.MonthlyRollup) == live_rollups(wdp, 'month')
+        assert wdp.aging_as_of() is not None
+        assert stored_aging(wdp) == live_aging(wdp)
+        assert stored_client_totals(wdp) == live_client_totals(wdp)
+
+
+def uninvoiced_order(wdp):
+    with wdp.app.app_context():
+        return wdp.Order.query.filter(wdp.Order.status == 'Pending', ~wdp.Order.id.in_(wdp.db.session.query(wdp.Invoice.order_id).filter(wdp.Invoice.order_id.isnot(None)))).first().id
+
+
+def test_seeded_data_matches(wdp):
+    assert_aggregates_match(wdp)
+
+
+def test_invoice_create_edit_delete_keep_aggregates(wdp, client):
+    order_id = uninvoiced_order(wdp)
+    assert client.post(f'/invoices/create/{order_id}').status_code == 302
+    assert_aggregates_match(wdp)
+    with wdp.app.app_context(): invoice_id = wdp.Invoice.query.filter_by(order_id=order_id).one().id
+
+    issued, due = datetime(2025, 3, 14), datetime.now() + timedelta(days=10)
+    form = {'amount': '1234.5', 'status': 'Sent', 'date_created': issued.strftime('%Y-%m-%d'), 'date_due': due.strftime('%Y-%m-%d')}
+    assert client.post(f'/invoices/edit/{invoice_id}', data=form).status_code == 302
+    with wdp.app.app_context(): assert wdp.db.session.get(wdp.Invoice, invoice_id).status == 'Sent'
+    assert_aggregates_match(wdp)
+
+    form.update(status='Pending', date_due='2025-04-01') # a due date in the past flips it to Overdue
+    assert client.post(f'/invoices/edit/{invoice_id}', data=form).status_code == 302
+    with wdp.app.app_context(): assert wdp.db.session.get(wdp.Invoice, invoice_id).status == 'Overdue'
+    assert_aggregates_match(wdp)
+
+    assert client.post(f'/invoices/delete/{invoice_id}').status_code == 302
+    with wdp.app.app_context():
+        assert wdp.db.session.get(wdp.Invoice, invoice_id) is None
+        assert wdp.db.session.get(wdp.Order, order_id).status == 'Pending'
+    assert_aggregates_match(wdp)
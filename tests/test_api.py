@@ -0,0 +1,37 @@
+import pytest
+
+API_ROUTES = ['/api/dashboard', '/api/orders', '/api/invoices', '/api/clients',
+              '/api/reports/orders?date_from=2025&date_to=2025-12&group=month', '/api/reports/invoices?by=status,client&group=week']
+
+
+@pytest.mark.parametrize('url', API_ROUTES)
+def test_api_requires_login(wdp, url):
+    assert wdp.app.test_client().get(url).status_code == 401
+
+
+@pytest.mark.parametrize('url', API_ROUTES)
+def test_api_answers(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, response.data[:500]
+    assert isinstance(response.get_json(), dict)
+
+
+@pytest.mark.parametrize('url', ['/api/dashboard', '/api/orders', '/api/invoices'])
+def test_api_revalidates_with_etag(client, url):
+    etag = client.get(url).headers['ETag']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+
+@pytest.mark.parametrize('url, model', [('/api/orders', 'Order'), ('/api/invoices', 'Invoice')])
+def test_api_cursor_walks_every_row(wdp, client, url, model):
+    ids, cursor = [], None
+    while True:
+        page = client.get(url + '?fields=id&per_page=100' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        ids += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+        if not cursor: break
+    with wdp.app.app_context(): assert sorted(ids) == sorted(id_ for (id_,) in wdp.db.session.query(getattr(wdp, model).id))
+
+
+def test_api_rejects_unknown_fields(client):
+    assert client.get('/api/orders?fields=nope').status_code == 400
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_configure_app_binds_the_module_app_once(wdp):
+    assert wdp.configure_app() is wdp.app
+    assert wdp.configure_app({'DASHBOARD_CACHE_TTL': wdp.app.config['DASHBOARD_CACHE_TTL']}) is wdp.app
+    with pytest.raises(RuntimeError):
+        wdp.configure_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    with wdp.app.app_context():
+        assert wdp.schema_version() == wdp.SCHEMA_VERSION
+        assert wdp.upgrade_database() == []
+
+
+def test_in_memory_database_starts_and_upgrades(wdp):
+    script = ("import app; app.configure_app()\n"
+              "with app.app.app_context():\n"
+              "    app.upgrade_database()\n"
+              "    print(app.schema_version(), app.User.query.count())\n")
+    env = dict(os.environ, DATABASE_URL='sqlite://', OVERDUE_SWEEP_INTERVAL='0', AUDIT_ARCHIVE_INTERVAL='0', AUDIT_SINK_MODE='sync')
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == [str(wdp.SCHEMA_VERSION), '1']
@@ -0,0 +1,24 @@
+def test_archiving_keeps_the_newest_row_hot(wdp, archived_audit):
+    with wdp.app.app_context():
+        assert wdp.AuditArchiveSegment.query.count() > 0
+        assert wdp.db.session.query(wdp.func.max(wdp.AuditLog.id)).scalar() == max(archived_audit)
+
+
+def test_page_walk_merges_archived_rows(wdp, archived_audit):
+    ids, cursor = [], None
+    with wdp.app.test_request_context():
+        while True:
+            rows, cursor = wdp.audit_page({}, cursor, page_size=97)
+            ids += [row.id for row in rows]
+            if not cursor: break
+    # rows logged after the fixture archived (logins by later tests) sit in front of the archived ones
+    assert ids[-len(archived_audit):] == archived_audit
+
+
+def test_search_and_details_reach_the_archive(wdp, archived_audit):
+    with wdp.app.test_request_context():
+        hot = {id_ for (id_,) in wdp.db.session.query(wdp.AuditLog.id)}
+        archived = [id_ for id_ in archived_audit if id_ not in hot]
+        assert archived and wdp.archived_audit_row(archived[0]).id == archived[0]
+        rows, _ = wdp.audit_page({'date_from': '2024-01-01', 'date_to': '2024-12-31'}, page_size=500)
+        assert rows and all(row.timestamp.year == 2024 for row in rows) and set(archived) & {row.id for row in rows}
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from conftest import ADMIN
+
+
+def login_rows(wdp):
+    with wdp.app.app_context(): return wdp.AuditLog.query.filter_by(action='Login').count()
+
+
+def test_sync_sink_writes_audit_rows_inline(wdp):
+    before = login_rows(wdp)
+    assert wdp.app.test_client().post('/login', data=ADMIN).status_code == 302
+    assert login_rows(wdp) == before + 1
+
+
+def test_async_sink_writes_buffered_rows_on_flush(wdp):
+    sink = wdp.AuditSink(wdp.app)
+    sink.mode = 'async'
+    with wdp.app.app_context(): before = wdp.AuditLog.query.filter_by(actor_id='sink-test').count()
+    for n in range(5):
+        sink.emit(dict(timestamp=datetime.utcnow(), actor_type='System', actor_id='sink-test', action='Sink Test', entity_type='Test',
+                       entity_id=str(n), status='Success', description='buffered'))
+    sink.flush()
+    sink.close()
+    with wdp.app.app_context(): assert wdp.AuditLog.query.filter_by(actor_id='sink-test').count() == before + 5
+    assert sink.stats()['written'] == 5 and sink.stats()['dropped'] == 0
@@ -0,0 +1,57 @@
+from test_aggregates import assert_aggregates_match
+
+
+def audit_events(wdp, action):
+    return wdp.metrics.counters.get(('wdp_audit_events_total', (('action', action),)), 0)
+
+
+def pending_orders(wdp, **filters):
+    with wdp.app.app_context():
+        return sorted(id_ for (id_,) in wdp.db.session.query(wdp.Order.id).filter(wdp.batch_invoice_filter(**filters)))
+
+
+def test_route_invoices_a_clients_pending_orders(wdp, client):
+    with wdp.app.app_context(): client_id = wdp.Client.query.filter_by(name='Seed Client 03').one().id
+    orders = pending_orders(wdp, client_id=client_id)
+    assert 0 < len(orders) <= wdp.app.config['BATCH_INVOICE_INLINE_LIMIT']
+    events_before, batches_before = audit_events(wdp, 'Invoice Generated'), audit_events(wdp, 'Batch Invoiced')
+    assert client.post('/invoices/batch', data={'client_id': client_id}).status_code == 302
+    assert pending_orders(wdp, client_id=client_id) == []
+    with wdp.app.app_context():
+        invoices = wdp.Invoice.query.filter(wdp.Invoice.order_id.in_(orders)).all()
+        assert len(invoices) == len(orders) and {i.status for i in invoices} == {'Pending'}
+        assert {o.status for o in wdp.Order.query.filter(wdp.Order.id.in_(orders))} == {'Invoiced'}
+        codes = {i.invoice_code for i in invoices}
+        # the per-invoice audit rows went through the sink, so /metrics counted them
+        assert {row.entity_id for row in wdp.AuditLog.query.filter_by(action='Invoice Generated')} >= codes
+        assert wdp.AuditLog.query.filter_by(action='Batch Invoiced', actor_id='admin').count() == 1
+    assert audit_events(wdp, 'Invoice Generated') == events_before + len(orders)
+    assert audit_events(wdp, 'Batch Invoiced') == batches_before + 1
+    assert_aggregates_match(wdp)
+
+
+def test_chunked_batch_numbers_codes_consecutively(wdp):
+    orders = pending_orders(wdp, date_from='2024', date_to='2024')
+    assert len(orders) > 7
+    with wdp.app.app_context():
+        result = wdp.batch_invoice(date_from='2024', date_to='2024', actor='test', chunk_size=7)
+        assert result['invoiced'] == len(orders)
+        codes = sorted(code for (code,) in wdp.db.session.query(wdp.Invoice.invoice_code).filter(wdp.Invoice.order_id.in_(orders)))
+    prefix = result['first_code'].rsplit('-', 1)[0] + '-'
+    first = int(result['first_code'].rsplit('-', 1)[1])
+    assert codes == [f'{prefix}{n:03d}' for n in range(first, first + len(orders))] and codes[-1] == result['last_code']
+    assert pending_orders(wdp, date_from='2024', date_to='2024') == []
+    assert_aggregates_match(wdp)
+
+
+def test_failed_inline_batch_rolls_back_and_redirects(wdp, client, monkeypatch):
+    orders = pending_orders(wdp)
+    assert orders
+    def broken(*args, **kwargs): raise RuntimeError('boom')
+    monkeypatch.setattr(wdp, 'rollup_add_from_query', broken) # fails after the first chunk's INSERT
+    response = client.post('/invoices/batch', data={})
+    assert response.status_code == 302 and response.location.endswith('/invoices')
+    with client.session_transaction() as session: assert any('failed' in message for _, message in session['_flashes'])
+    assert pending_orders(wdp) == orders
+    monkeypatch.undo()
+    assert_aggregates_match(wdp)
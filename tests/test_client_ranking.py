@@ -0,0 +1,37 @@
+from test_aggregates import assert_aggregates_match, live_client_totals, uninvoiced_order
+
+
+def live_ranking(wdp):
+    with wdp.app.app_context(): totals = live_client_totals(wdp)
+    return [client_id for client_id, _ in sorted(totals.items(), key=lambda item: (-item[1][1], -item[0]))]
+
+
+def walk_ranking(client):
+    items, cursor = [], None
+    while True:
+        page = client.get('/api/clients?per_page=5' + (f'&cursor={cursor}' if cursor else '')).get_json()
+        items += page['items']
+        cursor = page['next_cursor']
+        if not cursor: return items
+
+
+def test_pages_follow_a_live_group_by(wdp, client):
+    items = walk_ranking(client)
+    assert [item['client_id'] for item in items] == live_ranking(wdp)
+    assert [item['rank'] for item in items] == list(range(1, len(items) + 1))
+    with wdp.app.app_context(): totals = live_client_totals(wdp)
+    assert all(item['invoice_count'] == totals[item['client_id']][0] for item in items)
+
+
+def test_an_invoice_write_moves_its_client(wdp, client):
+    order_id = uninvoiced_order(wdp)
+    assert client.post(f'/invoices/create/{order_id}').status_code == 302
+    with wdp.app.app_context(): invoice = wdp.Invoice.query.filter_by(order_id=order_id).one()
+    # enough to put the client at the top of the ranking
+    form = {'amount': '10000000', 'status': 'Sent', 'date_created': invoice.date_created.strftime('%Y-%m-%d'), 'date_due': '2099-01-01'}
+    assert client.post(f'/invoices/edit/{invoice.id}', data=form).status_code == 302
+    assert_aggregates_match(wdp)
+    assert walk_ranking(client)[0]['client_id'] == invoice.client_id == live_ranking(wdp)[0]
+    assert client.post(f'/invoices/delete/{invoice.id}').status_code == 302
+    assert_aggregates_match(wdp)
+    assert [item['client_id'] for item in walk_ranking(client)] == live_ranking(wdp)
@@ -0,0 +1,61 @@
+import pytest
+
+from test_aggregates import uninvoiced_order
+
+REPORT = '?date_from=2000&date_to=2030&group=month&by=status,client'
+
+
+def live_groups(wdp, kind):
+    model, date_attr = wdp.ROLLUP_SOURCES[kind]
+    ts = getattr(model, date_attr)
+    month, status = wdp.func.strftime('%Y-%m', ts), wdp.func.coalesce(model.status, '')
+    with wdp.app.app_context():
+        query = wdp.db.session.query(month, status, model.client_id, wdp.func.count(), wdp.func.sum(model.amount)) \
+            .filter(ts.isnot(None)).group_by(month, status, model.client_id)
+        return {(m, s, c): (n, pytest.approx(a, abs=0.01)) for m, s, c, n, a in query}
+
+
+def cached_groups(client, kind):
+    response = client.get(f'/api/reports/{kind}s' + REPORT)
+    assert response.status_code == 200, response.data[:500]
+    return {(g['period'], g['status'], g['client_id']): (g['count'], g['amount']) for g in response.get_json()['groups']}
+
+
+def assert_reports_match(wdp, client):
+    for kind in ('order', 'invoice'): assert cached_groups(client, kind) == live_groups(wdp, kind)
+
+
+def test_reports_match_a_live_group_by(wdp, client):
+    assert_reports_match(wdp, client)
+
+
+def test_new_and_edited_rows_are_patched_in_without_a_reload(wdp, client):
+    assert_reports_match(wdp, client)
+    before = wdp.columnar.stats()
+    order_id = uninvoiced_order(wdp)
+    assert client.post(f'/invoices/create/{order_id}').status_code == 302
+    with wdp.app.app_context(): invoice = wdp.Invoice.query.filter_by(order_id=order_id).one()
+    form = {'amount': '1234.5', 'status': 'Sent', 'date_created': invoice.date_created.strftime('%Y-%m-%d'), 'date_due': '2099-01-01'}
+    assert client.post(f'/invoices/edit/{invoice.id}', data=form).status_code == 302
+    assert_reports_match(wdp, client)
+    assert client.post(f'/invoices/delete/{invoice.id}').status_code == 302
+    assert_reports_match(wdp, client)
+    after = wdp.columnar.stats()
+    # create, edit and delete each patch the rows they changed in place: no reload
+    assert after['loads'] == before['loads'] and after['patches'] == before['patches'] + 3
+
+
+def test_a_write_from_another_process_forces_a_reload(wdp, client):
+    assert_reports_match(wdp, client)
+    loads = wdp.columnar.stats()['loads']
+    with wdp.app.app_context():
+        # what another worker's edit looks like from here: rows changed and the generation moved, with no patch
+        invoice = wdp.Invoice.query.filter_by(status='Paid').order_by(wdp.Invoice.id).first()
+        wdp.rollup_add('invoice', invoice.client_id, invoice.date_created, invoice.status, invoice.amount, -1)
+        invoice.status = 'Sent'
+        wdp.rollup_add('invoice', invoice.client_id, invoice.date_created, invoice.status, invoice.amount)
+        wdp.aging_add(invoice.client_id, invoice.date_due, invoice.status, invoice.amount)
+        wdp.bump_columnar_generation()
+        wdp.db.session.commit()
+    assert_reports_match(wdp, client)
+    assert wdp.columnar.stats()['loads'] == loads + 1
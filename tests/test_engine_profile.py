@@ -0,0 +1,19 @@
+from sqlalchemy import create_engine, text
+
+
+def test_pragmas_apply_to_the_application_engine_only(wdp, tmp_path):
+    with wdp.app.app_context(), wdp.db.engine.connect() as conn:
+        assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'wal'
+        assert conn.exec_driver_sql('PRAGMA busy_timeout').scalar() == wdp.app.config['SQLITE_PRAGMAS']['busy_timeout']
+    other = create_engine(f'sqlite:///{tmp_path / "other.db"}')
+    with other.connect() as conn: assert conn.exec_driver_sql('PRAGMA journal_mode').scalar() == 'delete'
+    other.dispose()
+
+
+def test_engine_options_fit_an_in_memory_database(wdp):
+    assert 'pool_size' in wdp.engine_options('sqlite:////tmp/business_data.db')
+    options = wdp.engine_options('sqlite://')
+    assert not {'pool_size', 'max_overflow', 'pool_timeout'} & set(options)
+    engine = create_engine('sqlite://', **options)
+    with engine.connect() as conn: assert conn.execute(text('SELECT 1')).scalar() == 1
+    engine.dispose()
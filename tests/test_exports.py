@@ -0,0 +1,50 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+EXPORT_MODELS = {'orders': lambda wdp: wdp.Order, 'invoices': lambda wdp: wdp.Invoice, 'audit': lambda wdp: wdp.AuditLog}
+
+
+def export_count(wdp, kind):
+    with wdp.app.app_context():
+        count = EXPORT_MODELS[kind](wdp).query.count()
+        if kind == 'audit': count += sum(segment.rows for segment in wdp.AuditArchiveSegment.query)
+        return count
+
+
+def decode(response, fmt, compressed):
+    body = gzip.decompress(response.data) if compressed else response.data
+    text = body.decode()
+    if fmt == 'csv': return list(csv.DictReader(io.StringIO(text)))
+    return [json.loads(line) for line in text.splitlines()]
+
+
+@pytest.mark.parametrize('fmt', ['csv', 'jsonl'])
+@pytest.mark.parametrize('compressed', [False, True])
+@pytest.mark.parametrize('kind', ['orders', 'invoices', 'audit'])
+def test_export_streams_every_row(wdp, client, kind, fmt, compressed):
+    assert set(wdp.EXPORTS) == set(EXPORT_MODELS)
+    expected = export_count(wdp, kind)
+    response = client.get(f"/export/{kind}?format={fmt}" + ('&gzip=1' if compressed else ''))
+    assert response.status_code == 200
+    rows = decode(response, fmt, compressed)
+    assert len(rows) == expected
+    assert len({row['id'] for row in rows}) == len(rows)
+
+
+def test_audit_export_includes_archived_rows_in_order(wdp, client, archived_audit):
+    rows = decode(client.get('/export/audit'), 'csv', False)
+    assert set(archived_audit) <= {int(row['id']) for row in rows}
+    keys = [(row['timestamp'], int(row['id'])) for row in rows]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_failed_export_is_not_logged(wdp, client, monkeypatch):
+    def broken(kind, args): raise RuntimeError('boom')
+    monkeypatch.setattr(wdp, 'export_rows', broken)
+    with wdp.app.app_context(): before = wdp.AuditLog.query.filter_by(action='Data Exported').count()
+    assert client.get('/export/orders').status_code == 500
+    with wdp.app.app_context(): assert wdp.AuditLog.query.filter_by(action='Data Exported').count() == before
@@ -0,0 +1,74 @@
+import io
+import json
+import time
+
+import pytest
+
+from test_aggregates import assert_aggregates_match
+
+HEADER = 'client_name,client_email,client_company,order_code,description,amount,date_placed,status\n'
+
+
+def imported_orders(wdp, prefix):
+    with wdp.app.app_context():
+        return sorted(code for (code,) in wdp.db.session.query(wdp.Order.order_code).filter(wdp.Order.order_code.like(prefix + '%')))
+
+
+def test_csv_import_rejects_bad_rows_with_their_line_numbers(wdp, tmp_path):
+    path = tmp_path / 'orders.csv'
+    path.write_text(HEADER +
+                    'Import Client A,a@example.com,A Ltd,ORD-IMP-A-1,Linen Shirts,1200.50,2025-03-01T10:00:00,Pending\n'  # line 2
+                    'Import Client A,,,ORD-IMP-A-2,Linen Shirts,-5,2025-03-02,Pending\n'                                  # 3: negative amount
+                    'Import Client B,,,ORD-IMP-B-1,Wool Coats,300,2025-03-03,Pending\n'                                    # 4: new client, no email
+                    'Import Client A,,,ORD-SEED-00001,Linen Shirts,10,2025-03-04,Pending\n'                              # 5: code taken
+                    'Import Client A,,,ORD-IMP-A-3,Linen Shirts,10\n'                                                     # 6: short row
+                    'Import Client A,,,ORD-IMP-A-4,Linen Shirts,99,2025-03-05,Invoiced\n'                                 # 7
+                    'Import Client C,c@example.com,,,,,,\n')                                                              # 8: client only
+    with wdp.app.app_context():
+        result = wdp.import_file(str(path), actor='test', chunk_size=3)
+    assert (result['rows'], result['orders'], result['clients'], result['rejected']) == (7, 2, 2, 4)
+    assert [bad['line'] for bad in result['rejected_rows']] == [3, 4, 5, 6]
+    assert 'client_email' in result['rejected_rows'][1]['reason'] and 'already exists' in result['rejected_rows'][2]['reason']
+    assert result['offset'] == path.stat().st_size and result['line'] == 8
+    assert imported_orders(wdp, 'ORD-IMP-A-') == ['ORD-IMP-A-1', 'ORD-IMP-A-4']
+    with wdp.app.app_context():
+        assert {c.name for c in wdp.Client.query.filter(wdp.Client.name.like('Import Client %'))} == {'Import Client A', 'Import Client C'}
+    assert_aggregates_match(wdp)
+
+
+def test_failed_import_resumes_from_the_last_committed_chunk(wdp, tmp_path, monkeypatch):
+    path = tmp_path / 'orders.jsonl'
+    records = [{'client_name': 'Import Client R', 'client_email': 'r@example.com', 'order_code': f'ORD-IMP-R-{n:02d}',
+                'description': 'Resume Test', 'amount': 100 + n, 'date_placed': '2025-04-01'} for n in range(20)]
+    records[13]['amount'] = 'lots'
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records))
+    write_chunk, calls, progress = wdp.write_import_chunk, [], []
+    def fail_third_chunk(rows, clients):
+        calls.append(len(rows))
+        if len(calls) == 3: raise RuntimeError('disk full')
+        return write_chunk(rows, clients)
+    monkeypatch.setattr(wdp, 'write_import_chunk', fail_third_chunk)
+    with wdp.app.app_context(), pytest.raises(RuntimeError):
+        wdp.import_file(str(path), actor='test', chunk_size=5, progress=lambda done, total, **fields: progress.append(fields))
+    monkeypatch.undo()
+    assert imported_orders(wdp, 'ORD-IMP-R-') == [f'ORD-IMP-R-{n:02d}' for n in range(10)]
+    resume = progress[-1]
+    assert resume['line'] == 10
+    with wdp.app.app_context():
+        result = wdp.import_file(str(path), offset=resume['offset'], line=resume['line'], actor='test', chunk_size=5)
+    assert (result['rows'], result['orders'], result['clients'], result['rejected']) == (10, 9, 0, 1)
+    assert result['rejected_rows'][0]['line'] == 14
+    assert imported_orders(wdp, 'ORD-IMP-R-') == [f'ORD-IMP-R-{n:02d}' for n in range(20) if n != 13]
+    assert_aggregates_match(wdp)
+
+
+def test_upload_runs_as_a_background_job(wdp, client):
+    data = HEADER + 'Import Client U,u@example.com,,ORD-IMP-U-1,Upload Test,42,2025-05-01,Pending\n'
+    response = client.post('/imports', data={'file': (io.BytesIO(data.encode()), 'upload.csv')}, content_type='multipart/form-data')
+    assert response.status_code == 302 and '/jobs/' in response.location
+    for _ in range(100):
+        job = client.get(response.location).get_json()
+        if job['status'] != 'running': break
+        time.sleep(0.05)
+    assert job['status'] == 'done' and job['result']['orders'] == 1
+    assert imported_orders(wdp, 'ORD-IMP-U-') == ['ORD-IMP-U-1']
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+from conftest import SEED_END_DATE
+from test_aggregates import assert_aggregates_match
+
+
+def open_invoices(wdp, count):
+    """The seeded invoices are all settled, so reopen a few, due on consecutive days a month after the seeded data."""
+    invoices = wdp.Invoice.query.filter_by(status='Paid').order_by(wdp.Invoice.id).limit(count).all()
+    for index, invoice in enumerate(invoices):
+        invoice.status = ('Pending', 'Sent')[index % 2]
+        invoice.date_due = SEED_END_DATE + timedelta(days=30 + index, hours=9)
+    wdp.rebuild_rollups()
+    wdp.db.session.commit()
+    return invoices
+
+
+def test_sweep_flags_invoices_due_before_today(wdp):
+    with wdp.app.app_context():
+        invoices = open_invoices(wdp, 4)
+        codes = [invoice.invoice_code for invoice in invoices]
+        # the day after the second due date: the first two are past due, the third is due that same day
+        assert wdp.run_overdue_sweep(invoices[1].date_due + timedelta(days=1)) >= 2
+        statuses = {invoice.invoice_code: invoice.status for invoice in wdp.Invoice.query.filter(wdp.Invoice.invoice_code.in_(codes))}
+        assert [statuses[code] for code in codes] == ['Overdue', 'Overdue', 'Pending', 'Sent']
+        logged = {row.entity_id for row in wdp.AuditLog.query.filter_by(action='Invoice Overdue')}
+        assert set(codes[:2]) <= logged and not set(codes[2:]) & logged
+    assert_aggregates_match(wdp)
+
+
+def test_reopen_restores_the_status_before_the_sweep(wdp):
+    with wdp.app.app_context():
+        invoices = open_invoices(wdp, 10)
+        before = {invoice.id: invoice.status for invoice in invoices}
+        assert wdp.run_overdue_sweep(SEED_END_DATE + timedelta(days=400)) >= 10
+        assert {wdp.db.session.get(wdp.Invoice, id).status for id in before} == {'Overdue'}
+        assert wdp.reopen_invoices_due_after(SEED_END_DATE) >= 10
+        wdp.db.session.commit()
+        assert {id: wdp.db.session.get(wdp.Invoice, id).status for id in before} == before
+    assert_aggregates_match(wdp)
+
+
+def test_reopen_uses_the_sweep_day_boundary(wdp):
+    with wdp.app.app_context():
+        invoice = open_invoices(wdp, 2)[1]
+        due = invoice.date_due
+        wdp.run_overdue_sweep(due + timedelta(days=1))
+        assert wdp.db.session.get(wdp.Invoice, invoice.id).status == 'Overdue'
+        # later on the due day itself the invoice is not overdue yet, so it reopens
+        assert wdp.reopen_invoices_due_after(due + timedelta(hours=6)) >= 1
+        wdp.db.session.commit()
+        assert wdp.db.session.get(wdp.Invoice, invoice.id).status == 'Sent'
+    assert_aggregates_match(wdp)
@@ -0,0 +1,10 @@
+def test_hot_queries_use_indexes(wdp):
+    result = wdp.app.test_cli_runner().invoke(args=['check-query-plans'])
+    assert result.exit_code == 0, result.output
+    assert 'FAIL' not in result.output
+
+
+def test_gate_reports_a_full_scan(wdp):
+    with wdp.app.app_context():
+        scans, _ = wdp.full_scans(wdp.Order.query.filter(wdp.Order.description == 'Denim Jeans Supply'))
+    assert scans and scans[0].startswith('SCAN ')
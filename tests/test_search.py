@@ -0,0 +1,40 @@
+from datetime import datetime
+
+
+def audit_ids(wdp, q):
+    return {row.id for row in wdp.audit_query({'q': q})}
+
+
+def test_audit_index_follows_updates(wdp):
+    with wdp.app.app_context():
+        row = wdp.AuditLog(timestamp=datetime(2025, 6, 1), actor_type='User', actor_id='tester', action='Login', entity_type='Session',
+                           entity_id='N/A', status='Success', description='zanzibar checkpoint')
+        wdp.db.session.add(row)
+        wdp.db.session.commit()
+        assert row.id in audit_ids(wdp, 'zanzib')
+        assert row.id in audit_ids(wdp, '2025-06 zanzibar')
+
+        row.timestamp = datetime(2025, 7, 1) # not an indexed column: the index entry stays as it is
+        wdp.db.session.commit()
+        assert row.id in audit_ids(wdp, '2025-07 zanzibar')
+
+        row.description = 'mombasa checkpoint'
+        wdp.db.session.commit()
+        assert row.id not in audit_ids(wdp, 'zanzibar')
+        assert row.id in audit_ids(wdp, 'mombasa')
+        wdp.db.session.execute(wdp.text("INSERT INTO audit_log_fts(audit_log_fts, rank) VALUES ('integrity-check', 1)"))
+
+
+def test_order_and_invoice_search_follow_client_renames(wdp):
+    with wdp.app.app_context():
+        invoice = wdp.Invoice.query.first()
+        client = invoice.client
+        old_name = client.name
+        assert invoice.id in {i.id for i in wdp.invoices_query({'search': old_name})}
+        client.name = 'Quetzal Outfitters'
+        wdp.db.session.commit()
+        assert invoice.id in {i.id for i in wdp.invoices_query({'search': 'quetzal'})}
+        assert invoice.order_id in {o.id for o in wdp.orders_query({'search': 'quetzal outfit'})}
+        client.name = old_name
+        wdp.db.session.commit()
+        assert not wdp.orders_query({'search': 'quetzal'}).count()
@@ -0,0 +1,13 @@
+from conftest import SEED_END_DATE
+from test_aggregates import assert_aggregates_match
+
+
+def test_generator_runs_are_repeatable_and_collision_free(wdp):
+    with wdp.app.app_context():
+        before = wdp.Order.query.count()
+        # the same seed twice, in small chunks: the codes embed the reserved ids, so the second run cannot collide with the first
+        first = wdp.generate_synthetic_data(orders=250, seed=7, chunk_size=100, end_date=SEED_END_DATE)
+        second = wdp.generate_synthetic_data(orders=250, seed=7, chunk_size=100, end_date=SEED_END_DATE)
+        assert first['orders'] == second['orders'] == 250 and first['invoices'] == second['invoices']
+        assert wdp.Order.query.count() == before + 500
+    assert_aggregates_match(wdp)
@@ -0,0 +1,39 @@
+import os
+
+
+def test_hits_and_misses_return_the_same_plain_data(wdp):
+    with wdp.app.app_context():
+        admin = wdp.User.query.filter_by(username='admin').one()
+        wdp.user_cache.invalidate()
+        miss, hit = wdp.user_cache.get(admin.id), wdp.user_cache.get(admin.id)
+        assert type(miss) is type(hit) is wdp.CurrentUser
+        assert miss == hit == (admin.id, 'admin', 'SuperAdmin', admin.must_change_password, False)
+        assert wdp.user_cache.get(-1) is None
+
+
+def test_stamp_file_sits_next_to_the_database(wdp):
+    with wdp.app.app_context():
+        database = wdp.db.engine.url.database
+        wdp.user_cache.invalidate()
+    assert wdp.user_cache.stamp_path == database + '.user_cache_stamp'
+    assert os.path.exists(wdp.user_cache.stamp_path)
+
+
+def test_a_suspended_admin_is_rejected_on_the_next_request(wdp, client):
+    with wdp.app.app_context():
+        wdp.db.session.add(wdp.User(username='second', password='password456', role='SuperAdmin', custom_id='USR-ADMIN-002'))
+        wdp.db.session.commit()
+        admin_id, second_id = (wdp.User.query.filter_by(username=name).one().id for name in ('admin', 'second'))
+    second = wdp.app.test_client()
+    assert second.post('/login', data={'username': 'second', 'password': 'password456'}).status_code == 302
+    with second.session_transaction() as session: assert session['user_id'] == second_id
+    # warm the cache with the active account, then suspend it from the other admin's session
+    with wdp.app.test_request_context(): assert not wdp.user_cache.get(second_id).is_suspended
+    assert client.post(f'/admin/suspend/{second_id}').status_code == 302
+
+    response = second.post(f'/admin/suspend/{admin_id}')
+    assert response.status_code == 302 and '/login' not in response.location
+    with second.session_transaction() as session: assert 'user_id' not in session
+    with wdp.app.app_context():
+        assert not wdp.db.session.get(wdp.User, admin_id).is_suspended
+        assert wdp.db.session.get(wdp.User, second_id).is_suspended